@@ -4,10 +4,12 @@ Telegram-бот "Диспетчер входящих".
 """
 
 import logging
-import sys
+import re
+import time
 from datetime import datetime, timezone
+from typing import Any
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, MessageHandler, CallbackQueryHandler, CommandHandler, filters, ContextTypes
 
 # Загружаем .env если есть (для локальной разработки)
@@ -17,30 +19,48 @@ try:
 except ImportError:
     pass
 
-from config import BOT_TOKEN, ADMIN_CHAT_ID, MAKE_STATUS_WEBHOOK_URL, validate_config
-from classifier import classify
-from webhook import send_to_make, send_status_update_to_make, WebhookError
-
-
-# Настройка логирования
-class TraceFormatter(logging.Formatter):
-    """Форматтер с поддержкой trace_id."""
-
-    def format(self, record: logging.LogRecord) -> str:
-        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        level = record.levelname
-        trace_id = getattr(record, "trace_id", "-")
-        message = record.getMessage()
-        return f"[{timestamp}] [{level}] [{trace_id}] {message}"
-
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-# Используем UTF-8 для корректного вывода эмодзи в Windows
-handler = logging.StreamHandler(sys.stdout)
-handler.stream = open(sys.stdout.fileno(), mode='w', encoding='utf-8', buffering=1)
-handler.setFormatter(TraceFormatter())
-logger.addHandler(handler)
+from config import (
+    BOT_TOKEN,
+    ADMIN_CHAT_ID,
+    MAKE_STATUS_WEBHOOK_URL,
+    MESSAGE_DEADLINE,
+    MESSAGE_DEADLINE_RESERVE,
+    OUTBOX_PATH,
+    LEADS_PATH,
+    BOT_MODE,
+    BOT_ROLE,
+    UPDATE_QUEUE_PATH,
+    WORKER_NAME,
+    UPDATE_WORKERS,
+    UPDATE_QUEUE_DEPTH,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUPS,
+    validate_config,
+)
+from classifier import classify_async, close_dataset, get_cache, get_semantic_cache, load_local_model
+from webhook import send_to_make, send_status_update_to_make, close_clients, WebhookError
+from outbox import Outbox, OutboxDrainer, OutboxItem
+from leads import Lead, LeadStore
+from notifier import AdminNotifier
+from flood_control import FloodGate, REASON_RATE, REASON_DUPLICATE
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_OPEN, add_listener, remove_listener
+from deadline import Deadline
+import metrics
+import telegram_webhook
+import cluster
+from logging_setup import setup_logging, stop_logging
+from update_processor import ChatOrderedUpdateProcessor
+from rate_limiter import PriorityRateLimiter
+
+
+# Общий логгер бота; модули пишут в дочерние логгеры "dispatcher.*".
+# Вывод настраивается в main() (setup_logging): запись идёт в фоновом потоке.
+logger = logging.getLogger("dispatcher")
 
 
 # ==================== КОНСТАНТЫ ====================
@@ -58,6 +78,9 @@ STATUS_LABELS = {
     "spam": "🚫 спам"
 }
 
+# Заголовок сводки лидов (по нему callback отличает сводку от отдельного уведомления)
+DIGEST_HEADER = "Сводка обращений"
+
 # Тексты кнопок ReplyKeyboard (для пользователя)
 BTN_NEW_REQUEST = "📝 Оставить заявку"
 BTN_HOW_TO = "ℹ️ Как написать заявку"
@@ -65,6 +88,32 @@ BTN_HOW_TO = "ℹ️ Как написать заявку"
 # Множество текстов кнопок для быстрой проверки
 BUTTON_TEXTS = {BTN_NEW_REQUEST, BTN_HOW_TO}
 
+# Ключ OutboxDrainer в application.bot_data
+OUTBOX_DRAINER_KEY = "outbox_drainer"
+# Ключ LeadStore в application.bot_data
+LEAD_STORE_KEY = "lead_store"
+# Ключ AdminNotifier в application.bot_data
+ADMIN_NOTIFIER_KEY = "admin_notifier"
+# Ключ HTTP сервера метрик в application.bot_data
+METRICS_SERVER_KEY = "metrics_server"
+# Ключ FloodGate в application.bot_data
+FLOOD_GATE_KEY = "flood_gate"
+# Ключ подписчика на смену состояния circuit breaker в application.bot_data
+CIRCUIT_LISTENER_KEY = "circuit_listener"
+
+# Сколько секунд бюджета сообщения оставить на ответ пользователю после прямой отправки в Make
+REPLY_RESERVE = 1.0
+
+# Ответы на отсеянные сообщения (раз в окно лимита)
+FLOOD_REPLIES = {
+    REASON_RATE: "Слишком много сообщений подряд. Мы уже разбираем предыдущие — напишите, пожалуйста, чуть позже.",
+    REASON_DUPLICATE: "Это сообщение уже принято, ответим в ближайшее время.",
+}
+
+_ADMIN_NOTIFICATION_SECONDS = metrics.histogram(
+    "dispatcher_admin_notification_seconds", "Admin notification send latency", ["outcome"]
+)
+
 # Тексты сообщений
 START_MESSAGE = """Привет! Я диспетчер входящих Буровой Екатерины.
 
@@ -133,9 +182,22 @@ def build_payload(
     }
 
 
-def log_with_trace(level: int, trace_id: str, message: str) -> None:
-    """Логирует сообщение с trace_id."""
-    extra = {"trace_id": trace_id}
+def enqueue_for_make(context: ContextTypes.DEFAULT_TYPE, kind: str, trace_id: str, payload: dict) -> None:
+    """Записывает payload в outbox и будит фоновый воркер доставки."""
+    drainer: OutboxDrainer = context.bot_data[OUTBOX_DRAINER_KEY]
+    drainer.outbox.put(kind, trace_id, payload)
+    drainer.notify()
+
+
+def log_with_trace(
+    level: int,
+    trace_id: str,
+    message: str,
+    stage: str | None = None,
+    duration_ms: float | None = None
+) -> None:
+    """Логирует сообщение с trace_id (и этапом/длительностью для JSON логов)."""
+    extra = {"trace_id": trace_id, "stage": stage, "duration_ms": duration_ms}
     logger.log(level, message, extra=extra)
 
 
@@ -213,57 +275,184 @@ async def handle_button_how_to(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # ==================== АДМИН-УВЕДОМЛЕНИЯ ====================
 
-async def send_admin_notification(
-    context: ContextTypes.DEFAULT_TYPE,
+def render_admin_message(lead: Lead) -> str:
+    """Текст уведомления админу из состояния лида (перерисовывается при смене статуса)."""
+    short_text = lead.text[:200] + "..." if len(lead.text) > 200 else lead.text
+    return (
+        f"Новое обращение\n"
+        f"trace_id: {lead.trace_id}\n"
+        f"Статус: {STATUS_LABELS.get(lead.status, lead.status)}\n"
+        f"Тип: {lead.intent}\n"
+        f"Услуга: {lead.service}\n"
+        f"Кратко: {lead.summary}\n\n"
+        f"От: {lead.name or 'N/A'} (@{lead.username or 'N/A'})\n\n"
+        f"Текст: {short_text}"
+    )
+
+
+def build_digest_keyboard(leads: list[Lead]) -> InlineKeyboardMarkup:
+    """Клавиатура сводки: по строке кнопок статуса на каждый лид (номер + эмодзи статуса)."""
+    rows = []
+    for number, lead in enumerate(leads, start=1):
+        rows.append([
+            InlineKeyboardButton(
+                text=f"{number} {STATUS_LABELS[status].split(' ', 1)[0]}",
+                callback_data=f"status|{lead.trace_id}|{status}"
+            )
+            for status in LEAD_STATUSES
+        ])
+    return InlineKeyboardMarkup(rows)
+
+
+def render_lead_digest(leads: list[Lead]) -> tuple[str, InlineKeyboardMarkup]:
+    """Сводка лидов одним сообщением (при всплеске обращений)."""
+    lines = [f"{DIGEST_HEADER}: {len(leads)}"]
+    for number, lead in enumerate(leads, start=1):
+        short_text = lead.text[:80] + "..." if len(lead.text) > 80 else lead.text
+        lines.append(
+            f"{number}. {lead.intent}/{lead.service} — {STATUS_LABELS.get(lead.status, lead.status)}\n"
+            f"{lead.name or 'N/A'} (@{lead.username or 'N/A'}), trace_id: {lead.trace_id}\n"
+            f"{short_text}"
+        )
+    return "\n\n".join(lines), build_digest_keyboard(leads)
+
+
+def render_lead_notification(lead: Lead) -> tuple[str, InlineKeyboardMarkup]:
+    """Отдельное уведомление о лиде с кнопками статуса."""
+    return render_admin_message(lead), build_status_keyboard(lead.trace_id)
+
+
+async def send_to_admin(bot: Bot, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Отправляет сообщение в ADMIN_CHAT_ID (ошибки пробрасываются)."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        await bot.send_message(chat_id=int(ADMIN_CHAT_ID), text=text, reply_markup=reply_markup)
+        outcome = "ok"
+    finally:
+        _ADMIN_NOTIFICATION_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - started)
+
+
+async def _notify_admin(
+    bot: Bot,
+    notifier: AdminNotifier | None,
     trace_id: str,
-    classification: dict,
-    user_info: dict,
+    alert_key: str,
     text: str
 ) -> None:
-    """Отправляет уведомление админу о новом обращении с кнопками статуса."""
+    """Алерт через AdminNotifier (дедупликация, сводки) или напрямую."""
+    if notifier is not None:
+        await notifier.alert(alert_key, text)
+        return
+    try:
+        await send_to_admin(bot, text)
+    except Exception as e:
+        log_with_trace(logging.ERROR, trace_id, f"Failed to send admin alert: {e}")
+
+
+async def send_admin_notification(context: ContextTypes.DEFAULT_TYPE, lead: Lead) -> None:
+    """
+    Отправляет уведомление админу о новом обращении с кнопками статуса.
+    При всплеске обращений AdminNotifier складывает лиды в сводку.
+    """
     if not ADMIN_CHAT_ID:
         return
 
-    try:
-        admin_id = int(ADMIN_CHAT_ID)
-        short_text = text[:200] + "..." if len(text) > 200 else text
-
-        message_text = (
-            f"Новое обращение\n"
-            f"trace_id: {trace_id}\n"
-            f"Тип: {classification['intent']}\n"
-            f"Услуга: {classification['service']}\n"
-            f"Кратко: {classification['summary']}\n\n"
-            f"От: {user_info.get('name', 'N/A')} (@{user_info.get('username', 'N/A')})\n\n"
-            f"Текст: {short_text}"
-        )
+    notifier: AdminNotifier | None = context.bot_data.get(ADMIN_NOTIFIER_KEY)
+    if notifier is not None:
+        await notifier.notify_lead(lead)
+        return
 
-        keyboard = build_status_keyboard(trace_id)
-        await context.bot.send_message(
-            chat_id=admin_id,
-            text=message_text,
-            reply_markup=keyboard
-        )
+    text, keyboard = render_lead_notification(lead)
+    try:
+        await send_to_admin(context.bot, text, keyboard)
     except Exception as e:
-        log_with_trace(logging.ERROR, trace_id, f"Failed to send admin notification: {e}")
+        log_with_trace(logging.ERROR, lead.trace_id, f"Failed to send admin notification: {e}")
 
 
-async def send_admin_alert(context: ContextTypes.DEFAULT_TYPE, trace_id: str, error_msg: str, original_text: str) -> None:
+async def send_admin_alert(
+    bot: Bot,
+    trace_id: str,
+    error_msg: str,
+    original_text: str,
+    notifier: AdminNotifier | None = None
+) -> None:
     """Отправляет алерт админу в Telegram об ошибке."""
     if not ADMIN_CHAT_ID:
         return
 
-    try:
-        admin_id = int(ADMIN_CHAT_ID)
-        short_text = original_text[:100] + "..." if len(original_text) > 100 else original_text
-        alert = f"Make error | trace_id={trace_id} | err={error_msg[:50]}\n\nТекст: {short_text}"
-        await context.bot.send_message(chat_id=admin_id, text=alert)
-    except Exception as e:
-        log_with_trace(logging.ERROR, trace_id, f"Failed to send admin alert: {e}")
+    short_text = original_text[:100] + "..." if len(original_text) > 100 else original_text
+    alert = f"Make error | trace_id={trace_id} | err={error_msg[:50]}\n\nТекст: {short_text}"
+    await _notify_admin(bot, notifier, trace_id, f"make|{error_msg[:50]}", alert)
+
+
+async def send_status_failure_alert(
+    bot: Bot,
+    trace_id: str,
+    status_ru: str,
+    error_msg: str,
+    notifier: AdminNotifier | None = None
+) -> None:
+    """Сообщает админу, что статус не дошёл до Make."""
+    if not ADMIN_CHAT_ID:
+        return
+
+    text = f"Ошибка обновления статуса\ntrace_id: {trace_id}\nstatus: {status_ru}\nerror: {error_msg[:100]}"
+    await _notify_admin(bot, notifier, trace_id, f"status|{error_msg[:100]}", text)
+
+
+# Что происходит с обращениями, пока зависимость недоступна
+CIRCUIT_ALERTS = {
+    "openai": "OpenAI недоступен: сообщения классифицируются без LLM",
+    "make_lead": "Make (лиды) недоступен: лиды копятся в outbox и уйдут после восстановления",
+    "make_status": "Make (статусы) недоступен: статусы копятся в outbox и уйдут после восстановления",
+}
+
+
+async def send_circuit_alert(
+    bot: Bot,
+    breaker: CircuitBreaker,
+    notifier: AdminNotifier | None = None
+) -> None:
+    """Сообщает админу, что circuit breaker открылся и запросы к зависимости приостановлены."""
+    if not ADMIN_CHAT_ID:
+        return
+
+    text = CIRCUIT_ALERTS.get(breaker.name, f"{breaker.name} недоступен")
+    text += f"\nПробный запрос через {breaker.open_seconds:.0f} с"
+    await _notify_admin(bot, notifier, "-", f"circuit|{breaker.name}", text)
 
 
 # ==================== CALLBACK (INLINE КНОПКИ СТАТУСА) ====================
 
+# Префикс "[Статус: ...]" в сообщениях, отправленных до хранилища лидов
+_STATUS_PREFIX_RE = re.compile(r"^(?:\[Статус: [^\]\n]*\]\n\n)+")
+
+# Последняя выданная версия статуса (мс с эпохи, строго растёт)
+_last_status_version = 0
+
+
+def next_status_version() -> int:
+    """Версия статуса: время нажатия в мс, строго больше предыдущей."""
+    global _last_status_version
+    _last_status_version = max(_last_status_version + 1, time.time_ns() // 1_000_000)
+    return _last_status_version
+
+
+def _digest_trace_ids(query: Any) -> list[str]:
+    """trace_id лидов сводки по кнопкам сообщения (пусто — это не сводка)."""
+    message = query.message
+    if not message or not message.text or not message.text.startswith(DIGEST_HEADER):
+        return []
+    markup = message.reply_markup
+    trace_ids = []
+    for row in markup.inline_keyboard if markup else []:
+        parts = (row[0].callback_data or "").split("|") if row else []
+        if len(parts) == 3:
+            trace_ids.append(parts[1])
+    return trace_ids
+
+
 async def handle_status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает нажатие на кнопку статуса (для админа)."""
     query = update.callback_query
@@ -295,47 +484,64 @@ async def handle_status_callback(update: Update, context: ContextTypes.DEFAULT_T
 
     # Формируем payload для обновления статуса
     changed_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    version = next_status_version()
     payload = {
         "action": "status_update",
         "trace_id": trace_id,
         "status": status_ru,           # Русский статус с эмодзи (для таблицы)
         "status_code": status_code,    # ASCII код (для отладки)
-        "changed_at": changed_at
+        "changed_at": changed_at,
+        "version": version,            # Растёт с каждым нажатием: Make отбрасывает устаревшие
     }
 
-    # Отправляем в Make
+    # Фиксируем статус в outbox: новое нажатие по тому же trace_id заменяет
+    # ещё не отправленное, в Make уходит только последний статус
     try:
-        send_status_update_to_make(payload)
-        log_with_trace(logging.INFO, trace_id, f"Status update sent: {status_code} -> {status_ru}")
+        enqueue_for_make(context, "status", trace_id, payload)
+    except Exception as e:
+        error_msg = str(e)
+        log_with_trace(logging.ERROR, trace_id, f"Status update failed: {error_msg}")
+        await query.answer("Не удалось обновить статус")
+        await send_status_failure_alert(
+            context.bot, trace_id, status_ru, error_msg, context.bot_data.get(ADMIN_NOTIFIER_KEY)
+        )
+        return
 
-        # Успех — отвечаем на callback и редактируем сообщение
-        await query.answer(f"Статус: {status_ru}")
+    log_with_trace(logging.INFO, trace_id, f"Status update queued: {status_code} -> {status_ru}")
+
+    # Отвечаем сразу, доставка в Make идёт в фоне
+    await query.answer(f"Статус: {status_ru}")
+
+    # Перерисовываем сообщение из хранилища лидов
+    lead = None
+    store: LeadStore | None = context.bot_data.get(LEAD_STORE_KEY)
+    if store is not None:
+        try:
+            lead = store.set_status(trace_id, status_code, version)
+        except Exception as e:
+            log_with_trace(logging.ERROR, trace_id, f"Lead store update failed: {e}")
+
+    digest_trace_ids = _digest_trace_ids(query)
+    if digest_trace_ids:
+        # Кнопка в сводке — перерисовываем всю сводку
+        leads = [store.get(t) for t in digest_trace_ids] if store is not None else []
+        if leads and all(leads):
+            text, keyboard = render_lead_digest(leads)
+            await query.edit_message_text(text=text, reply_markup=keyboard)
+        return
 
-        # Редактируем сообщение, добавляя русский статус
+    if lead is not None:
+        new_text = render_admin_message(lead)
+    else:
+        # Лида нет в хранилище (сообщение старше хранилища) — меняем префикс статуса
         original_text = query.message.text if query.message else ""
+        original_text = _STATUS_PREFIX_RE.sub("", original_text, count=1)
         new_text = f"[Статус: {status_ru}]\n\n{original_text}"
 
-        await query.edit_message_text(
-            text=new_text,
-            reply_markup=build_status_keyboard(trace_id)
-        )
-
-    except (WebhookError, ValueError) as e:
-        error_msg = str(e)
-        log_with_trace(logging.ERROR, trace_id, f"Status update failed: {error_msg}")
-
-        await query.answer("Не удалось обновить статус")
-
-        # Отправляем админу сообщение об ошибке
-        if ADMIN_CHAT_ID:
-            try:
-                admin_id = int(ADMIN_CHAT_ID)
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=f"Ошибка обновления статуса\ntrace_id: {trace_id}\nstatus: {status_ru}\nerror: {error_msg[:100]}"
-                )
-            except Exception:
-                pass
+    await query.edit_message_text(
+        text=new_text,
+        reply_markup=build_status_keyboard(trace_id)
+    )
 
 
 # ==================== ОСНОВНОЙ ОБРАБОТЧИК СООБЩЕНИЙ ====================
@@ -345,9 +551,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     Обрабатывает входящее текстовое сообщение.
     Классифицирует и отправляет в Make.
 
+    На всё сообщение — бюджет MESSAGE_DEADLINE секунд: классификация получает
+    остаток без MESSAGE_DEADLINE_RESERVE, уведомление админу, не уложившееся
+    в бюджет, досылается в фоне. Время этапов пишется в лог одной строкой.
+
     ИСКЛЮЧЕНИЯ (не отправляются в Make):
     - Команды (начинаются с "/")
     - Тексты кнопок ReplyKeyboard
+    - Флуд и повторы (FloodGate)
     """
     message = update.message
     if not message or not message.text:
@@ -374,15 +585,37 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = message.chat_id
     message_id = message.message_id
     trace_id = f"{chat_id}:{message_id}"
+    deadline = Deadline(MESSAGE_DEADLINE)
 
     log_with_trace(logging.INFO, trace_id, f"Received message: {text[:50]}...")
 
+    # Флуд и повторы отсеиваем до классификации: без OpenAI, Make и уведомления админу
+    gate: FloodGate | None = context.bot_data.get(FLOOD_GATE_KEY)
+    if gate is not None:
+        user = message.from_user
+        decision = gate.check(user.id if user else None, chat_id, text)
+        if decision is not None:
+            log_with_trace(logging.INFO, trace_id, f"Suppressed by flood control: {decision.reason}")
+            if decision.notify:
+                await message.reply_text(FLOOD_REPLIES[decision.reason])
+            return
+
     # Классифицируем сообщение
+    started = time.perf_counter()
     try:
-        classification = classify(text)
-        log_with_trace(logging.INFO, trace_id, f"Classified: {classification['intent']}/{classification['service']}")
+        with deadline.stage("classify"):
+            classification = await classify_async(
+                text, trace_id=trace_id, deadline=deadline.leaving(MESSAGE_DEADLINE_RESERVE)
+            )
+        log_with_trace(
+            logging.INFO, trace_id, f"Classified: {classification['intent']}/{classification['service']}",
+            stage="classify", duration_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
     except Exception as e:
-        log_with_trace(logging.ERROR, trace_id, f"Classification error: {e}")
+        log_with_trace(
+            logging.ERROR, trace_id, f"Classification error: {e}",
+            stage="classify", duration_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
         classification = {
             "intent": "other",
             "service": "unknown",
@@ -416,29 +649,52 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         classification=classification
     )
 
-    # Диагностика (временно)
-    print("OUTGOING goal:", repr(payload.get("goal")))
-    print("OUTGOING text:", payload.get("text", "")[:120])
+    log_with_trace(logging.DEBUG, trace_id, f"Outgoing goal={payload.get('goal')!r} text={payload.get('text', '')[:120]!r}")
 
-    # Отправляем в Make
+    # Фиксируем payload в outbox — в Make его доставит фоновый воркер
+    started = time.perf_counter()
     try:
-        send_to_make(payload)
-        log_with_trace(logging.INFO, trace_id, "Sent to Make successfully")
-    except WebhookError as e:
-        error_msg = str(e)
-        log_with_trace(logging.ERROR, trace_id, f"Make webhook failed: {error_msg}")
-
-        # Отправляем алерт админу
-        await send_admin_alert(context, trace_id, error_msg, text)
-
-        # Сообщаем пользователю
-        await message.reply_text(
-            "Временно не получилось зафиксировать сообщение. Попробуйте чуть позже."
+        with deadline.stage("outbox"):
+            enqueue_for_make(context, "lead", trace_id, payload)
+        log_with_trace(
+            logging.INFO, trace_id, "Queued for Make",
+            stage="outbox", duration_ms=round((time.perf_counter() - started) * 1000, 1)
         )
-        return
-
-    # Отправляем уведомление админу с кнопками статуса
-    await send_admin_notification(context, trace_id, classification, user_info, text)
+    except Exception as e:
+        # Outbox недоступен — отправляем напрямую
+        log_with_trace(logging.ERROR, trace_id, f"Outbox write failed, sending directly: {e}")
+        try:
+            with deadline.stage("make"):
+                await send_to_make(payload, deadline=deadline.leaving(REPLY_RESERVE))
+            log_with_trace(logging.INFO, trace_id, "Sent to Make successfully")
+        except (WebhookError, CircuitOpenError) as e:
+            error_msg = str(e)
+            log_with_trace(logging.ERROR, trace_id, f"Make webhook failed: {error_msg}")
+
+            # Лид не зафиксирован — повтор пользователя не должен отсеяться как дубликат
+            if gate is not None:
+                gate.forget(chat_id, text)
+
+            # Отправляем алерт админу
+            await send_admin_alert(context.bot, trace_id, error_msg, text, context.bot_data.get(ADMIN_NOTIFIER_KEY))
+
+            # Сообщаем пользователю
+            with deadline.stage("reply"):
+                await message.reply_text(
+                    "Временно не получилось зафиксировать сообщение. Попробуйте чуть позже."
+                )
+            _log_deadline(trace_id, deadline)
+            return
+
+    # Сохраняем лид локально (статус, поиск) и уведомляем админа
+    lead = Lead.from_payload(payload)
+    store: LeadStore | None = context.bot_data.get(LEAD_STORE_KEY)
+    if store is not None:
+        try:
+            with deadline.stage("store"):
+                store.add(lead)
+        except Exception as e:
+            log_with_trace(logging.ERROR, trace_id, f"Lead store write failed: {e}")
 
     # Отвечаем пользователю подтверждением
     confirmation = (
@@ -447,21 +703,137 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"Услуга: {classification['service']}\n"
         f"Кратко: {classification['summary']}"
     )
-    await message.reply_text(confirmation, reply_markup=get_main_keyboard())
+    with deadline.stage("reply"):
+        await message.reply_text(confirmation, reply_markup=get_main_keyboard())
+    _log_deadline(trace_id, deadline)
+
+    # Уведомление админу — в фоне: очередь лимита чата админа не задерживает ответ пользователю
+    context.application.create_task(send_admin_notification(context, lead), update=update)
+
+
+def _log_deadline(trace_id: str, deadline: Deadline) -> None:
+    """Итог по сообщению: время этапов; WARNING, если бюджет превышен или этапы деградировали."""
+    exceeded = deadline.remaining() == 0
+    level = logging.WARNING if exceeded or deadline.degraded else logging.INFO
+    log_with_trace(
+        level, trace_id, f"Handled{' (deadline exceeded)' if exceeded else ''}: {deadline.report()}",
+        stage="total", duration_ms=round(deadline.elapsed * 1000, 1)
+    )
 
 
 # ==================== MAIN ====================
 
-def main() -> None:
-    """Запускает бота."""
-    # Валидируем конфигурацию
-    validate_config()
+async def on_startup(application: Application) -> None:
+    """
+    Готовит процесс по роли BOT_ROLE. Всем ролям: outbox, уведомления и алерты
+    админу, алерты circuit breaker, endpoint метрик. Доставка outbox в Make —
+    только ingress; handlers (хранилище лидов, защита от флуда, кэш
+    классификации, локальная модель) — только worker. Роль all — всё сразу.
+    """
+    outbox = Outbox(OUTBOX_PATH)
+
+    notifier = None
+    if ADMIN_CHAT_ID:
+        notifier = AdminNotifier(
+            send=lambda text, markup: send_to_admin(application.bot, text, markup),
+            render_lead=render_lead_notification,
+            render_digest=render_lead_digest,
+        )
+        application.bot_data[ADMIN_NOTIFIER_KEY] = notifier
+        notifier.start()
 
-    log_with_trace(logging.INFO, "-", "Starting bot...")
+    async def on_delivery_failure(item: OutboxItem, error: str) -> None:
+        if item.kind == "status":
+            await send_status_failure_alert(application.bot, item.key, item.payload.get("status", ""), error, notifier)
+        else:
+            await send_admin_alert(application.bot, item.key, error, item.payload.get("text", ""), notifier)
 
-    # Создаём приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    def on_circuit_change(breaker: CircuitBreaker, state: str) -> None:
+        if state == STATE_OPEN:
+            application.create_task(send_circuit_alert(application.bot, breaker, notifier))
+
+    add_listener(on_circuit_change)
+    application.bot_data[CIRCUIT_LISTENER_KEY] = on_circuit_change
+
+    senders = {"lead": send_to_make, "status": send_status_update_to_make}
+    drainer = OutboxDrainer(outbox, senders=senders, on_failure=on_delivery_failure)
+    application.bot_data[OUTBOX_DRAINER_KEY] = drainer
+
+    # Worker'ы только пишут в общий outbox, доставляет один процесс (ingress)
+    if BOT_ROLE != "worker":
+        drainer.start()
+        pending = outbox.count()
+        if pending:
+            log_with_trace(logging.INFO, "-", f"Outbox has {pending} pending payloads, resuming delivery")
+
+    # Ingress handlers не выполняет — состояние для них не нужно
+    if BOT_ROLE != "ingress":
+        _start_handlers_state(application)
+
+    if METRICS_PORT:
+        application.bot_data[METRICS_SERVER_KEY] = await metrics.start_server(METRICS_LISTEN, METRICS_PORT)
+        log_with_trace(logging.INFO, "-", f"Metrics on http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
+
+
+def _start_handlers_state(application: Application) -> None:
+    """Хранилище лидов, защита от флуда, кэш классификации и локальная модель для handlers."""
+    application.bot_data[LEAD_STORE_KEY] = LeadStore(LEADS_PATH)
+    application.bot_data[FLOOD_GATE_KEY] = FloodGate()
+
+    loaded = get_cache().load()
+    if loaded:
+        log_with_trace(logging.INFO, "-", f"Classification cache loaded: {loaded} entries")
+
+    local_model = load_local_model()
+    if local_model:
+        log_with_trace(logging.INFO, "-", f"Local model loaded: trained on {local_model.trained_on} examples")
 
+
+async def on_stop(application: Application) -> None:
+    """Отправляет накопленную сводку админу, пока бот ещё может слать сообщения."""
+    notifier: AdminNotifier | None = application.bot_data.get(ADMIN_NOTIFIER_KEY)
+    if notifier:
+        await notifier.stop()
+
+
+async def on_shutdown(application: Application) -> None:
+    """Останавливает доставку и закрывает пулы соединений к Make."""
+    listener = application.bot_data.get(CIRCUIT_LISTENER_KEY)
+    if listener:
+        remove_listener(listener)
+
+    drainer: OutboxDrainer | None = application.bot_data.get(OUTBOX_DRAINER_KEY)
+    if drainer:
+        await drainer.stop()
+        drainer.outbox.close()
+    await close_clients()
+
+    store: LeadStore | None = application.bot_data.get(LEAD_STORE_KEY)
+    if store:
+        store.close()
+
+    metrics_server = application.bot_data.get(METRICS_SERVER_KEY)
+    if metrics_server:
+        await metrics_server.stop()
+
+    # Кэш и датасет классификации есть только там, где выполняются handlers
+    if BOT_ROLE == "ingress":
+        return
+
+    cache = get_cache()
+    log_with_trace(logging.INFO, "-", f"Classification cache stats: {cache.stats()}")
+    semantic = get_semantic_cache()
+    if semantic is not None:
+        log_with_trace(logging.INFO, "-", f"Near-duplicate cache stats: {semantic.stats()}")
+    try:
+        cache.save()
+    except OSError as e:
+        log_with_trace(logging.ERROR, "-", f"Failed to save classification cache: {e}")
+    close_dataset()
+
+
+def register_handlers(application: Application) -> None:
+    """Регистрирует все handlers бота (команды, кнопки, сообщения, статусы)."""
     # ----- Команды -----
     application.add_handler(CommandHandler("start", handle_start))
     application.add_handler(CommandHandler("help", handle_help))
@@ -486,6 +858,76 @@ def main() -> None:
         CallbackQueryHandler(handle_status_callback, pattern=r"^status\|")
     )
 
+
+def build_application(
+    token: str,
+    update_processor: ChatOrderedUpdateProcessor | None = None,
+    base_url: str | None = None
+) -> Application:
+    """
+    Собирает Application: параллельная обработка update, лимиты исходящих
+    сообщений, хуки запуска/остановки и все handlers.
+    base_url — другой адрес Bot API (локальный сервер, нагрузочный тест).
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(update_processor or ChatOrderedUpdateProcessor(UPDATE_WORKERS, UPDATE_QUEUE_DEPTH))
+        .rate_limiter(PriorityRateLimiter(admin_chat_id=ADMIN_CHAT_ID))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+
+def main() -> None:
+    """Запускает бота."""
+    # Валидируем конфигурацию
+    validate_config()
+
+    listener = setup_logging(
+        level=LOG_LEVEL,
+        log_format=LOG_FORMAT,
+        path=LOG_FILE or None,
+        max_bytes=LOG_MAX_BYTES,
+        backups=LOG_BACKUPS,
+    )
+    try:
+        run_bot()
+    finally:
+        stop_logging(listener)
+
+
+def run_bot() -> None:
+    """Собирает Application и запускает polling или webhook режим (или роль ingress/worker)."""
+    log_with_trace(logging.INFO, "-", "Starting bot...")
+
+    # Создаём приложение
+    application = build_application(BOT_TOKEN)
+
+    if BOT_ROLE == "ingress":
+        # Принимаем update и кладём в общую очередь, обрабатывают worker'ы
+        log_with_trace(logging.INFO, "-", f"Bot started, ingress ({BOT_MODE})...")
+        cluster.run_ingress(application, UPDATE_QUEUE_PATH, BOT_MODE)
+        return
+
+    if BOT_ROLE == "worker":
+        log_with_trace(logging.INFO, "-", "Bot started, worker...")
+        cluster.run_worker(application, UPDATE_QUEUE_PATH, WORKER_NAME, UPDATE_WORKERS)
+        return
+
+    if BOT_MODE == "webhook":
+        # Update приходят POST-запросами от Telegram
+        log_with_trace(logging.INFO, "-", "Bot started, webhook mode...")
+        telegram_webhook.run(application)
+        return
+
     # Запускаем polling
     log_with_trace(logging.INFO, "-", "Bot started, polling...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
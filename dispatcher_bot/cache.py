@@ -0,0 +1,135 @@
+"""
+Кэш результатов классификации: LRU с TTL и опциональным сохранением на диск.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+_HANDLE_RE = re.compile(r"@\w+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст для ключа кэша: регистр, пробелы, @username."""
+    text = _HANDLE_RE.sub(" ", text.casefold())
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def make_key(text: str, model: str, prompt: str) -> str:
+    """Ключ кэша: нормализованный текст + модель + хэш промпта."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    raw = f"{model}\x00{prompt_hash}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU-кэш с TTL.
+    Значения — JSON-совместимые dict; get/put работают с копиями.
+    """
+
+    def __init__(self, max_size: int, ttl: float, path: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._data: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @staticmethod
+    def _copy(value: dict[str, Any]) -> dict[str, Any]:
+        return json.loads(json.dumps(value))
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Возвращает копию значения или None (промах / истёк TTL)."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return self._copy(value)
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        """Сохраняет копию значения, вытесняя самые старые записи."""
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.time() + self.ttl, self._copy(value))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий/промахов."""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def save(self) -> None:
+        """
+        Сохраняет неистёкшие записи в self.path (атомарно, через временный файл).
+        Временный файл у каждого процесса свой: worker'ы с общим путём не портят
+        файлы друг друга, остаётся кэш того, кто сохранил последним.
+        """
+        if not self.path:
+            return
+        now = time.time()
+        entries = [[key, expires_at, value] for key, (expires_at, value) in self._data.items() if expires_at > now]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> int:
+        """Загружает записи из self.path. Возвращает количество загруженных."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        if self.max_size <= 0 or not isinstance(entries, list):
+            return 0
+
+        now = time.time()
+        loaded = 0
+        for entry in entries[-self.max_size:]:
+            try:
+                key, expires_at, value = entry
+            except (TypeError, ValueError):
+                continue
+            # Файл могли испортить руками или другой версией бота
+            if not isinstance(key, str) or not isinstance(value, dict):
+                continue
+            if isinstance(expires_at, bool) or not isinstance(expires_at, (int, float)):
+                continue
+            if expires_at > now:
+                self._data[key] = (expires_at, value)
+                loaded += 1
+        return loaded
@@ -0,0 +1,221 @@
+"""
+Circuit breaker для внешних зависимостей (OpenAI, webhook Make).
+
+Три состояния:
+- closed — запросы идут, учитываются результаты последних window запросов;
+  при доле ошибок не ниже failure_rate (и хотя бы min_calls запросах) — open;
+- open — запросы не делаются, сразу CircuitOpenError; через open_seconds — half-open;
+- half-open — пропускается до probes пробных запросов: все успешны — closed,
+  любая ошибка — снова open.
+
+Разрешение на запрос помечено "поколением" состояния: результат запроса,
+начатого до смены состояния, не учитывается (медленный запрос, начатый
+ещё в closed, не закроет и не откроет breaker повторно).
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+import metrics
+from config import (
+    CIRCUIT_FAILURE_RATE,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_WINDOW,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_HALF_OPEN_PROBES,
+)
+
+
+logger = logging.getLogger("dispatcher.circuit")
+
+T = TypeVar("T")
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+
+# Значения для метрики состояния
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+# Через сколько секунд повторить запрос, отклонённый в half-open (пробные уже идут)
+HALF_OPEN_RETRY_IN = 1.0
+
+_STATE = metrics.gauge(
+    "dispatcher_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", ["dependency"]
+)
+_TRANSITIONS = metrics.counter(
+    "dispatcher_circuit_transitions_total", "Circuit breaker state changes", ["dependency", "state"]
+)
+_REJECTED = metrics.counter(
+    "dispatcher_circuit_rejected_total", "Calls rejected without a request by a circuit breaker", ["dependency"]
+)
+
+Listener = Callable[["CircuitBreaker", str], None]
+
+# Подписчики на смену состояния любого breaker (алерты админу)
+_listeners: list[Listener] = []
+
+
+def add_listener(listener: Listener) -> None:
+    """Подписывает listener(breaker, state) на смену состояния всех breaker."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Listener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+class CircuitOpenError(Exception):
+    """Запрос не сделан: breaker открыт. retry_in — через сколько секунд пробовать снова."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuit {name} is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _always(error: Exception) -> bool:
+    return True
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name: Зависимость (метка в метриках и логах)
+        failure_rate: Доля ошибок, при которой breaker открывается (> 1 — никогда)
+        min_calls: Меньше запросов в окне — не открывается
+        window: Сколько последних запросов учитывать
+        open_seconds: Сколько секунд не делать запросы после открытия
+        probes: Пробных запросов в half-open (все должны пройти успешно)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window: int = CIRCUIT_WINDOW,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        probes: int = CIRCUIT_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self.probes = max(1, probes)
+        self._clock = clock
+        self._state = STATE_CLOSED
+        self._generation = 0
+        self._outcomes: deque[bool] = deque(maxlen=max(1, window))
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+        _STATE.labels(dependency=name).set(_STATE_VALUES[STATE_CLOSED])
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние (open переходит в half-open по истечении open_seconds)."""
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(STATE_HALF_OPEN)
+        return self._state
+
+    def allow(self) -> int:
+        """
+        Разрешение на запрос. Результат запроса сообщается через
+        success/failure/cancel с возвращённым номером.
+
+        Raises:
+            CircuitOpenError: Breaker открыт или пробные запросы уже идут
+        """
+        state = self.state
+        if state == STATE_OPEN:
+            _REJECTED.labels(dependency=self.name).inc()
+            raise CircuitOpenError(self.name, self.open_seconds - (self._clock() - self._opened_at))
+        if state == STATE_HALF_OPEN:
+            if self._probes_in_flight >= self.probes:
+                _REJECTED.labels(dependency=self.name).inc()
+                raise CircuitOpenError(self.name, HALF_OPEN_RETRY_IN)
+            self._probes_in_flight += 1
+        return self._generation
+
+    def success(self, ticket: int) -> None:
+        if ticket != self._generation:
+            return
+        if self._state == STATE_HALF_OPEN:
+            self._probes_in_flight -= 1
+            self._probes_passed += 1
+            if self._probes_passed >= self.probes:
+                self._transition(STATE_CLOSED)
+            return
+        self._outcomes.append(True)
+
+    def failure(self, ticket: int) -> None:
+        if ticket != self._generation:
+            return
+        if self._state == STATE_HALF_OPEN:
+            self._transition(STATE_OPEN, "probe failed")
+            return
+        self._outcomes.append(False)
+        calls = len(self._outcomes)
+        failures = calls - sum(self._outcomes)
+        if calls >= self.min_calls and failures >= self.failure_rate * calls:
+            self._transition(STATE_OPEN, f"{failures}/{calls} calls failed")
+
+    def cancel(self, ticket: int) -> None:
+        """Запрос отменён без результата (освобождает место пробного запроса)."""
+        if ticket == self._generation and self._state == STATE_HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    async def call(self, func: Callable[[], Awaitable[T]],
+                   is_failure: Callable[[Exception], bool] = _always) -> T:
+        """
+        Выполняет func() через breaker. Исключения, для которых is_failure
+        возвращает False (например, 4xx), считаются ответом живого сервиса.
+
+        Raises:
+            CircuitOpenError: Запрос не сделан
+        """
+        ticket = self.allow()
+        try:
+            result = await func()
+        except Exception as e:
+            if is_failure(e):
+                self.failure(ticket)
+            else:
+                self.success(ticket)
+            raise
+        except BaseException:
+            self.cancel(ticket)
+            raise
+        self.success(ticket)
+        return result
+
+    def _transition(self, state: str, reason: str = "") -> None:
+        self._state = state
+        self._generation += 1
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+        if state == STATE_OPEN:
+            self._opened_at = self._clock()
+        elif state == STATE_CLOSED:
+            self._outcomes.clear()
+
+        _STATE.labels(dependency=self.name).set(_STATE_VALUES[state])
+        _TRANSITIONS.labels(dependency=self.name, state=state).inc()
+        if state == STATE_OPEN:
+            logger.warning(
+                f"Circuit {self.name} opened ({reason}), no requests for {self.open_seconds:.0f}s",
+                extra={"trace_id": "-"}
+            )
+        else:
+            logger.info(f"Circuit {self.name} is {state}", extra={"trace_id": "-"})
+
+        for listener in list(_listeners):
+            try:
+                listener(self, state)
+            except Exception as e:
+                logger.error(f"Circuit listener error: {e}", extra={"trace_id": "-"})
@@ -1,14 +1,60 @@
 """
 Классификация сообщений через OpenAI API.
+Пока circuit breaker OpenAI открыт, запросы не делаются — сразу fallback.
 """
 
+import asyncio
+import bisect
 import json
+import logging
 import re
+import time
+import weakref
 from typing import Any
 
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TIMEOUT
+import metrics
+import rules
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_OPEN
+from cache import ResultCache, make_key
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT,
+    OPENAI_CONCURRENCY,
+    OPENAI_JSON_SCHEMA,
+    CLASSIFY_BATCH_SIZE,
+    CLASSIFY_BATCH_WAIT_MS,
+    CLASSIFY_CACHE_SIZE,
+    CLASSIFY_CACHE_TTL,
+    CLASSIFY_CACHE_PATH,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    RULES_MIN_CONFIDENCE,
+    RULES_SKIP_LEADS,
+    LOCAL_MODEL_PATH,
+    LOCAL_MODEL_MIN_CONFIDENCE,
+    CLASSIFY_DATASET_PATH,
+)
+from semantic_cache import SemanticCache, is_available as semantic_cache_available
+from local_model import LocalClassifier, is_available as local_model_available
+from deadline import Deadline
+from dataset import DatasetWriter
 
 
+logger = logging.getLogger("dispatcher.classifier")
+
+_CLASSIFY_SECONDS = metrics.histogram(
+    "dispatcher_classify_seconds", "Classification latency by result source (rules, cache, local, llm, llm_batch, fallback)", ["source"]
+)
+_CLASSIFIED = metrics.counter("dispatcher_classified_total", "Classified messages by intent and service", ["intent", "service"])
+_FALLBACKS = metrics.counter("dispatcher_classify_fallback_total", "Fallback classifications by reason", ["reason"])
+_BATCH_SIZE = metrics.histogram(
+    "dispatcher_classify_batch_size", "Messages per batched LLM request", buckets=(2, 4, 8, 16, 32, 64)
+)
+_BATCH_UNPARSED = metrics.counter(
+    "dispatcher_classify_batch_unparsed_total", "Batched messages without a valid result, reclassified one by one"
+)
+
 SYSTEM_PROMPT = """Ты диспетчер входящих обращений студии.
 Классифицируй сообщение и верни ТОЛЬКО валидный JSON.
 Используй обычные двойные кавычки. Без markdown. Без пояснений. Без текста до или после JSON.
@@ -55,42 +101,221 @@ FALLBACK_RESULT = {
 VALID_INTENTS = {"lead", "question", "support", "other"}
 VALID_SERVICES = {"ai_agents", "make_automation", "gpt_assistants", "consultation", "unknown"}
 
+# JSON Schema ответа для structured outputs (OPENAI_JSON_SCHEMA)
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": sorted(VALID_INTENTS)},
+        "service": {"type": "string", "enum": sorted(VALID_SERVICES)},
+        "confidence": {"type": "number"},
+        "summary": {"type": "string"},
+        "fields": {
+            "type": "object",
+            "properties": {
+                "budget": {"type": ["integer", "null"]},
+                "deadline_text": {"type": ["string", "null"]},
+                "contact": {"type": ["string", "null"]},
+                "goal": {"type": ["string", "null"]},
+            },
+            "required": ["budget", "deadline_text", "contact", "goal"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["intent", "service", "confidence", "summary", "fields"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "classification", "strict": True, "schema": CLASSIFICATION_SCHEMA},
+}
+
+# Пакетный режим (CLASSIFY_BATCH_SIZE): несколько сообщений в одном запросе
+BATCH_PROMPT = SYSTEM_PROMPT + """
+
+Пакетный режим: на вход JSON-массив сообщений [{"index": 0, "text": "..."}, ...].
+Классифицируй каждое сообщение отдельно, по тем же правилам, и верни ТОЛЬКО JSON-объект:
+{"results": [{"index": 0, "intent": "lead", "service": "make_automation", "confidence": 0.85, "summary": "...", "fields": {...}}, ...]}
+По одному элементу на каждое сообщение, index — как во входном массиве."""
+
+BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "classification_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        **CLASSIFICATION_SCHEMA,
+                        "properties": {"index": {"type": "integer"}, **CLASSIFICATION_SCHEMA["properties"]},
+                        "required": ["index", *CLASSIFICATION_SCHEMA["required"]],
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_SCHEMA_KEYS = set(CLASSIFICATION_SCHEMA["required"])
+_SCHEMA_FIELD_KEYS = set(CLASSIFICATION_SCHEMA["properties"]["fields"]["required"])
+
+# ---------- Скомпилированные паттерны извлечения ----------
+
+# Начало JSON-объекта в ответе LLM: "{" и сразу ключ или "}"
+_JSON_START_RE = re.compile(r'\{\s*["}]')
+_JSON_DECODER = json.JSONDecoder()
+
+# Диапазон бюджета "40-60" или "40-60k"
+_BUDGET_RANGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*[-–—]\s*(\d+(?:\.\d+)?)\s*([kк])?")
+
+# Goal: триггеры трёх групп (проверяются в этом порядке), после триггера — пробелы
+_GOAL_GROUPS = ("want", "need", "seek")
+_GOAL_TRIGGER_RE = re.compile(
+    r"(?:(?P<want>хочу|хотим|хотел[аи]?\s*бы)|(?P<need>нужен|нужна|нужно|нужны)|(?P<seek>интересует|ищу|ищем))\s+",
+    re.IGNORECASE
+)
+# Позиции, где заканчивается фраза goal (только начало совпадения, поэтому \d{3} вместо \d{3,})
+_GOAL_TERMINATOR_RE = re.compile(r"(?=[,.@]|бюджет|срок|\d{3})", re.IGNORECASE)
+# Для "хочу/нужен" фраза заканчивается и на сроке "до пятницы"
+_GOAL_DEADLINE_TERMINATOR_RE = re.compile(
+    r"(?=до\s+(?:\w+дн|понедельник|вторник|сред|четверг|пятниц|суббот|воскресень))",
+    re.IGNORECASE
+)
+_NEWLINE_RE = re.compile(r"\n")
+# Хвост фразы goal, который отрезается: "до 10", "50к", "3 р"
+_GOAL_GARBAGE_RE = re.compile(r"бюджет|срок|до\s+\d|@\w+|\d+\s*[kкр]", re.IGNORECASE)
+
+# Контакт: email, @username или телефон (+7 999 123-45-67, 89991234567)
+_CONTACT_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+|@\w{3,}|\+?\d[\d\s()-]{8,}\d")
+
+# Бюджет: "бюджет 50к", "бюджет: 40-60 тыс" или число с единицей "50 000 руб", "70k"
+# Число начинается только с начала серии цифр, квантификаторы possessive — без отката
+_NUMBER = r"(?<!\d)\d++(?:[.,]\d++)?(?:\s\d{3}(?!\d))*+"
+_AMOUNT = rf"{_NUMBER}(?:\s*+[-–—]\s*+{_NUMBER})?"
+_BUDGET_KEYWORD_RE = re.compile(rf"бюджет\D{{0,15}}?({_AMOUNT})\s*(к|k|тыс\w*)?(?!\w)", re.IGNORECASE)
+_BUDGET_SUFFIX_RE = re.compile(rf"({_AMOUNT})\s*(к|k|тыс\w*|руб\w*|₽)(?!\w)", re.IGNORECASE)
+
+# Срок: "до пятницы", "к 10 февраля", "до конца месяца", "на этой неделе", "завтра"
+_DEADLINE_RE = re.compile(
+    r"\b(?:до|к)\s+(?:понедельник\w*|вторник\w*|сред\w*|четверг\w*|пятниц\w*|суббот\w*|воскресень\w*|"
+    r"конца\s+\w+|\d{1,2}(?:[./]\d{1,2}|\s+[а-яё]+)?)|"
+    r"\bна\s+(?:этой|следующей)\s+неделе|\bзавтра\b|\bсегодня\b|\bсрочно\b",
+    re.IGNORECASE
+)
+
+# Кэш успешных ответов LLM (ключ — нормализованный текст + модель + промпт)
+_cache = ResultCache(CLASSIFY_CACHE_SIZE, CLASSIFY_CACHE_TTL, CLASSIFY_CACHE_PATH or None)
+
+# Кэш почти-дубликатов (нужен numpy, SEMANTIC_CACHE_SIZE=0 — выключен)
+_semantic_cache = (
+    SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
+    if SEMANTIC_CACHE_SIZE > 0 and semantic_cache_available()
+    else None
+)
+
+
+# Датасет для локальной модели: ответы LLM пишутся в фоновом потоке
+_dataset = DatasetWriter(CLASSIFY_DATASET_PATH) if CLASSIFY_DATASET_PATH else None
+
+# Локальная модель (загружается load_local_model при старте)
+_local_model: LocalClassifier | None = None
+
+# Краткое описание для результатов локальной модели
+_LOCAL_SUMMARIES = {
+    "lead": "Заявка на услугу",
+    "question": "Вопрос про услуги",
+    "support": "Техническая проблема",
+    "other": "Не по теме",
+}
+
+
+def get_cache() -> ResultCache:
+    """Кэш классификации (для загрузки/сохранения и статистики)."""
+    return _cache
+
+
+def get_semantic_cache() -> SemanticCache | None:
+    """Кэш почти-дубликатов (None — выключен)."""
+    return _semantic_cache
+
+
+def close_dataset() -> None:
+    """Дописывает датасет для локальной модели (при остановке бота)."""
+    if _dataset is not None:
+        _dataset.close()
+
 
 def _extract_json(text: str) -> dict[str, Any] | None:
-    """Извлекает JSON из текста, даже если обёрнут в markdown."""
-    # Пробуем напрямую распарсить
-    try:
-        return json.loads(text.strip())
-    except json.JSONDecodeError:
-        pass
+    """
+    Извлекает JSON-объект из текста, даже если обёрнут в markdown или пояснения.
 
-    # Пробуем извлечь из markdown блока ```json ... ```
-    json_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if json_match:
+    Один проход слева направо: raw_decode с "{", за которой идёт ключ или "}".
+    Декодер останавливается на первой ошибке, и поиск продолжается с места
+    ошибки: вложенные в битый объект "{" повторно не разбираются.
+    После последней "}" объект закончиться не может — там не ищем.
+    """
+    last_brace = text.rfind("}")
+    match = _JSON_START_RE.search(text, 0, last_brace)
+    while match:
+        start = match.start()
         try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
-
-    # Пробуем найти JSON объект в тексте (с вложенными объектами)
-    brace_count = 0
-    start_idx = -1
-    for i, char in enumerate(text):
-        if char == '{':
-            if brace_count == 0:
-                start_idx = i
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-            if brace_count == 0 and start_idx != -1:
-                try:
-                    return json.loads(text[start_idx:i + 1])
-                except json.JSONDecodeError:
-                    start_idx = -1
+            data, stop = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            match = _JSON_START_RE.search(text, max(e.pos, start + 1), last_brace)
+            continue
+        if data:
+            return data
+        # Пустой объект — не ответ, ищем дальше
+        match = _JSON_START_RE.search(text, stop, last_brace)
 
     return None
 
 
+def _structured_result(text: str) -> dict[str, Any] | None:
+    """
+    Быстрый путь для ответа в режиме json_schema: один разбор JSON и проверка
+    формы без обхода через _validate_result. None — ответ не по схеме
+    (тогда его разбирает обычный путь). Ответ — ровно один объект: текст
+    после него (кроме пробелов) — тоже не по схеме.
+    """
+    try:
+        data = _JSON_DECODER.decode(text)
+    except json.JSONDecodeError:
+        return None
+    if type(data) is not dict or data.keys() != _SCHEMA_KEYS:
+        return None
+
+    fields = data["fields"]
+    intent, service, confidence = data["intent"], data["service"], data["confidence"]
+    if (
+        type(fields) is not dict
+        or fields.keys() != _SCHEMA_FIELD_KEYS
+        or intent not in VALID_INTENTS
+        or service not in VALID_SERVICES
+        or type(confidence) not in (int, float)
+    ):
+        return None
+
+    budget, goal = fields["budget"], fields["goal"]
+    return {
+        "intent": intent,
+        "service": service,
+        "confidence": max(0.0, min(1.0, float(confidence))),
+        "summary": str(data["summary"]) if data["summary"] else "Нет описания",
+        "fields": {
+            "budget": budget if type(budget) is int and budget > 0 else None,
+            "deadline_text": fields["deadline_text"] if isinstance(fields["deadline_text"], str) else None,
+            "contact": fields["contact"] if isinstance(fields["contact"], str) else None,
+            "goal": goal.strip() if isinstance(goal, str) else "",
+        },
+    }
+
+
 def _parse_budget(value: Any) -> int | None:
     """Парсит бюджет в число рублей."""
     if value is None:
@@ -111,7 +336,7 @@ def _parse_budget(value: Any) -> int | None:
                 pass
 
         # Диапазон "40-60" или "40-60k" -> берём нижнюю границу
-        range_match = re.match(r"(\d+(?:\.\d+)?)\s*[-–—]\s*(\d+(?:\.\d+)?)\s*([kк])?", s)
+        range_match = _BUDGET_RANGE_RE.match(s)
         if range_match:
             try:
                 lower = float(range_match.group(1))
@@ -129,37 +354,92 @@ def _parse_budget(value: Any) -> int | None:
     return None
 
 
+def _goal_candidate(
+    text: str,
+    start: int,
+    terminators: list[int],
+    newlines: list[int],
+    trailing_ws: int
+) -> str | None:
+    """
+    Фраза goal, начинающаяся с позиции start: до ближайшего терминатора
+    (не дальше конца строки). None — на этой строке терминатора нет.
+    """
+    # Ближайший терминатор после первого символа фразы или пробелы до конца текста
+    i = bisect.bisect_left(terminators, start + 1)
+    end = max(start + 1, trailing_ws)
+    if i < len(terminators):
+        end = min(end, terminators[i])
+
+    # Фраза не переходит через перевод строки
+    j = bisect.bisect_left(newlines, start)
+    if j < len(newlines) and newlines[j] < end:
+        return None
+
+    return text[start:end]
+
+
 def extract_goal(text: str) -> str:
     """
     Fallback-извлечение goal из текста.
     Ищет фразу после "хочу/нужен/нужна/нужно" до запятой/точки.
     Убирает куски про бюджет/срок/контакт.
     Возвращает строку до 60 символов.
+
+    Линейное время от длины текста: триггеры и терминаторы находятся
+    одним проходом скомпилированных паттернов, дальше — бинарный поиск.
     """
     if not text:
         return ""
 
     text_lower = text.lower()
 
-    # Паттерны для поиска goal
-    patterns = [
-        r"(?:хочу|хотим|хотел[аи]?\s*бы)\s+(.+?)(?:[,.]|бюджет|срок|до\s+\w+дн|до\s+понедельник|до\s+вторник|до\s+сред|до\s+четверг|до\s+пятниц|до\s+суббот|до\s+воскресень|@|\d{3,}|\s*$)",
-        r"(?:нужен|нужна|нужно|нужны)\s+(.+?)(?:[,.]|бюджет|срок|до\s+\w+дн|до\s+понедельник|до\s+вторник|до\s+сред|до\s+четверг|до\s+пятниц|до\s+суббот|до\s+воскресень|@|\d{3,}|\s*$)",
-        r"(?:интересует|ищу|ищем)\s+(.+?)(?:[,.]|бюджет|срок|@|\d{3,}|\s*$)",
-    ]
+    # Триггеры всех групп — одним проходом
+    # Для каждого триггера: (начало пробелов после него, начало фразы)
+    starts: dict[str, list[tuple[int, int]]] = {group: [] for group in _GOAL_GROUPS}
+    for match in _GOAL_TRIGGER_RE.finditer(text_lower):
+        starts[match.lastgroup].append((match.end(match.lastgroup), match.end()))
+
+    if not any(starts.values()):
+        return ""
+
+    # Позиции терминаторов и переводов строк — один раз на текст
+    common = [m.start() for m in _GOAL_TERMINATOR_RE.finditer(text_lower)]
+    deadlines = [m.start() for m in _GOAL_DEADLINE_TERMINATOR_RE.finditer(text_lower)]
+    with_deadlines = sorted(common + deadlines)
+    newlines = [m.start() for m in _NEWLINE_RE.finditer(text_lower)]
+    trailing_ws = len(text_lower.rstrip())
+
+    # Группы проверяются по порядку: хочу -> нужен -> интересует
+    for group in _GOAL_GROUPS:
+        terminators = common if group == "seek" else with_deadlines
+        for spaces_start, start in starts[group]:
+            if start == len(text_lower):
+                # После триггера только пробелы — фраза пустая
+                goal = ""
+            else:
+                goal = _goal_candidate(text_lower, start, terminators, newlines, trailing_ws)
+                if goal is None:
+                    # Как у regex с откатом \s+: фраза из одного пробела перед
+                    # терминатором считается найденной (и пустой)
+                    i = bisect.bisect_left(terminators, start)
+                    at_terminator = i < len(terminators) and terminators[i] == start
+                    if not (at_terminator and start - spaces_start >= 2 and text_lower[start - 1] != "\n"):
+                        continue
+                    goal = ""
+                goal = goal.strip()
 
-    for pattern in patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            goal = match.group(1).strip()
             # Убираем мусор в конце
-            goal = re.sub(r"\s*(бюджет|срок|до\s+\d|@\w+|\d+\s*[kкр]).*$", "", goal, flags=re.IGNORECASE)
+            garbage = _GOAL_GARBAGE_RE.search(goal)
+            if garbage:
+                goal = goal[:garbage.start()].rstrip()
             goal = goal.strip(" ,.-")
             if len(goal) > 3:  # Минимальная длина
                 # Ограничиваем 60 символами
                 if len(goal) > 60:
                     goal = goal[:57] + "..."
                 return goal
+            break  # Первое совпадение группы не подошло — следующая группа
 
     return ""
 
@@ -205,59 +485,540 @@ def _validate_result(data: dict[str, Any]) -> dict[str, Any]:
     return result
 
 
-def classify(text: str) -> dict[str, Any]:
+def load_local_model(path: str = LOCAL_MODEL_PATH) -> LocalClassifier | None:
+    """
+    Загружает локальную модель из path (пустой путь — выключена).
+    Ошибка загрузки логируется, классификация работает без модели.
+    """
+    global _local_model
+    _local_model = None
+    if not path:
+        return None
+    if not local_model_available():
+        logger.warning("Local model disabled: numpy is not installed", extra={"trace_id": "-"})
+        return None
+    try:
+        _local_model = LocalClassifier.load(path)
+    except Exception as e:
+        # Битый файл (обрезанный архив, не та структура) — работаем без модели
+        logger.warning(f"Local model not loaded from {path}: {e!r}", extra={"trace_id": "-"})
+    return _local_model
+
+
+def _local_result(text: str) -> dict[str, Any] | None:
+    """Результат локальной модели с полями, извлечёнными из текста (None — модели нет)."""
+    if _local_model is None:
+        return None
+    prediction = _local_model.predict(text)
+    return _validate_result({
+        "intent": prediction.intent,
+        "service": prediction.service,
+        "confidence": round(prediction.confidence, 3),
+        "summary": _LOCAL_SUMMARIES.get(prediction.intent, ""),
+        "fields": {
+            "budget": extract_budget(text),
+            "deadline_text": extract_deadline(text),
+            "contact": extract_contact(text),
+            "goal": extract_goal(text),
+        },
+    })
+
+
+def _local_first_pass(text: str, trace_id: str) -> dict[str, Any] | None:
+    """
+    Результат локальной модели, если её уверенность не ниже LOCAL_MODEL_MIN_CONFIDENCE
+    (тогда запрос к OpenAI не нужен).
+    """
+    if LOCAL_MODEL_MIN_CONFIDENCE > 1:
+        return None
+    result = _local_result(text)
+    if result is None:
+        return None
+
+    used = result["confidence"] >= LOCAL_MODEL_MIN_CONFIDENCE
+    logger.info(
+        f"Local model: {result['intent']}/{result['service']} conf={result['confidence']:.2f} "
+        f"-> {'skip LLM' if used else 'LLM'}",
+        extra={"trace_id": trace_id}
+    )
+    return result if used else None
+
+
+def _fallback_result(text: str) -> dict[str, Any]:
+    """
+    Fallback-результат: предсказание локальной модели, если она загружена,
+    иначе FALLBACK_RESULT с goal, извлечённым из текста.
+    """
+    local = _local_result(text)
+    if local is not None:
+        return local
+    result = FALLBACK_RESULT.copy()
+    result["fields"] = FALLBACK_FIELDS.copy()
+    result["fields"]["goal"] = extract_goal(text)
+    return result
+
+
+def _build_messages(text: str) -> list[dict[str, str]]:
+    """Сообщения для chat completion."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
+
+def _completion_options() -> dict[str, Any]:
+    """Дополнительные параметры chat completion."""
+    return {"response_format": RESPONSE_FORMAT} if OPENAI_JSON_SCHEMA else {}
+
+
+def _result_from_response(response: Any, text: str) -> dict[str, Any] | None:
+    """Разбирает ответ OpenAI в результат классификации (None — ответ не разобран)."""
+    # Извлекаем текст ответа
+    response_text = response.choices[0].message.content if response.choices else ""
+
+    # Ответ по схеме — один json.loads, иначе ищем JSON в тексте и валидируем
+    result = _structured_result(response_text) if OPENAI_JSON_SCHEMA and response_text else None
+    if result is None:
+        parsed = _extract_json(response_text or "")
+        if parsed is None:
+            return None
+        result = _validate_result(parsed)
+
+    return _with_goal(result, text)
+
+
+def _with_goal(result: dict[str, Any], text: str) -> dict[str, Any]:
+    """Fallback: если LLM не вернул goal, извлекаем из текста."""
+    if not result["fields"].get("goal"):
+        result["fields"]["goal"] = extract_goal(text)
+    return result
+
+
+def _parse_batch_results(response_text: str, size: int) -> list[dict[str, Any] | None]:
+    """
+    Результаты пакетного ответа по индексам сообщений.
+    None — для сообщения нет валидного элемента (битый ответ, пропуск, повтор index).
+    """
+    results: list[dict[str, Any] | None] = [None] * size
+    data = _extract_json(response_text)
+    items = data.get("results") if data else None
+    if not isinstance(items, list):
+        return results
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        if type(index) is int and 0 <= index < size and results[index] is None:
+            results[index] = _validate_result(item)
+    return results
+
+
+def extract_contact(text: str) -> str | None:
+    """Извлекает контакт из текста: email, @username или телефон."""
+    match = _CONTACT_RE.search(text)
+    return match.group(0) if match else None
+
+
+def extract_budget(text: str) -> int | None:
+    """Извлекает бюджет из текста: "бюджет 50к", "40-60 тыс", "50 000 руб"."""
+    match = _BUDGET_KEYWORD_RE.search(text) or _BUDGET_SUFFIX_RE.search(text)
+    if not match:
+        return None
+    amount = re.sub(r"\s", "", match.group(1))
+    thousands = (match.group(2) or "").lower()[:1] in ("к", "k", "т")
+    return _parse_budget(amount + ("к" if thousands else ""))
+
+
+def extract_deadline(text: str) -> str | None:
+    """Извлекает срок как написал клиент: "до пятницы", "к 10 февраля", "на этой неделе"."""
+    match = _DEADLINE_RE.search(text)
+    return match.group(0).strip() if match else None
+
+
+def _rules_result(text: str, trace_id: str) -> dict[str, Any] | None:
+    """
+    Результат правил, если их уверенность не ниже RULES_MIN_CONFIDENCE
+    (для лидов — только при RULES_SKIP_LEADS).
+    Решение логируется для настройки правил.
+    """
+    if RULES_MIN_CONFIDENCE > 1:
+        return None
+
+    rule_match = rules.match(text)
+    if rule_match is None:
+        return None
+
+    used = rule_match.confidence >= RULES_MIN_CONFIDENCE and (RULES_SKIP_LEADS or rule_match.intent != "lead")
+    logger.info(
+        f"Rules: {rule_match.intent}/{rule_match.service} conf={rule_match.confidence:.2f} "
+        f"rules={','.join(rule_match.rules)} -> {'skip LLM' if used else 'LLM'}",
+        extra={"trace_id": trace_id}
+    )
+    if not used:
+        return None
+
+    result = _validate_result({
+        "intent": rule_match.intent,
+        "service": rule_match.service,
+        "confidence": rule_match.confidence,
+        "summary": rule_match.summary,
+        "fields": {
+            "budget": extract_budget(text),
+            "deadline_text": extract_deadline(text),
+            "contact": extract_contact(text),
+            "goal": extract_goal(text),
+        },
+    })
+    return result
+
+
+def _refresh_message_fields(result: dict[str, Any], text: str) -> None:
+    """Пересчитывает поля, которые отличаются у похожих сообщений (бюджет, контакт)."""
+    fields = result["fields"]
+    fields["budget"] = extract_budget(text)
+    fields["contact"] = extract_contact(text)
+    deadline = fields.get("deadline_text")
+    if deadline and deadline.lower() not in text.lower():
+        fields["deadline_text"] = None
+
+
+def _cached_result(text: str) -> tuple[str, dict[str, Any] | None]:
+    """
+    Ищет результат в кэше: сначала точный повтор, затем почти-дубликат.
+    Возвращает (ключ точного кэша, результат или None).
+    """
+    key = make_key(text, OPENAI_MODEL, SYSTEM_PROMPT)
+    result = _cache.get(key)
+    if result is not None:
+        # Контакт берётся из текущего текста: ключ не учитывает @username
+        contact = result["fields"].get("contact")
+        if not contact or contact not in text:
+            result["fields"]["contact"] = extract_contact(text)
+        return key, result
+
+    if _semantic_cache is not None:
+        found = _semantic_cache.lookup(text)
+        if found is not None:
+            result, similarity = found
+            result["confidence"] = round(result["confidence"] * similarity, 3)
+            _refresh_message_fields(result, text)
+            return key, result
+
+    return key, None
+
+
+def _store_result(key: str, text: str, result: dict[str, Any]) -> None:
+    """Сохраняет успешный ответ LLM в оба кэша и в датасет для локальной модели."""
+    _cache.put(key, result)
+    if _semantic_cache is not None:
+        _semantic_cache.add(text, result)
+    if _dataset is not None:
+        # Пара (текст, классификация LLM) для scripts/train_local_model.py
+        _dataset.write({
+            "text": text,
+            "intent": result["intent"],
+            "service": result["service"],
+            "confidence": result["confidence"],
+            "model": OPENAI_MODEL,
+            "ts": int(time.time()),
+        })
+
+
+def _observed(started: float, source: str, result: dict[str, Any], fallback_reason: str | None = None) -> dict[str, Any]:
+    """Записывает метрики классификации и возвращает result."""
+    _CLASSIFY_SECONDS.labels(source=source).observe(time.perf_counter() - started)
+    _CLASSIFIED.labels(intent=result["intent"], service=result["service"]).inc()
+    if fallback_reason:
+        _FALLBACKS.labels(reason=fallback_reason).inc()
+    return result
+
+
+def classify(text: str, trace_id: str = "-") -> dict[str, Any]:
     """
     Классифицирует текст сообщения через OpenAI API.
+    Простые случаи решаются правилами без запроса к LLM.
 
     Returns:
         dict с ключами: intent, service, confidence, summary, fields
     """
+    started = time.perf_counter()
+    result = _rules_result(text, trace_id)
+    if result is not None:
+        return _observed(started, "rules", result)
+
     # Если нет API ключа — сразу fallback
     if not OPENAI_API_KEY:
-        result = FALLBACK_RESULT.copy()
-        result["fields"] = FALLBACK_FIELDS.copy()
-        # Fallback: извлекаем goal из текста
-        result["fields"]["goal"] = extract_goal(text)
-        return result
+        return _observed(started, "fallback", _fallback_result(text), "no_api_key")
+
+    key, cached = _cached_result(text)
+    if cached is not None:
+        return _observed(started, "cache", cached)
+
+    result = _local_first_pass(text, trace_id)
+    if result is not None:
+        return _observed(started, "local", result)
 
     try:
         from openai import OpenAI
 
+        # Клиент создаётся до разрешения breaker: ошибка здесь не должна занять пробный запрос
         client = OpenAI(api_key=OPENAI_API_KEY)
 
-        response = client.chat.completions.create(
+        ticket = _breaker.allow()
+        try:
+            response = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                max_tokens=512,
+                timeout=OPENAI_TIMEOUT,
+                messages=_build_messages(text),
+                **_completion_options()
+            )
+        except Exception:
+            _breaker.failure(ticket)
+            raise
+        except BaseException:
+            _breaker.cancel(ticket)
+            raise
+        _breaker.success(ticket)
+
+        result = _result_from_response(response, text)
+        if result is None:
+            return _observed(started, "fallback", _fallback_result(text), "bad_response")
+
+        _store_result(key, text, result)
+        return _observed(started, "llm", result)
+
+    except CircuitOpenError:
+        return _observed(started, "fallback", _fallback_result(text), "circuit_open")
+
+    except Exception:
+        # Любая ошибка (сеть, API, парсинг) — fallback
+        return _observed(started, "fallback", _fallback_result(text), "llm_error")
+
+
+# ==================== ASYNC ====================
+
+# Общий AsyncOpenAI клиент (один пул соединений на процесс)
+_async_client = None
+
+# Circuit breaker запросов к OpenAI
+_breaker = CircuitBreaker("openai")
+
+# Если от бюджета сообщения осталось меньше (секунд), OpenAI не вызываем — сразу fallback
+MIN_LLM_BUDGET = 0.5
+
+# Семафор ограничения параллельных запросов, по одному на event loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> Any:
+    """Возвращает общий AsyncOpenAI клиент, создаёт при первом вызове."""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+    return _async_client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Семафор OPENAI_CONCURRENCY для текущего event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def _classify_batch(texts: list[str]) -> list[dict[str, Any] | None]:
+    """
+    Классифицирует несколько сообщений одним запросом к OpenAI.
+    None — результат для сообщения не разобран.
+    """
+    content = json.dumps([{"index": i, "text": text} for i, text in enumerate(texts)], ensure_ascii=False)
+    options = {"response_format": BATCH_RESPONSE_FORMAT} if OPENAI_JSON_SCHEMA else {}
+
+    async with _get_semaphore():
+        response = await _breaker.call(lambda: _get_async_client().chat.completions.create(
             model=OPENAI_MODEL,
-            max_tokens=512,
+            max_tokens=512 * len(texts),
             timeout=OPENAI_TIMEOUT,
             messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": text}
-            ]
+                {"role": "system", "content": BATCH_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            **options
+        ))
+    _BATCH_SIZE.observe(len(texts))
+
+    response_text = response.choices[0].message.content if response.choices else ""
+    results = _parse_batch_results(response_text or "", len(texts))
+    unparsed = results.count(None)
+    if unparsed:
+        _BATCH_UNPARSED.inc(unparsed)
+        logger.warning(
+            f"LLM batch: {unparsed}/{len(texts)} results unparsed, classifying them one by one",
+            extra={"trace_id": "-"}
         )
+    return results
 
-        # Извлекаем текст ответа
-        response_text = response.choices[0].message.content if response.choices else ""
 
-        # Парсим JSON
-        parsed = _extract_json(response_text)
-        if parsed is None:
-            result = FALLBACK_RESULT.copy()
-            result["fields"] = FALLBACK_FIELDS.copy()
-            result["fields"]["goal"] = extract_goal(text)
-            return result
+class _ClassifyBatcher:
+    """Собирает тексты в пачки до size штук или wait секунд и классифицирует одним запросом."""
 
-        # Валидируем
-        result = _validate_result(parsed)
+    def __init__(self, size: int, wait: float):
+        self.size = size
+        self.wait = wait
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, text: str) -> dict[str, Any] | None:
+        """
+        Добавляет текст в текущую пачку и ждёт результата по нему.
+        None — классифицировать отдельным запросом (в пачке одно сообщение
+        или ответ по этому сообщению не разобран).
+
+        Raises:
+            Exception: Ошибка запроса к OpenAI
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if len(batch) == 1:
+            # Всплеска нет — обычный запрос на одно сообщение
+            _, future = batch[0]
+            if not future.done():
+                future.set_result(None)
+        elif batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await _classify_batch([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # Вызывающий отменил ожидание
+                future.set_result(result)
 
-        # Fallback: если LLM не вернул goal, извлекаем из текста
-        if not result["fields"].get("goal"):
-            result["fields"]["goal"] = extract_goal(text)
 
-        return result
+# Батчеры классификации, по одному на event loop
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _ClassifyBatcher]" = weakref.WeakKeyDictionary()
+
+
+def _get_batcher() -> _ClassifyBatcher:
+    """Батчер CLASSIFY_BATCH_SIZE для текущего event loop."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _ClassifyBatcher(CLASSIFY_BATCH_SIZE, CLASSIFY_BATCH_WAIT_MS / 1000)
+        _batchers[loop] = batcher
+    return batcher
+
+
+async def classify_async(text: str, trace_id: str = "-", deadline: Deadline | None = None) -> dict[str, Any]:
+    """
+    Асинхронная версия classify: не блокирует event loop.
+    Не более OPENAI_CONCURRENCY запросов к OpenAI одновременно;
+    при открытом circuit breaker — сразу fallback.
+    При CLASSIFY_BATCH_SIZE > 1 сообщения, пришедшие почти одновременно,
+    классифицируются одним запросом.
+    С deadline ожидание очереди и ответа OpenAI ограничено остатком бюджета;
+    если его меньше MIN_LLM_BUDGET или он истёк — fallback.
+
+    Returns:
+        dict с ключами: intent, service, confidence, summary, fields
+    """
+    started = time.perf_counter()
+    result = _rules_result(text, trace_id)
+    if result is not None:
+        return _observed(started, "rules", result)
+
+    if not OPENAI_API_KEY:
+        return _observed(started, "fallback", _fallback_result(text), "no_api_key")
+
+    key, cached = _cached_result(text)
+    if cached is not None:
+        return _observed(started, "cache", cached)
+
+    result = _local_first_pass(text, trace_id)
+    if result is not None:
+        return _observed(started, "local", result)
+
+    if _breaker.state == STATE_OPEN:
+        return _observed(started, "fallback", _fallback_result(text), "circuit_open")
+
+    # Бюджет ограничивает ожидание целиком (очередь, пачка, запрос); таймаут
+    # самого клиента остаётся OPENAI_TIMEOUT — обрыв по бюджету не ошибка OpenAI
+    budget = deadline.timeout(OPENAI_TIMEOUT) if deadline else None
+    if budget is not None and budget < MIN_LLM_BUDGET:
+        deadline.degrade("classify")
+        return _observed(started, "fallback", _fallback_result(text), "deadline")
+
+    scope = asyncio.timeout(budget)
+    try:
+        async with scope:
+            if CLASSIFY_BATCH_SIZE > 1:
+                batched = await _get_batcher().submit(text)
+                if batched is not None:
+                    result = _with_goal(batched, text)
+                    _store_result(key, text, result)
+                    return _observed(started, "llm_batch", result)
+
+            client = _get_async_client()
+
+            async with _get_semaphore():
+                response = await _breaker.call(lambda: client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    max_tokens=512,
+                    timeout=OPENAI_TIMEOUT,
+                    messages=_build_messages(text),
+                    **_completion_options()
+                ))
+
+        result = _result_from_response(response, text)
+        if result is None:
+            return _observed(started, "fallback", _fallback_result(text), "bad_response")
+
+        _store_result(key, text, result)
+        return _observed(started, "llm", result)
+
+    except TimeoutError:
+        if not scope.expired():
+            # Таймаут пришёл из клиента (OpenAI медленнее OPENAI_TIMEOUT), а не
+            # по бюджету — обычная ошибка, breaker её уже учёл
+            return _observed(started, "fallback", _fallback_result(text), "llm_error")
+        # Бюджет сообщения исчерпан раньше ответа OpenAI
+        logger.warning(f"LLM classification cut by deadline after {budget:.1f}s", extra={"trace_id": trace_id})
+        deadline.degrade("classify")
+        return _observed(started, "fallback", _fallback_result(text), "deadline")
+
+    except CircuitOpenError:
+        # Breaker открылся, пока сообщение ждало очереди, или уже идёт пробный запрос
+        return _observed(started, "fallback", _fallback_result(text), "circuit_open")
 
     except Exception:
         # Любая ошибка (сеть, API, парсинг) — fallback
-        result = FALLBACK_RESULT.copy()
-        result["fields"] = FALLBACK_FIELDS.copy()
-        result["fields"]["goal"] = extract_goal(text)
-        return result
+        return _observed(started, "fallback", _fallback_result(text), "llm_error")
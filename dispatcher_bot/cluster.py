@@ -0,0 +1,153 @@
+"""
+Запуск бота несколькими процессами: ingress + N worker'ов на одной машине.
+
+Ingress (BOT_ROLE=ingress) получает update от Telegram (polling или webhook,
+BOT_MODE) и кладёт их в общую очередь UpdateQueue (SQLite), а также
+доставляет outbox в Make. Worker'ы (BOT_ROLE=worker) забирают update своих
+шардов и выполняют обычные handlers бота; пишут в общий outbox и хранилище
+лидов. Порядок update внутри чата сохраняется (см. update_queue).
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from telegram import Update
+from telegram.ext import Application
+
+import telegram_webhook
+from update_queue import UpdateQueue, QueueWorker
+
+
+logger = logging.getLogger("dispatcher.cluster")
+
+
+def default_worker_name() -> str:
+    """Имя worker'а по умолчанию: хост и pid."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def stop_event() -> asyncio.Event:
+    """Событие, которое выставляется по SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    return stop
+
+
+@asynccontextmanager
+async def running(application: Application) -> AsyncIterator[None]:
+    """Запускает Application с хуками post_init/post_stop/post_shutdown на время блока."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        yield
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def forward_updates(updates: asyncio.Queue, queue: UpdateQueue, stop: asyncio.Event) -> int:
+    """Перекладывает update из очереди Updater в общую очередь до stop."""
+    forwarded = 0
+    stopping = asyncio.ensure_future(stop.wait())
+    try:
+        while True:
+            getting = asyncio.ensure_future(updates.get())
+            await asyncio.wait({getting, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            if not getting.done():
+                getting.cancel()
+                return forwarded
+            queue.put(getting.result().to_dict())
+            forwarded += 1
+    finally:
+        stopping.cancel()
+
+
+async def serve_ingress(
+    application: Application, queue: UpdateQueue, mode: str, stop: asyncio.Event | None = None
+) -> None:
+    """
+    Ingress: принимает update (Updater python-telegram-bot: polling или webhook)
+    и кладёт их в общую очередь, пока не придёт SIGINT/SIGTERM (или stop).
+    Application не запускается — handlers в этом процессе не выполняются;
+    on_startup запускает доставку outbox.
+    """
+    stop = stop or stop_event()
+    updater = application.updater
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        if mode == "webhook":
+            updates = await updater.start_webhook(**telegram_webhook.webhook_options())
+        else:
+            updates = await updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Ingress started ({mode}), queue has {queue.count()} updates", extra={"trace_id": "-"})
+        try:
+            await forward_updates(updates, queue, stop)
+        finally:
+            await updater.stop()
+            # Полученное до остановки — тоже в очередь
+            while not updates.empty():
+                queue.put(updates.get_nowait().to_dict())
+    finally:
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def serve_worker(
+    application: Application, queue: UpdateQueue, name: str, concurrency: int, stop: asyncio.Event | None = None
+) -> None:
+    """
+    Worker: обрабатывает update своих шардов теми же handlers и тем же
+    update processor (порядок внутри чата, метрики), что и одиночный бот,
+    до SIGINT/SIGTERM (или stop).
+    """
+    stop = stop or stop_event()
+    processor = application.update_processor
+
+    async def process(data: dict[str, Any]) -> None:
+        update = Update.de_json(data, application.bot)
+        await processor.process_update(update, application.process_update(update))
+
+    async with running(application):
+        worker = QueueWorker(queue, name, process, concurrency=concurrency)
+        logger.info(f"Worker {name} started", extra={"trace_id": "-"})
+        await worker.run(stop)
+        logger.info(f"Worker {name} stopped, processed {worker.processed} updates", extra={"trace_id": "-"})
+
+
+def run_ingress(application: Application, queue_path: str, mode: str) -> None:
+    """Синхронная обёртка над serve_ingress (для bot.main)."""
+    queue = UpdateQueue(queue_path)
+    try:
+        asyncio.run(serve_ingress(application, queue, mode))
+    finally:
+        queue.close()
+
+
+def run_worker(application: Application, queue_path: str, name: str, concurrency: int) -> None:
+    """Синхронная обёртка над serve_worker (для bot.main)."""
+    queue = UpdateQueue(queue_path)
+    try:
+        asyncio.run(serve_worker(application, queue, name or default_worker_name(), concurrency))
+    finally:
+        queue.close()
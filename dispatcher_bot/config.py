@@ -11,6 +11,99 @@ OPENAI_TIMEOUT = 25
 MAKE_TIMEOUT = 25
 MAKE_RETRIES = 2
 
+# Бюджет на одно сообщение: от получения до ответа "Принято" (0 — без ограничения).
+# Этапы берут таймауты из остатка; после классификации в бюджете остаётся
+# MESSAGE_DEADLINE_RESERVE секунд на outbox и ответ.
+MESSAGE_DEADLINE = float(os.environ.get("MESSAGE_DEADLINE", "8"))
+MESSAGE_DEADLINE_RESERVE = float(os.environ.get("MESSAGE_DEADLINE_RESERVE", "2"))
+
+# Обработка update: сколько одновременно (разные чаты параллельно,
+# один чат — по очереди) и сколько может ждать в очереди
+UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", "16"))
+UPDATE_QUEUE_DEPTH = int(os.environ.get("UPDATE_QUEUE_DEPTH", "512"))
+
+# Лимиты исходящих сообщений Telegram: на весь бот и на один чат (в секунду),
+# сколько сообщений в чат можно подряд и сколько раз повторять после 429
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.environ.get("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = float(os.environ.get("TG_CHAT_BURST", "3"))
+TG_MAX_RETRIES = int(os.environ.get("TG_MAX_RETRIES", "2"))
+
+# Пул соединений к Make (на каждый хост webhook)
+MAKE_POOL_MAX_CONNECTIONS = int(os.environ.get("MAKE_POOL_MAX_CONNECTIONS", "20"))
+MAKE_POOL_MAX_KEEPALIVE = int(os.environ.get("MAKE_POOL_MAX_KEEPALIVE", "10"))
+MAKE_POOL_KEEPALIVE_EXPIRY = 30  # секунд
+
+# Пакетная отправка в Make: до MAKE_BATCH_SIZE payload в одном запросе
+# (JSON-массив). 0 или 1 — выключено, каждый payload отдельным запросом.
+MAKE_BATCH_SIZE = int(os.environ.get("MAKE_BATCH_SIZE", "0"))
+MAKE_BATCH_WAIT_MS = int(os.environ.get("MAKE_BATCH_WAIT_MS", "200"))
+
+# Outbox: локальная очередь доставки в Make (SQLite)
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", "outbox.sqlite3")
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_BASE = 5     # секунд, первая пауза между попытками
+OUTBOX_RETRY_MAX = 300    # секунд, максимальная пауза
+OUTBOX_CONCURRENCY = max(10, MAKE_BATCH_SIZE)  # записей, отправляемых параллельно
+OUTBOX_POLL_INTERVAL = 5  # секунд, период проверки очереди
+
+# Circuit breaker на каждую зависимость (OpenAI, webhook лидов, webhook статусов):
+# если среди последних CIRCUIT_WINDOW запросов (не меньше CIRCUIT_MIN_CALLS)
+# доля ошибок не ниже CIRCUIT_FAILURE_RATE, запросы CIRCUIT_OPEN_SECONDS секунд
+# не делаются, затем CIRCUIT_HALF_OPEN_PROBES пробных. Доля > 1 — выключено.
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_WINDOW = int(os.environ.get("CIRCUIT_WINDOW", "20"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+# Защита от флуда до классификации: не больше FLOOD_MAX_MESSAGES сообщений
+# от пользователя за FLOOD_WINDOW секунд (0 — без лимита); почти-дубликаты
+# в чате за FLOOD_DUPLICATE_WINDOW секунд (0 — не искать) с расстоянием
+# SimHash не больше FLOOD_DUPLICATE_DISTANCE бит из 64
+FLOOD_MAX_MESSAGES = int(os.environ.get("FLOOD_MAX_MESSAGES", "10"))
+FLOOD_WINDOW = int(os.environ.get("FLOOD_WINDOW", "60"))
+FLOOD_DUPLICATE_WINDOW = int(os.environ.get("FLOOD_DUPLICATE_WINDOW", "600"))
+FLOOD_DUPLICATE_DISTANCE = int(os.environ.get("FLOOD_DUPLICATE_DISTANCE", "3"))
+
+# Хранилище лидов: классификация и статус по trace_id (SQLite)
+LEADS_PATH = os.environ.get("LEADS_PATH", "leads.sqlite3")
+
+# Быстрая классификация правилами: при уверенности не ниже порога
+# запрос к OpenAI не делается. Значение > 1 — правила выключены.
+RULES_MIN_CONFIDENCE = float(os.environ.get("RULES_MIN_CONFIDENCE", "0.85"))
+# Лиды правила по умолчанию не решают: summary и поля для Make и админа
+# даёт OpenAI. RULES_SKIP_LEADS=1 — уверенные лиды тоже без OpenAI.
+RULES_SKIP_LEADS = os.environ.get("RULES_SKIP_LEADS", "0").strip().lower() in ("1", "true", "yes")
+
+# Кэш классификации (LRU + TTL). Размер 0 — выключен.
+# CLASSIFY_CACHE_PATH — файл для сохранения кэша между перезапусками (пусто — только в памяти)
+CLASSIFY_CACHE_SIZE = int(os.environ.get("CLASSIFY_CACHE_SIZE", "2000"))
+CLASSIFY_CACHE_TTL = int(os.environ.get("CLASSIFY_CACHE_TTL", "86400"))  # секунд
+CLASSIFY_CACHE_PATH = os.environ.get("CLASSIFY_CACHE_PATH", "")
+
+# Кэш почти-дубликатов: сколько последних результатов хранить и порог
+# косинусной похожести текстов. Размер 0 — выключен.
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Локальная модель (scripts/train_local_model.py): файл .npz, пусто — выключена.
+# Заменяет статичный fallback; при уверенности не ниже LOCAL_MODEL_MIN_CONFIDENCE
+# запрос к OpenAI не делается (больше 1 — только как fallback).
+LOCAL_MODEL_PATH = os.environ.get("LOCAL_MODEL_PATH", "")
+LOCAL_MODEL_MIN_CONFIDENCE = float(os.environ.get("LOCAL_MODEL_MIN_CONFIDENCE", "2"))
+
+# Датасет для обучения локальной модели: пары (текст, ответ LLM) в JSONL, пусто — не пишется
+CLASSIFY_DATASET_PATH = os.environ.get("CLASSIFY_DATASET_PATH", "")
+
+# Максимум одновременных запросов к OpenAI
+OPENAI_CONCURRENCY = int(os.environ.get("OPENAI_CONCURRENCY", "20"))
+
+# Пакетная классификация: сообщения, пришедшие в пределах CLASSIFY_BATCH_WAIT_MS,
+# классифицируются одним запросом (до CLASSIFY_BATCH_SIZE штук). 0 или 1 — выключено.
+CLASSIFY_BATCH_SIZE = int(os.environ.get("CLASSIFY_BATCH_SIZE", "0"))
+CLASSIFY_BATCH_WAIT_MS = int(os.environ.get("CLASSIFY_BATCH_WAIT_MS", "50"))
+
 # Обязательные переменные
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 MAKE_WEBHOOK_URL = os.environ.get("MAKE_WEBHOOK_URL")
@@ -18,10 +111,53 @@ MAKE_WEBHOOK_URL = os.environ.get("MAKE_WEBHOOK_URL")
 # OpenAI (опционально, без них классификатор работает в fallback режиме)
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+# Structured outputs: модель отвечает строго по JSON Schema классификации
+# (нужна модель с поддержкой response_format json_schema)
+OPENAI_JSON_SCHEMA = os.environ.get("OPENAI_JSON_SCHEMA", "0").strip().lower() in ("1", "true", "yes")
+
+# Режим получения update: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling").strip().lower()
+
+# Роль процесса: "all" — всё в одном процессе (по умолчанию); "ingress" —
+# принимает update (BOT_MODE), кладёт их в общую очередь UPDATE_QUEUE_PATH
+# и доставляет outbox в Make; "worker" — обрабатывает update из очереди.
+# Worker'ов можно запустить сколько угодно, у каждого своё WORKER_NAME.
+BOT_ROLE = os.environ.get("BOT_ROLE", "all").strip().lower()
+UPDATE_QUEUE_PATH = os.environ.get("UPDATE_QUEUE_PATH", "updates.sqlite3")
+WORKER_NAME = os.environ.get("WORKER_NAME", "")
+WORKER_HEARTBEAT = 1  # секунд, период heartbeat worker'а
+WORKER_LEASE = 10     # секунд без heartbeat — worker считается упавшим
+
+# Webhook режим: локальный адрес HTTP-ресивера, путь, секрет и публичный URL,
+# который бот регистрирует в Telegram при старте
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+
+# Метрики Prometheus (GET /metrics): порт 0 — выключено
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Логи: уровень, формат ("text" или "json" — JSON lines) и файл с ротацией
+# по размеру (пусто — stdout). Запись идёт в фоновом потоке.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").strip().lower()
+LOG_FILE = os.environ.get("LOG_FILE", "")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "5"))
 
 # Опциональный chat_id админа для алертов
 ADMIN_CHAT_ID = os.environ.get("ADMIN_CHAT_ID")
 
+# Уведомления админу: больше ADMIN_DIGEST_THRESHOLD событий в минуту —
+# лиды и алерты копятся и уходят сводкой раз в ADMIN_DIGEST_INTERVAL секунд.
+# Одинаковые алерты в пределах ADMIN_ALERT_DEDUP_WINDOW секунд — один раз.
+ADMIN_DIGEST_THRESHOLD = int(os.environ.get("ADMIN_DIGEST_THRESHOLD", "10"))
+ADMIN_DIGEST_INTERVAL = int(os.environ.get("ADMIN_DIGEST_INTERVAL", "60"))
+ADMIN_ALERT_DEDUP_WINDOW = int(os.environ.get("ADMIN_ALERT_DEDUP_WINDOW", "300"))
+
 # Опциональный webhook для обновления статусов лидов
 MAKE_STATUS_WEBHOOK_URL = os.environ.get("MAKE_STATUS_WEBHOOK_URL")
 
@@ -36,6 +172,29 @@ def validate_config() -> None:
     if not MAKE_WEBHOOK_URL:
         missing.append("MAKE_WEBHOOK_URL")
 
+    if BOT_MODE not in ("polling", "webhook"):
+        print(f"[ERROR] Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling или webhook)")
+        sys.exit(1)
+
+    if BOT_ROLE not in ("all", "ingress", "worker"):
+        print(f"[ERROR] Неизвестный BOT_ROLE: {BOT_ROLE} (ожидается all, ingress или worker)")
+        sys.exit(1)
+
+    if LOG_FORMAT not in ("text", "json"):
+        print(f"[ERROR] Неизвестный LOG_FORMAT: {LOG_FORMAT} (ожидается text или json)")
+        sys.exit(1)
+
+    for name, value in (("TG_GLOBAL_RATE", TG_GLOBAL_RATE), ("TG_CHAT_RATE", TG_CHAT_RATE)):
+        if value <= 0:
+            print(f"[ERROR] {name} должен быть больше 0: {value}")
+            sys.exit(1)
+
+    if BOT_MODE == "webhook" and BOT_ROLE != "worker":
+        if not WEBHOOK_SECRET_TOKEN:
+            missing.append("WEBHOOK_SECRET_TOKEN")
+        if not WEBHOOK_URL:
+            missing.append("WEBHOOK_URL")
+
     if missing:
         print(f"[ERROR] Отсутствуют обязательные переменные окружения: {', '.join(missing)}")
         sys.exit(1)
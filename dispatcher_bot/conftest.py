@@ -0,0 +1,35 @@
+"""
+Общие фикстуры тестов: управляемые часы и фабрика circuit breaker на них
+(breaker нужен и своим тестам, и тестам classifier).
+"""
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    """Часы, которые идут только вручную: clock.now += секунды."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_breaker(clock):
+    """CircuitBreaker("test") на общих часах; параметры по умолчанию переопределяются."""
+
+    def make(**overrides):
+        options = {"failure_rate": 0.5, "min_calls": 4, "window": 10, "open_seconds": 30, "probes": 1}
+        options.update(overrides)
+        return CircuitBreaker("test", clock=clock, **options)
+
+    return make
@@ -0,0 +1,73 @@
+"""
+Запись датасета для локальной модели (JSONL для scripts/train_local_model.py).
+
+Как и логи (см. logging_setup), запись идёт не в event loop: write()
+только кладёт запись в очередь, файл дописывает один фоновый поток —
+строки разных сообщений не перемешиваются.
+"""
+
+import json
+import logging
+import queue
+import threading
+from typing import Any
+
+
+logger = logging.getLogger("dispatcher.dataset")
+
+# Сигнал потоку: дописать очередь и завершиться
+_STOP = object()
+
+
+class DatasetWriter:
+    """
+    Args:
+        path: JSONL-файл, в который дописываются записи
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Ставит запись в очередь (поток запускается при первой записи)."""
+        self._queue.put(record)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="dataset-writer", daemon=True)
+                    self._thread.start()
+
+    def close(self) -> None:
+        """Дописывает очередь и останавливает поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Всё, что накопилось, — одной записью в файл
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not _STOP]
+            if batch:
+                self._append(batch)
+
+    def _append(self, batch: list[dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Classification dataset write failed: {e}", extra={"trace_id": "-"})
@@ -0,0 +1,77 @@
+"""
+Бюджет времени на обработку одного сообщения.
+
+Deadline создаётся в handle_message и передаётся во все этапы
+(классификация, доставка в Make). Каждый этап берёт
+таймаут из остатка бюджета, а если остатка не хватает — переходит к своему
+fallback. Время этапов копится в Deadline и пишется в лог одной строкой.
+"""
+
+import copy
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import metrics
+
+
+_DEGRADED = metrics.counter(
+    "dispatcher_deadline_degraded_total", "Stages that fell back because the message deadline was short", ["stage"]
+)
+
+
+class Deadline:
+    """
+    Args:
+        budget: Секунд на всё сообщение (None или 0 — без ограничения)
+        clock: Источник времени (monotonic)
+    """
+
+    def __init__(self, budget: float | None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.started = clock()
+        self.expires_at = self.started + budget if budget else float("inf")
+        self.stages: dict[str, float] = {}
+        self.degraded: list[str] = []
+
+    def remaining(self) -> float:
+        """Сколько секунд бюджета осталось."""
+        return max(0.0, self.expires_at - self._clock())
+
+    def timeout(self, cap: float) -> float:
+        """Таймаут этапа: не больше cap и не больше остатка бюджета."""
+        return min(cap, self.remaining())
+
+    def leaving(self, reserve: float) -> "Deadline":
+        """
+        Бюджет для этапа, после которого нужно ещё reserve секунд: заканчивается
+        раньше, время этапов и деградации учитываются в этом же Deadline.
+        """
+        child = copy.copy(self)
+        child.expires_at = self.expires_at - reserve
+        return child
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self.started
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Учитывает время этапа name (повторные этапы суммируются)."""
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + self._clock() - started
+
+    def degrade(self, stage: str) -> None:
+        """Отмечает, что этап перешёл к fallback из-за нехватки бюджета."""
+        self.degraded.append(stage)
+        _DEGRADED.labels(stage=stage).inc()
+
+    def report(self) -> str:
+        """Время по этапам для лога: "classify=812ms outbox=2ms reply=35ms (degraded: classify)"."""
+        parts = [f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages.items()]
+        if self.degraded:
+            parts.append(f"(degraded: {', '.join(self.degraded)})")
+        return " ".join(parts)
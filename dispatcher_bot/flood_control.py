@@ -0,0 +1,194 @@
+"""
+Защита от флуда до классификации.
+
+Два фильтра:
+- лимит сообщений на пользователя в скользящем окне;
+- почти-дубликаты: SimHash текста сравнивается с недавними сообщениями
+  того же чата (расстояние Хэмминга).
+
+Память ограничена: состояние хранится для max_keys последних пользователей
+и чатов, самые давние вытесняются. Отсеянные сообщения не идут в OpenAI,
+Make и админу.
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+try:
+    import numpy as np
+except ImportError:  # Без numpy отсев почти-дубликатов выключен
+    np = None
+
+import metrics
+from cache import normalize_text
+from config import (
+    FLOOD_MAX_MESSAGES,
+    FLOOD_WINDOW,
+    FLOOD_DUPLICATE_WINDOW,
+    FLOOD_DUPLICATE_DISTANCE,
+)
+
+
+REASON_RATE = "rate"
+REASON_DUPLICATE = "duplicate"
+
+# Короче этого (после нормализации) дубликаты не ищем: "да", "ок" повторяются законно
+MIN_DUPLICATE_LENGTH = 20
+
+# Недавних отпечатков на чат
+CHAT_HISTORY = 20
+
+# Пользователей и чатов в памяти
+MAX_KEYS = 10000
+
+_SHINGLE = 3
+_DIGITS_RE = re.compile(r"\d")
+_PUNCTUATION_RE = re.compile(r"[^\w\s@]+")
+
+_SUPPRESSED = metrics.counter(
+    "dispatcher_flood_suppressed_total", "Messages dropped before classification by flood control", ["reason"]
+)
+
+
+def is_available() -> bool:
+    """Доступен ли отсев почти-дубликатов (установлен ли numpy)."""
+    return np is not None
+
+
+def _shingle_hash(shingle: str) -> int:
+    # Не hash(): он меняется от процесса к процессу (PYTHONHASHSEED),
+    # а отпечатки должны совпадать после рестарта и на другом worker'е
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    """
+    64-битный SimHash по символьным триграммам нормализованного текста
+    (регистр, пробелы, знаки препинания, @username, цифры не влияют).
+    """
+    text = _DIGITS_RE.sub("0", normalize_text(_PUNCTUATION_RE.sub(" ", text)))
+    shingles = {text[i:i + _SHINGLE] for i in range(max(1, len(text) - _SHINGLE + 1))}
+    hashes = np.fromiter((_shingle_hash(shingle) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int(np.packbits(votes[::-1]).view(">u8")[0])
+
+
+@dataclass
+class _UserState:
+    """
+    Время последних max_messages + 1 сообщений пользователя
+    и когда ему последний раз ответили об ограничении.
+    """
+    times: deque = field(default_factory=deque)
+    noticed_at: float = float("-inf")
+
+
+@dataclass
+class FloodDecision:
+    """Сообщение отсеяно: причина и нужно ли ответить пользователю (раз в окно)."""
+    reason: str
+    notify: bool
+
+
+class FloodGate:
+    """
+    Args:
+        max_messages: Сообщений от пользователя за window секунд (0 — без лимита)
+        window: Окно лимита, секунд
+        duplicate_window: Сколько секунд помнить сообщения чата (0 — без отсева дубликатов)
+        duplicate_distance: Максимальное расстояние Хэмминга SimHash для почти-дубликата
+    """
+
+    def __init__(
+        self,
+        max_messages: int = FLOOD_MAX_MESSAGES,
+        window: float = FLOOD_WINDOW,
+        duplicate_window: float = FLOOD_DUPLICATE_WINDOW,
+        duplicate_distance: int = FLOOD_DUPLICATE_DISTANCE,
+        max_keys: int = MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_messages = max_messages
+        self.window = window
+        self.duplicate_window = duplicate_window if is_available() else 0
+        self.duplicate_distance = duplicate_distance
+        self.max_keys = max_keys
+        self._clock = clock
+        self._users: OrderedDict[int, _UserState] = OrderedDict()
+        self._chats: OrderedDict[int, deque[tuple[float, int]]] = OrderedDict()
+
+    def _touch(self, table: OrderedDict, key: int, factory: Callable):
+        """Состояние по ключу; самые давние ключи вытесняются сверх max_keys."""
+        value = table.get(key)
+        if value is None:
+            value = factory()
+            table[key] = value
+            while len(table) > self.max_keys:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        return value
+
+    def _rate_limited(self, state: _UserState, now: float) -> bool:
+        times = state.times
+        while times and times[0] <= now - self.window:
+            times.popleft()
+        times.append(now)
+        return len(times) > self.max_messages
+
+    def _duplicate(self, chat_id: int, text: str, now: float) -> bool:
+        if len(normalize_text(text)) < MIN_DUPLICATE_LENGTH:
+            return False
+        history = self._touch(self._chats, chat_id, lambda: deque(maxlen=CHAT_HISTORY))
+        while history and history[0][0] <= now - self.duplicate_window:
+            history.popleft()
+
+        fingerprint = simhash(text)
+        if any((fingerprint ^ seen).bit_count() <= self.duplicate_distance for _, seen in history):
+            return True
+        history.append((now, fingerprint))
+        return False
+
+    def forget(self, chat_id: int, text: str) -> None:
+        """
+        Забывает отпечаток пропущенного сообщения (лид не удалось зафиксировать),
+        чтобы повтор пользователя не отсеялся как дубликат.
+        """
+        history = self._chats.get(chat_id)
+        if not history or self.duplicate_window <= 0:
+            return
+        fingerprint = simhash(text)
+        for entry in reversed(history):
+            if entry[1] == fingerprint:
+                history.remove(entry)
+                return
+
+    def check(self, user_id: int | None, chat_id: int, text: str) -> FloodDecision | None:
+        """
+        Проверяет сообщение. None — пропустить дальше, иначе — отсеять.
+        Каждое сообщение (и отсеянное) учитывается в лимите пользователя.
+        """
+        now = self._clock()
+        state = self._touch(
+            self._users, user_id if user_id is not None else chat_id,
+            lambda: _UserState(deque(maxlen=self.max_messages + 1))
+        )
+
+        reason = None
+        if self.max_messages > 0 and self._rate_limited(state, now):
+            reason = REASON_RATE
+        elif self.duplicate_window > 0 and self._duplicate(chat_id, text, now):
+            reason = REASON_DUPLICATE
+        if reason is None:
+            return None
+
+        _SUPPRESSED.labels(reason=reason).inc()
+        notify = now - state.noticed_at >= self.window
+        if notify:
+            state.noticed_at = now
+        return FloodDecision(reason, notify)
@@ -0,0 +1,207 @@
+"""
+Локальное хранилище лидов (SQLite).
+
+Каждое обращение записывается по trace_id вместе с классификацией и
+текущим статусом. Поиск и смена статуса — локальные запросы по индексам,
+без обращения к Make. Из этих данных перерисовывается сообщение админу.
+"""
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any
+
+
+STATUS_NEW = "new"
+
+_COLUMNS = (
+    "trace_id", "chat_id", "message_id", "user_id", "username", "name", "text",
+    "intent", "service", "confidence", "summary", "goal", "budget", "deadline_text", "contact",
+    "status", "status_version", "created_at", "updated_at",
+)
+
+
+@dataclass
+class Lead:
+    """Лид: обращение, классификация и текущий статус."""
+    trace_id: str
+    chat_id: int | None
+    message_id: int | None
+    user_id: int | None
+    username: str | None
+    name: str | None
+    text: str
+    intent: str
+    service: str
+    confidence: float
+    summary: str
+    goal: str
+    budget: Any
+    deadline_text: str | None
+    contact: str | None
+    status: str = STATUS_NEW
+    status_version: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> "Lead":
+        """Лид из payload для Make (bot.build_payload)."""
+        user = payload.get("user") or {}
+        now = time.time()
+        return cls(
+            trace_id=payload["trace_id"],
+            chat_id=payload.get("chat_id"),
+            message_id=payload.get("message_id"),
+            user_id=user.get("id"),
+            username=user.get("username"),
+            name=user.get("name"),
+            text=payload.get("text", ""),
+            intent=payload.get("intent", "other"),
+            service=payload.get("service", "unknown"),
+            confidence=payload.get("confidence", 0.0),
+            summary=payload.get("summary", ""),
+            goal=payload.get("goal", ""),
+            budget=payload.get("budget"),
+            deadline_text=payload.get("deadline_text"),
+            contact=payload.get("contact"),
+            created_at=now,
+            updated_at=now,
+        )
+
+
+class LeadStore:
+    """SQLite-таблица лидов с индексами по trace_id, chat_id, статусу, типу и дате."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leads (
+                trace_id TEXT PRIMARY KEY,
+                chat_id INTEGER,
+                message_id INTEGER,
+                user_id INTEGER,
+                username TEXT,
+                name TEXT,
+                text TEXT NOT NULL,
+                intent TEXT NOT NULL,
+                service TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                summary TEXT NOT NULL,
+                goal TEXT NOT NULL,
+                budget TEXT,
+                deadline_text TEXT,
+                contact TEXT,
+                status TEXT NOT NULL DEFAULT 'new',
+                status_version INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        for name, columns in (
+            ("idx_leads_chat", "chat_id, created_at"),
+            ("idx_leads_status", "status, created_at"),
+            ("idx_leads_intent_service", "intent, service, created_at"),
+            ("idx_leads_created", "created_at"),
+        ):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON leads ({columns})")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _lead(row: tuple) -> Lead:
+        lead = Lead(*row)
+        # budget хранится текстом: число или строка вида "40-60к"
+        if isinstance(lead.budget, str):
+            try:
+                lead.budget = int(lead.budget)
+            except ValueError:
+                try:
+                    lead.budget = float(lead.budget)
+                except ValueError:
+                    pass
+        return lead
+
+    def add(self, lead: Lead) -> None:
+        """
+        Записывает лид. Повтор того же trace_id (повторная доставка update)
+        обновляет классификацию, статус не трогает.
+        """
+        self._conn.execute(
+            f"""
+            INSERT INTO leads ({", ".join(_COLUMNS)})
+            VALUES ({", ".join("?" * len(_COLUMNS))})
+            ON CONFLICT (trace_id) DO UPDATE SET
+                intent = excluded.intent,
+                service = excluded.service,
+                confidence = excluded.confidence,
+                summary = excluded.summary,
+                goal = excluded.goal,
+                budget = excluded.budget,
+                deadline_text = excluded.deadline_text,
+                contact = excluded.contact,
+                updated_at = excluded.updated_at
+            """,
+            (
+                lead.trace_id, lead.chat_id, lead.message_id, lead.user_id, lead.username, lead.name, lead.text,
+                lead.intent, lead.service, lead.confidence, lead.summary, lead.goal,
+                None if lead.budget is None else str(lead.budget), lead.deadline_text, lead.contact,
+                lead.status, lead.status_version, lead.created_at, lead.updated_at,
+            )
+        )
+
+    def get(self, trace_id: str) -> Lead | None:
+        row = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM leads WHERE trace_id = ?", (trace_id,)
+        ).fetchone()
+        return self._lead(row) if row else None
+
+    def set_status(self, trace_id: str, status: str, version: int) -> Lead | None:
+        """
+        Меняет статус, если version новее сохранённой.
+        Возвращает лид после изменения (None — trace_id неизвестен).
+        """
+        self._conn.execute(
+            """
+            UPDATE leads SET status = ?, status_version = ?, updated_at = ?
+            WHERE trace_id = ? AND status_version < ?
+            """,
+            (status, version, time.time(), trace_id, version)
+        )
+        return self.get(trace_id)
+
+    def find(
+        self,
+        status: str | None = None,
+        intent: str | None = None,
+        service: str | None = None,
+        chat_id: int | None = None,
+        since: float | None = None,
+        limit: int = 50,
+    ) -> list[Lead]:
+        """Лиды по фильтрам, новые первыми."""
+        conditions, params = [], []
+        for column, value in (("status", status), ("intent", intent), ("service", service), ("chat_id", chat_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM leads {where} ORDER BY created_at DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [self._lead(row) for row in rows]
+
+    def count_by_status(self) -> dict[str, int]:
+        """Количество лидов по статусам."""
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM leads GROUP BY status").fetchall()
+        return dict(rows)
@@ -0,0 +1,294 @@
+"""
+Локальный классификатор intent/service без OpenAI.
+
+TF-IDF по хэшированным символьным n-граммам и две линейные softmax-модели
+(intent и service) на numpy. Обучается на парах (текст, классификация LLM)
+скриптом scripts/train_local_model.py и хранится в компактном .npz (веса
+в float16). Предсказание занимает доли миллисекунды. Вероятности
+калиброваны температурой на отложенной части обучающих данных.
+"""
+
+import json
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Без numpy локальная модель недоступна
+    np = None
+
+from cache import normalize_text
+
+
+FORMAT_VERSION = 1
+
+HEADS = ("intent", "service")
+
+_DIGITS_RE = re.compile(r"\d")
+
+# Температуры, из которых выбирается калибровочная (минимум NLL на отложенной выборке)
+_TEMPERATURES = (0.25, 0.35, 0.5, 0.7, 0.85, 1.0, 1.2, 1.5, 2.0, 2.5, 3.0, 4.0)
+
+
+def is_available() -> bool:
+    """Доступна ли модель (установлен ли numpy)."""
+    return np is not None
+
+
+def _ngram_counts(text: str, dim: int, ngram_range: tuple[int, int]) -> tuple["np.ndarray", "np.ndarray"]:
+    """Индексы хэшированных n-грамм и их количество. Цифры заменяются на 0."""
+    padded = f" {_DIGITS_RE.sub('0', normalize_text(text))} "
+    hashes = [
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % dim
+        for n in range(ngram_range[0], ngram_range[1] + 1)
+        for i in range(len(padded) - n + 1)
+    ]
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices, counts = np.unique(np.array(hashes, dtype=np.int64), return_counts=True)
+    return indices, counts.astype(np.float32)
+
+
+def _softmax(logits: "np.ndarray") -> "np.ndarray":
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+@dataclass
+class LocalPrediction:
+    """Предсказание локальной модели."""
+    intent: str
+    service: str
+    intent_confidence: float
+    service_confidence: float
+
+    @property
+    def confidence(self) -> float:
+        """Уверенность в паре intent/service — по менее уверенной голове."""
+        return min(self.intent_confidence, self.service_confidence)
+
+
+@dataclass
+class _Head:
+    """Линейный softmax-классификатор одного поля."""
+    labels: list[str]
+    weights: "np.ndarray"   # dim x классов
+    bias: "np.ndarray"      # классов
+    temperature: float = 1.0
+
+    def probabilities(self, indices: "np.ndarray", values: "np.ndarray") -> "np.ndarray":
+        logits = values @ self.weights[indices] + self.bias
+        return _softmax(logits / self.temperature)
+
+
+class LocalClassifier:
+    """
+    Args:
+        dim: Размер хэш-пространства n-грамм
+        ngram_range: Длины символьных n-грамм (от, до)
+        idf: IDF по каждому хэшу
+        heads: Модели полей intent и service
+        trained_on: Число примеров, на которых обучена модель
+    """
+
+    def __init__(self, dim: int, ngram_range: tuple[int, int], idf: "np.ndarray",
+                 heads: dict[str, _Head], trained_on: int = 0):
+        if np is None:
+            raise RuntimeError("numpy is required for LocalClassifier")
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.idf = idf
+        self.heads = heads
+        self.trained_on = trained_on
+
+    def features(self, text: str) -> tuple["np.ndarray", "np.ndarray"]:
+        """Разреженный TF-IDF вектор текста (индексы, значения), нормированный по L2."""
+        indices, counts = _ngram_counts(text, self.dim, self.ngram_range)
+        values = (1 + np.log(counts)) * self.idf[indices]
+        norm = np.linalg.norm(values)
+        return indices, (values / norm if norm else values)
+
+    def predict(self, text: str) -> LocalPrediction:
+        indices, values = self.features(text)
+        best = {}
+        for name in HEADS:
+            head = self.heads[name]
+            probabilities = head.probabilities(indices, values)
+            index = int(np.argmax(probabilities))
+            best[name] = (head.labels[index], float(probabilities[index]))
+        return LocalPrediction(
+            intent=best["intent"][0],
+            service=best["service"][0],
+            intent_confidence=best["intent"][1],
+            service_confidence=best["service"][1],
+        )
+
+    # ---------- Файл модели ----------
+
+    def save(self, path: str) -> None:
+        """Сохраняет модель в .npz (веса float16)."""
+        meta = {
+            "version": FORMAT_VERSION,
+            "dim": self.dim,
+            "ngram_range": list(self.ngram_range),
+            "trained_on": self.trained_on,
+            "heads": {name: {"labels": head.labels, "temperature": head.temperature} for name, head in self.heads.items()},
+        }
+        arrays = {"idf": self.idf.astype(np.float16)}
+        for name, head in self.heads.items():
+            arrays[f"{name}_weights"] = head.weights.astype(np.float16)
+            arrays[f"{name}_bias"] = head.bias.astype(np.float32)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        """
+        Загружает модель из .npz.
+
+        Raises:
+            ValueError: Файл не той версии или повреждён
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for LocalClassifier")
+        with np.load(path, allow_pickle=False) as data:
+            try:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != FORMAT_VERSION:
+                    raise ValueError(f"unsupported local model version: {meta.get('version')}")
+                heads = {
+                    name: _Head(
+                        labels=meta["heads"][name]["labels"],
+                        weights=data[f"{name}_weights"].astype(np.float32),
+                        bias=data[f"{name}_bias"].astype(np.float32),
+                        temperature=float(meta["heads"][name]["temperature"]),
+                    )
+                    for name in HEADS
+                }
+                return cls(
+                    dim=int(meta["dim"]),
+                    ngram_range=tuple(meta["ngram_range"]),
+                    idf=data["idf"].astype(np.float32),
+                    heads=heads,
+                    trained_on=int(meta.get("trained_on", 0)),
+                )
+            except KeyError as e:
+                raise ValueError(f"local model file is missing {e}") from None
+
+    # ---------- Обучение ----------
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: dict[str, Sequence[str]],
+        dim: int = 4096,
+        ngram_range: tuple[int, int] = (2, 4),
+        epochs: int = 40,
+        learning_rate: float = 0.05,
+        l2: float = 1e-4,
+        holdout: float = 0.2,
+        seed: int = 0,
+    ) -> tuple["LocalClassifier", dict[str, Any]]:
+        """
+        Обучает модель на текстах и метках по каждому полю (labels["intent"], labels["service"]).
+        Часть holdout откладывается для калибровки температуры и оценки точности.
+
+        Returns:
+            (модель, отчёт: размеры выборок, точность и температура по полям)
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for LocalClassifier")
+        if not texts:
+            raise ValueError("no training examples")
+
+        counts = [_ngram_counts(text, dim, ngram_range) for text in texts]
+        df = np.zeros(dim, dtype=np.float32)
+        for indices, _ in counts:
+            df[indices] += 1
+        idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+        model = cls(dim, ngram_range, idf, heads={}, trained_on=len(texts))
+        features = [model.features(text) for text in texts]
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(texts))
+        held = int(len(texts) * holdout) if len(texts) >= 20 else 0
+        train_features = [features[i] for i in order[held:]]
+        valid = _dense([features[i] for i in order[:held]], dim)
+
+        report: dict[str, Any] = {"examples": len(texts), "train": len(train_features), "holdout": held}
+        for name in HEADS:
+            head_labels = sorted(set(labels[name]))
+            targets = np.array([head_labels.index(label) for label in labels[name]])
+            head = _fit_head(train_features, targets[order[held:]], head_labels, dim, epochs, learning_rate, l2, rng)
+            accuracy = None
+            if held:
+                valid_targets = targets[order[:held]]
+                head.temperature = _calibrate(head, valid, valid_targets)
+                predicted = (valid @ head.weights + head.bias).argmax(axis=1)
+                accuracy = round(float((predicted == valid_targets).mean()), 3)
+            report[name] = {"accuracy": accuracy, "temperature": head.temperature, "labels": head_labels}
+            model.heads[name] = head
+        return model, report
+
+
+def _dense(features: list[tuple["np.ndarray", "np.ndarray"]], dim: int) -> "np.ndarray":
+    """Разреженные векторы -> плотная матрица."""
+    matrix = np.zeros((len(features), dim), dtype=np.float32)
+    for row, (indices, values) in enumerate(features):
+        matrix[row, indices] = values
+    return matrix
+
+
+def _fit_head(features: list[tuple["np.ndarray", "np.ndarray"]], targets: "np.ndarray", labels: list[str],
+              dim: int, epochs: int, learning_rate: float, l2: float, rng: "np.random.Generator",
+              batch_size: int = 64) -> _Head:
+    """
+    Мультиномиальная логистическая регрессия: мини-батчи, Adam, L2.
+    Плотная матрица строится только для текущего мини-батча.
+    """
+    classes = len(labels)
+    weights = np.zeros((dim, classes), dtype=np.float32)
+    bias = np.zeros(classes, dtype=np.float32)
+    onehot = np.eye(classes, dtype=np.float32)[targets]
+
+    params = [weights, bias]
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    beta1, beta2, eps, step = 0.9, 0.999, 1e-8, 0
+
+    for _ in range(epochs):
+        order = rng.permutation(len(features))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            x = _dense([features[i] for i in rows], dim)
+            error = (_softmax(x @ weights + bias) - onehot[rows]) / len(rows)
+            grads = [x.T @ error + l2 * weights, error.sum(axis=0)]
+
+            step += 1
+            for param, grad, m, v in zip(params, grads, moments, velocities):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+    return _Head(labels=labels, weights=weights, bias=bias)
+
+
+def _calibrate(head: _Head, matrix: "np.ndarray", targets: "np.ndarray") -> float:
+    """Температура с минимальным NLL на отложенной выборке."""
+    logits = matrix @ head.weights + head.bias
+    best_temperature, best_nll = 1.0, float("inf")
+    for temperature in _TEMPERATURES:
+        probabilities = _softmax(logits / temperature)
+        nll = float(-np.log(probabilities[np.arange(len(targets)), targets] + 1e-12).mean())
+        if nll < best_nll:
+            best_temperature, best_nll = temperature, nll
+    return best_temperature
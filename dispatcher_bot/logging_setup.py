@@ -0,0 +1,129 @@
+"""
+Логирование без задержек в event loop.
+
+Handler на логгере "dispatcher" только кладёт запись в очередь;
+форматирование и запись (stdout или файл с ротацией по размеру)
+идут в фоновом потоке QueueListener.
+
+Форматы:
+- text — [2026-01-31T12:00:00Z] [INFO] [trace_id] message
+- json — JSON-строка на запись: ts, level, logger, trace_id, msg,
+  плюс stage / duration_ms, если переданы в extra
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+
+# Необязательные поля из extra, которые попадают в JSON
+EXTRA_FIELDS = ("stage", "duration_ms")
+
+
+class _TimestampCache:
+    """UTC-метка с точностью до секунды: strftime один раз в секунду, а не на каждую запись."""
+
+    def __init__(self):
+        self._second = -1
+        self._text = ""
+
+    def format(self, created: float) -> str:
+        second = int(created)
+        if second != self._second:
+            self._text = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second))
+            self._second = second
+        return self._text
+
+
+class TraceFormatter(logging.Formatter):
+    """Форматтер с поддержкой trace_id."""
+
+    def __init__(self):
+        super().__init__()
+        self._timestamps = _TimestampCache()
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = self._timestamps.format(record.created)
+        level = record.levelname
+        trace_id = getattr(record, "trace_id", "-")
+        message = record.getMessage()
+        return f"[{timestamp}] [{level}] [{trace_id}] {message}"
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись (JSON lines)."""
+
+    def __init__(self):
+        super().__init__()
+        self._timestamps = _TimestampCache()
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self._timestamps.format(record.created),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for name in EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _build_output(log_format: str, path: str | None, max_bytes: int, backups: int) -> logging.Handler:
+    """Конечный handler, работающий в потоке QueueListener."""
+    if path:
+        output: logging.Handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+    else:
+        output = logging.StreamHandler(sys.stdout)
+        # UTF-8 для корректного вывода эмодзи в Windows
+        if hasattr(sys.stdout, "fileno"):
+            try:
+                output.stream = open(sys.stdout.fileno(), mode="w", encoding="utf-8", closefd=False)
+            except (OSError, ValueError):
+                pass
+    output.setFormatter(JsonFormatter() if log_format == "json" else TraceFormatter())
+    return output
+
+
+def setup_logging(
+    logger_name: str = "dispatcher",
+    level: int | str = logging.INFO,
+    log_format: str = "text",
+    path: str | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backups: int = 5,
+) -> logging.handlers.QueueListener:
+    """
+    Подключает к логгеру очередь и запускает фоновую запись.
+
+    Returns:
+        QueueListener — передать в stop_logging при остановке
+    """
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    output = _build_output(log_format, path, max_bytes, backups)
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: logging.handlers.QueueListener, logger_name: str = "dispatcher") -> None:
+    """Дописывает оставшиеся записи, останавливает поток и отключает очередь от логгера."""
+    logger = logging.getLogger(logger_name)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is listener.queue:
+            logger.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,174 @@
+"""
+Уведомления админу с защитой от лавины сообщений.
+
+При обычном потоке каждый лид уходит отдельным сообщением с кнопками
+статуса. Если за минуту событий больше порога, лиды копятся и уходят
+периодической сводкой (кнопки статуса — у каждого лида). Одинаковые
+алерты в пределах окна дедупликации отправляются один раз, повторы
+учитываются в сводке.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from config import (
+    ADMIN_DIGEST_THRESHOLD,
+    ADMIN_DIGEST_INTERVAL,
+    ADMIN_ALERT_DEDUP_WINDOW,
+)
+
+
+logger = logging.getLogger("dispatcher.notifier")
+
+# Лидов в одном сообщении-сводке: 5 кнопок статуса на лид, у Telegram лимит 100 кнопок
+DIGEST_MAX_LEADS = 20
+
+# Окно подсчёта частоты событий (секунд)
+RATE_WINDOW = 60
+
+SendFunc = Callable[[str, Any], Awaitable[None]]
+RenderLead = Callable[[Any], tuple[str, Any]]
+RenderDigest = Callable[[list[Any]], tuple[str, Any]]
+
+
+@dataclass
+class _AlertState:
+    """Алерт в окне дедупликации."""
+    text: str
+    first_seen: float
+    repeats: int = 0        # Повторы, ещё не попавшие в сводку
+    pending: bool = False   # Первое сообщение отложено до сводки
+
+
+class AdminNotifier:
+    """
+    Args:
+        send: Отправка сообщения админу (text, reply_markup)
+        render_lead: Лид -> (текст, клавиатура) для отдельного сообщения
+        render_digest: Список лидов -> (текст, клавиатура) для сводки
+        threshold: Событий в минуту, после которых включается режим сводки
+        interval: Период отправки сводки, секунд
+        dedup_window: Окно дедупликации одинаковых алертов, секунд
+    """
+
+    def __init__(
+        self,
+        send: SendFunc,
+        render_lead: RenderLead,
+        render_digest: RenderDigest,
+        threshold: int = ADMIN_DIGEST_THRESHOLD,
+        interval: float = ADMIN_DIGEST_INTERVAL,
+        dedup_window: float = ADMIN_ALERT_DEDUP_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._send = send
+        self._render_lead = render_lead
+        self._render_digest = render_digest
+        self._threshold = threshold
+        self._interval = interval
+        self._dedup_window = dedup_window
+        self._clock = clock
+        self._events: deque[float] = deque()
+        self._leads: list[Any] = []
+        self._alerts: dict[str, _AlertState] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def bursting(self) -> bool:
+        """Поток событий выше порога — копим в сводку."""
+        now = self._clock()
+        while self._events and self._events[0] <= now - RATE_WINDOW:
+            self._events.popleft()
+        return self._threshold > 0 and len(self._events) >= self._threshold
+
+    def _record_event(self) -> bool:
+        """Учитывает событие. Возвращает True, если его надо отложить в сводку."""
+        bursting = self.bursting
+        self._events.append(self._clock())
+        return bursting
+
+    async def _safe_send(self, text: str, markup: Any = None) -> None:
+        try:
+            await self._send(text, markup)
+        except Exception as e:
+            logger.error(f"Failed to send admin message: {e}", extra={"trace_id": "-"})
+
+    async def notify_lead(self, lead: Any) -> None:
+        """Новый лид: отдельным сообщением или в сводку."""
+        if self._record_event():
+            self._leads.append(lead)
+            return
+        text, markup = self._render_lead(lead)
+        await self._safe_send(text, markup)
+
+    async def alert(self, key: str, text: str) -> None:
+        """
+        Алерт об ошибке. key — сигнатура ошибки: одинаковые key в пределах
+        dedup_window отправляются один раз, повторы попадают в сводку.
+        """
+        now = self._clock()
+        state = self._alerts.get(key)
+        if state is not None and now - state.first_seen < self._dedup_window:
+            state.repeats += 1
+            return
+
+        state = _AlertState(text=text, first_seen=now)
+        self._alerts[key] = state
+        if self._record_event():
+            state.pending = True
+            return
+        await self._safe_send(text)
+
+    def _alerts_digest(self) -> str | None:
+        now = self._clock()
+        lines = []
+        for key, state in list(self._alerts.items()):
+            if state.pending or state.repeats:
+                suffix = f" (повторов: {state.repeats})" if state.repeats else ""
+                lines.append(f"• {state.text}{suffix}")
+                state.pending = False
+                state.repeats = 0
+            if now - state.first_seen >= self._dedup_window:
+                del self._alerts[key]
+        if not lines:
+            return None
+        return "Сводка ошибок\n\n" + "\n\n".join(lines)
+
+    async def flush(self) -> None:
+        """Отправляет накопленные лиды и алерты."""
+        leads, self._leads = self._leads, []
+        for start in range(0, len(leads), DIGEST_MAX_LEADS):
+            text, markup = self._render_digest(leads[start:start + DIGEST_MAX_LEADS])
+            await self._safe_send(text, markup)
+
+        alerts = self._alerts_digest()
+        if alerts:
+            await self._safe_send(alerts)
+
+    def start(self) -> None:
+        """Запускает периодическую отправку сводок."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает сводки и отправляет накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Admin digest error: {e}", extra={"trace_id": "-"})
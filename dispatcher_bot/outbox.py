@@ -0,0 +1,266 @@
+"""
+Надёжная локальная очередь (outbox) для отправки в Make.
+
+Payload сначала записывается в SQLite (WAL), пользователь сразу получает
+ответ, а фоновый воркер доставляет записи в Make с ретраями.
+Записи переживают перезапуск бота: при старте всё недоставленное
+отправляется повторно (at-least-once, дубликаты различаются по trace_id).
+Пока breaker Make открыт, записи откладываются без расхода попыток.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from circuit_breaker import CircuitOpenError
+from config import (
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_POLL_INTERVAL,
+)
+
+
+logger = logging.getLogger("dispatcher.outbox")
+
+# Состояния записи
+STATE_PENDING = "pending"
+STATE_DEAD = "dead"  # Попытки исчерпаны, запись оставлена для разбора
+
+
+@dataclass
+class OutboxItem:
+    """Запись outbox."""
+    kind: str
+    key: str
+    payload: dict[str, Any]
+    version: int
+    attempts: int
+
+
+class Outbox:
+    """SQLite-таблица исходящих payload, ключ — (kind, trace_id)."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (state, next_attempt_at)"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def put(self, kind: str, key: str, payload: dict[str, Any]) -> None:
+        """
+        Записывает payload. Если запись с таким ключом уже есть —
+        заменяет payload и увеличивает version.
+        """
+        now = time.time()
+        self._conn.execute(
+            """
+            INSERT INTO outbox (kind, key, payload, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (kind, key) DO UPDATE SET
+                payload = excluded.payload,
+                version = outbox.version + 1,
+                state = 'pending',
+                attempts = 0,
+                next_attempt_at = excluded.next_attempt_at,
+                last_error = NULL
+            """,
+            (kind, key, json.dumps(payload, ensure_ascii=False), now, now)
+        )
+
+    def due(self, limit: int, now: float | None = None) -> list[OutboxItem]:
+        """Записи, которые пора отправить (старые первыми)."""
+        now = time.time() if now is None else now
+        rows = self._conn.execute(
+            """
+            SELECT kind, key, payload, version, attempts FROM outbox
+            WHERE state = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, created_at
+            LIMIT ?
+            """,
+            (now, limit)
+        ).fetchall()
+        return [
+            OutboxItem(kind=kind, key=key, payload=json.loads(payload), version=version, attempts=attempts)
+            for kind, key, payload, version, attempts in rows
+        ]
+
+    def next_due_in(self, now: float | None = None) -> float | None:
+        """Через сколько секунд наступит ближайшая попытка (None — очередь пуста)."""
+        now = time.time() if now is None else now
+        row = self._conn.execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE state = 'pending'"
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def ack(self, item: OutboxItem) -> None:
+        """Удаляет доставленную запись (если за время отправки не появилась новая версия)."""
+        self._conn.execute(
+            "DELETE FROM outbox WHERE kind = ? AND key = ? AND version = ?",
+            (item.kind, item.key, item.version)
+        )
+
+    def fail(self, item: OutboxItem, error: str, retry_in: float | None) -> None:
+        """
+        Фиксирует неудачную попытку.
+        retry_in=None — попытки исчерпаны, запись помечается dead.
+        """
+        if retry_in is None:
+            state, next_attempt_at = STATE_DEAD, time.time()
+        else:
+            state, next_attempt_at = STATE_PENDING, time.time() + retry_in
+        self._conn.execute(
+            """
+            UPDATE outbox SET state = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE kind = ? AND key = ? AND version = ?
+            """,
+            (state, next_attempt_at, error[:500], item.kind, item.key, item.version)
+        )
+
+    def postpone(self, item: OutboxItem, retry_in: float, reason: str) -> None:
+        """Откладывает запись на retry_in секунд, не считая попытку."""
+        self._conn.execute(
+            """
+            UPDATE outbox SET next_attempt_at = ?, last_error = ?
+            WHERE kind = ? AND key = ? AND version = ? AND state = 'pending'
+            """,
+            (time.time() + retry_in, reason[:500], item.kind, item.key, item.version)
+        )
+
+    def count(self, state: str = STATE_PENDING) -> int:
+        """Количество записей в состоянии state."""
+        return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE state = ?", (state,)).fetchone()[0]
+
+
+Sender = Callable[[dict[str, Any]], Awaitable[None]]
+FailureCallback = Callable[[OutboxItem, str], Awaitable[None]]
+
+
+class OutboxDrainer:
+    """Фоновый воркер: доставляет записи outbox через senders[kind]."""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        senders: dict[str, Sender],
+        on_failure: FailureCallback | None = None,
+        concurrency: int = OUTBOX_CONCURRENCY,
+    ):
+        self.outbox = outbox
+        self._senders = senders
+        self._on_failure = on_failure
+        self._concurrency = concurrency
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        """Будит воркер после записи в outbox."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Запускает фоновую доставку в текущем event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает воркер. Недоставленное остаётся в outbox."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> float:
+        """Экспоненциальная пауза: base, 2*base, 4*base ... не больше OUTBOX_RETRY_MAX."""
+        return min(OUTBOX_RETRY_BASE * (2 ** attempts), OUTBOX_RETRY_MAX)
+
+    async def _deliver(self, item: OutboxItem) -> None:
+        sender = self._senders.get(item.kind)
+        if sender is None:
+            self.outbox.fail(item, f"no sender for kind={item.kind}", None)
+            return
+
+        try:
+            await sender(item.payload)
+        except CircuitOpenError as e:
+            # Make недоступен: ждём пробного запроса breaker, попытка не тратится
+            self.outbox.postpone(item, e.retry_in, str(e))
+            logger.debug(f"Outbox {item.kind} delivery postponed: {e}", extra={"trace_id": item.key})
+            return
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if item.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                self.outbox.fail(item, error, None)
+                logger.error(
+                    f"Outbox {item.kind} delivery gave up after {item.attempts + 1} attempts: {error}",
+                    extra={"trace_id": item.key}
+                )
+                if self._on_failure:
+                    await self._on_failure(item, error)
+            else:
+                delay = self._retry_delay(item.attempts)
+                self.outbox.fail(item, error, delay)
+                logger.warning(
+                    f"Outbox {item.kind} delivery failed (attempt {item.attempts + 1}), retry in {delay:.0f}s: {error}",
+                    extra={"trace_id": item.key}
+                )
+            return
+
+        self.outbox.ack(item)
+        logger.info(f"Outbox {item.kind} delivered", extra={"trace_id": item.key})
+
+    async def drain_once(self) -> int:
+        """Отправляет одну порцию готовых записей. Возвращает их количество."""
+        items = self.outbox.due(self._concurrency)
+        if items:
+            await asyncio.gather(*(self._deliver(item) for item in items))
+        return len(items)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.drain_once():
+                    continue
+                delay = self.outbox.next_due_in()
+            except Exception as e:
+                logger.error(f"Outbox drain error: {e}", extra={"trace_id": "-"})
+                delay = None
+
+            timeout = OUTBOX_POLL_INTERVAL if delay is None else min(delay, OUTBOX_POLL_INTERVAL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,253 @@
+"""
+Планировщик исходящих запросов к Telegram с лимитами и приоритетами.
+
+Подключается к PTB как rate limiter (ApplicationBuilder.rate_limiter):
+каждый запрос, отправляющий сообщение, ждёт токен в бакете своего чата
+и в общем бакете бота (правки — только в общем). Общий бакет выдаёт токены по приоритету:
+ответы пользователям -> правки сообщений админа (статусы) ->
+уведомления и алерты админу. При 429 (RetryAfter) отправка всех
+сообщений приостанавливается на retry_after и запрос повторяется.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import metrics
+from config import (
+    TG_GLOBAL_RATE,
+    TG_CHAT_RATE,
+    TG_CHAT_BURST,
+    TG_MAX_RETRIES,
+)
+
+
+logger = logging.getLogger("dispatcher.rate_limiter")
+
+# Приоритеты (меньше — раньше)
+PRIORITY_USER = 0        # Ответы пользователям
+PRIORITY_ADMIN_EDIT = 1  # Правки сообщений админа (статусы)
+PRIORITY_NOTIFY = 2      # Уведомления и алерты админу
+
+PRIORITY_NAMES = {
+    PRIORITY_USER: "user",
+    PRIORITY_ADMIN_EDIT: "admin_edit",
+    PRIORITY_NOTIFY: "notify",
+}
+
+# Методы Bot API, на которые действуют лимиты Telegram на сообщения
+_LIMITED_ENDPOINTS = {
+    "sendMessage", "sendPhoto", "sendDocument", "sendMediaGroup", "sendVideo", "sendAudio",
+    "sendVoice", "sendSticker", "sendAnimation", "sendLocation", "sendContact", "sendPoll",
+    "copyMessage", "forwardMessage",
+    "editMessageText", "editMessageReplyMarkup", "editMessageCaption", "editMessageMedia",
+}
+
+# Правки сообщений: у Telegram на них нет лимита «сообщение в секунду на чат»,
+# поэтому они ждут только общий бакет
+_EDIT_ENDPOINTS = {"editMessageText", "editMessageReplyMarkup", "editMessageCaption", "editMessageMedia"}
+
+# Сколько бакетов чатов держать, прежде чем чистить простаивающие
+_MAX_IDLE_CHAT_BUCKETS = 1000
+
+_QUEUE_DEPTH = metrics.gauge(
+    "dispatcher_tg_send_queue_depth", "Outgoing Telegram requests waiting for a rate limit token", ["priority"]
+)
+_WAIT_SECONDS = metrics.histogram(
+    "dispatcher_tg_send_wait_seconds", "Time an outgoing Telegram request waited for rate limits", ["priority"]
+)
+_RETRY_AFTER = metrics.counter("dispatcher_tg_retry_after_total", "Telegram 429 (RetryAfter) responses")
+
+
+class PriorityTokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше capacity про запас.
+    Ожидающие получают токены по приоритету, при равном — по очереди.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            # При нулевой скорости токены не появятся никогда, а расчёт паузы делит на rate
+            raise ValueError(f"rate must be positive, got {rate}")
+        self._rate = rate
+        # Меньше одного токена в запасе — запрос не получит токен никогда
+        self._capacity = max(1.0, capacity)
+        self._clock = clock
+        self._tokens = self._capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        """Бакет полон и никто не ждёт — его можно удалить."""
+        self._refill()
+        return not self._waiters and self._tokens >= self._capacity
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _can_take(self) -> bool:
+        return self._clock() >= self._paused_until and self._tokens >= 1
+
+    async def acquire(self, priority: int = 0) -> None:
+        """Ждёт токен."""
+        self._refill()
+        if not self._waiters and self._can_take():
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан — возвращаем
+                self._tokens += 1
+            self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+            heapq.heapify(self._waiters)
+            raise
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токены seconds секунд (ответ 429)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0
+        self._updated = self._clock()
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+        now = self._clock()
+        delay = max(0.0, self._paused_until - now, (1 - self._tokens) / self._rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters and self._can_take():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    Rate limiter для PTB.
+
+    Args:
+        admin_chat_id: Чат админа (сообщения туда — уведомления, правки — статусы)
+        global_rate: Сообщений в секунду на весь бот
+        chat_rate: Сообщений в секунду в один чат
+        chat_burst: Сколько сообщений в чат можно отправить подряд без паузы
+        max_retries: Сколько раз повторять запрос после 429
+
+    Приоритет определяется по методу и чату; его можно задать явно,
+    передав rate_limit_args=PRIORITY_* в метод бота.
+    """
+
+    def __init__(
+        self,
+        admin_chat_id: int | str | None = None,
+        global_rate: float = TG_GLOBAL_RATE,
+        chat_rate: float = TG_CHAT_RATE,
+        chat_burst: float = TG_CHAT_BURST,
+        max_retries: int = TG_MAX_RETRIES,
+    ):
+        if chat_rate <= 0:
+            raise ValueError(f"chat_rate must be positive, got {chat_rate}")
+        self._admin_chat_id = admin_chat_id
+        self._global = PriorityTokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: dict[Any, PriorityTokenBucket] = {}
+        self._max_retries = max_retries
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def priority(self, endpoint: str, data: dict[str, Any]) -> int:
+        """Приоритет запроса по методу и чату."""
+        if endpoint in _EDIT_ENDPOINTS:
+            return PRIORITY_ADMIN_EDIT
+        chat_id = data.get("chat_id")
+        if self._admin_chat_id is not None and str(chat_id) == str(self._admin_chat_id):
+            return PRIORITY_NOTIFY
+        return PRIORITY_USER
+
+    def _chat_bucket(self, chat_id: Any) -> PriorityTokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_IDLE_CHAT_BUCKETS:
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle}
+            bucket = PriorityTokenBucket(self._chat_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, chat_id: Any, priority: int) -> None:
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        depth = _QUEUE_DEPTH.labels(priority=label)
+        started = time.perf_counter()
+        depth.inc()
+        try:
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire(priority)
+            await self._global.acquire(priority)
+        finally:
+            depth.dec()
+            _WAIT_SECONDS.labels(priority=label).observe(time.perf_counter() - started)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> Any:
+        if endpoint not in _LIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        priority = rate_limit_args if rate_limit_args is not None else self.priority(endpoint, data)
+        chat_id = None if endpoint in _EDIT_ENDPOINTS else data.get("chat_id")
+
+        for attempt in range(self._max_retries + 1):
+            await self._wait_turn(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                _RETRY_AFTER.inc()
+                logger.warning(
+                    f"Telegram 429 on {endpoint}, pausing sends for {seconds:.0f}s", extra={"trace_id": "-"}
+                )
+                self._global.pause(seconds)
+                if attempt >= self._max_retries:
+                    raise
@@ -0,0 +1,115 @@
+"""
+Быстрая предклассификация по ключевым словам, без LLM.
+
+Словарь построен на тех же триггерах, что SYSTEM_PROMPT и extract_goal.
+Если уверенность правил не ниже RULES_MIN_CONFIDENCE, запрос к OpenAI
+не делается.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+
+# Максимальная длина "пустого" сообщения (привет/спасибо без запроса)
+SMALL_TALK_MAX_LEN = 40
+
+_SUPPORT_RE = re.compile(
+    r"не\s+работает|не\s+отвечает|не\s+приход|не\s+запуска|не\s+открыва|сломал|"
+    r"ошибк|\bбаг|глюч|завис|упал[аио]?\b|перестал[аио]?\b"
+)
+_QUESTION_RE = re.compile(
+    r"сколько\s+сто|\bцен[аыуе]\b|стоимост|прайс|какие\s+срок|сколько\s+времени|"
+    r"как\s+(?:заказать|работает|проходит)|можно\s+ли|возможно\s+ли|делаете\s+ли"
+)
+_REQUEST_RE = re.compile(
+    r"\bхочу\b|\bхотим\b|хотел[аи]?\s*бы|\bнуж(?:ен|на|но|ны)\b|интересует|\bищу\b|\bищем\b|заказать|сделайте"
+)
+_GREETING_RE = re.compile(r"^\W*(?:привет\w*|здравствуй\w*|добр\w+\s+(?:день|утро|вечер)|хай|hello|hi)\b")
+_THANKS_RE = re.compile(r"\b(?:спасибо|благодар\w*|thanks?)\b")
+
+# Услуги: паттерн ключевых слов
+_SERVICE_RES = {
+    "consultation": re.compile(r"консультац|разбор|аудит|стратеги|созвон"),
+    "ai_agents": re.compile(r"\bагент|\bai[-\s]?agent|автономн"),
+    "make_automation": re.compile(r"\bmake\b|\bмейк|сценари|интеграц|webhook|вебхук|автоматизац"),
+    "gpt_assistants": re.compile(r"чат[-\s]?бот|\bбот\w*|ассистент|\bgpt|\bfaq|помощник"),
+}
+
+_SUMMARIES = {
+    "support": "Техническая проблема",
+    "question": "Вопрос про услуги",
+    "lead": "Заявка на услугу",
+}
+
+
+@dataclass
+class RuleMatch:
+    """Результат правил: intent/service, уверенность и сработавшие правила."""
+    intent: str
+    service: str
+    confidence: float
+    summary: str
+    rules: list[str] = field(default_factory=list)
+
+
+def _detect_service(text: str, rules: list[str]) -> str:
+    """
+    Услуга с наибольшим числом совпадений; при равенстве — unknown.
+    Консультация важнее темы: "консультация по Make" — это consultation.
+    """
+    if _SERVICE_RES["consultation"].search(text):
+        rules.append("service:consultation")
+        return "consultation"
+
+    counts = {service: len(pattern.findall(text)) for service, pattern in _SERVICE_RES.items()}
+    best = max(counts.values())
+    if best == 0:
+        return "unknown"
+    leaders = [service for service, count in counts.items() if count == best]
+    if len(leaders) > 1:
+        rules.append("service_tie")
+        return "unknown"
+    rules.append(f"service:{leaders[0]}")
+    return leaders[0]
+
+
+def match(text: str) -> RuleMatch | None:
+    """
+    Классифицирует текст правилами.
+    Возвращает None, если ни одно правило не сработало.
+    """
+    text_lower = text.lower().strip()
+    if not text_lower:
+        return None
+
+    rules: list[str] = []
+    is_support = bool(_SUPPORT_RE.search(text_lower))
+    is_question = bool(_QUESTION_RE.search(text_lower))
+    is_request = bool(_REQUEST_RE.search(text_lower))
+
+    if not (is_support or is_question or is_request):
+        if len(text_lower) > SMALL_TALK_MAX_LEN:
+            return None
+        if _THANKS_RE.search(text_lower):
+            return RuleMatch("other", "unknown", 0.95, "Благодарность", ["thanks"])
+        if _GREETING_RE.search(text_lower):
+            return RuleMatch("other", "unknown", 0.95, "Приветствие", ["greeting"])
+        return None
+
+    service = _detect_service(text_lower, rules)
+    known_service = service != "unknown"
+
+    if is_support:
+        intent, confidence = "support", 0.9
+    elif is_question:
+        intent, confidence = "question", 0.85 if known_service else 0.75
+    else:
+        intent, confidence = "lead", 0.9 if known_service else 0.6
+    rules.insert(0, intent)
+
+    # Сигналы нескольких типов сразу — правила не уверены
+    if is_support + is_question + is_request > 1:
+        rules.append("mixed")
+        confidence -= 0.15
+
+    return RuleMatch(intent, service, round(confidence, 2), _SUMMARIES[intent], rules)
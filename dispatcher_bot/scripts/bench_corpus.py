@@ -0,0 +1,100 @@
+"""
+Корпус для бенчмарков: реалистичные входящие сообщения и "грязные" ответы LLM.
+"""
+
+# Входящие сообщения (как пишут клиенты)
+MESSAGES = [
+    "Хочу автоматизацию на Make, бюджет 30к, до понедельника, @nikkk8",
+    "Нужен бот для записи клиентов, бюджет 50к, до пятницы",
+    "Нужна интеграция с CRM, @username",
+    "Привет, как дела?",
+    "Спасибо!",
+    "Сколько стоит бот записи и какие сроки? @username",
+    "Бот не отвечает, ошибка при оплате, прикрепляю скрин, @username",
+    "Хочу консультацию по Make на этой неделе, 1 час, @username",
+    "Здравствуйте! Интересует ИИ-агент для поддержки клиентов 24/7, бюджет 100-150 тыс, срок до конца месяца. Телефон +7 999 123-45-67",
+    "Добрый день. Нам нужен GPT-ассистент, который отвечает на частые вопросы по услугам салона и записывает на приём. "
+    "Сейчас всё делает администратор вручную, теряем заявки вечером и в выходные. Бюджет около 80 000 руб, "
+    "хотелось бы запуститься до 10 февраля. Пишите в телеграм @salon_owner или на почту owner@salon.ru",
+    "ищем подрядчика: нужно связать amoCRM, Google Sheets и Telegram через webhooks, сценарии в Make уже есть, но падают",
+    "хотела бы разбор текущей воронки и стратегию автоматизации, созвон на час",
+    "Сценарий в Make перестал работать после обновления, срочно!!!",
+    "Нужен бот\nбюджет 50к\nсрок до пятницы\n@username",
+    "Хочу " + "очень " * 200 + "большого бота, бюджет 1 000 000 руб",
+    "нужен бот" + " " * 2000 + "x",
+    "хочу " + "до " * 1300,
+    "Ок",
+]
+
+# Ответы LLM: чистые, в markdown, с текстом вокруг, с вложенными скобками, битые
+LLM_OUTPUTS = [
+    '{"intent": "lead", "service": "make_automation", "confidence": 0.85, "summary": "Автоматизация на Make", '
+    '"fields": {"budget": 30000, "deadline_text": "до понедельника", "contact": "@nikkk8", "goal": "автоматизация"}}',
+    '```json\n{"intent": "question", "service": "gpt_assistants", "confidence": 0.7, "summary": "Вопрос о цене", '
+    '"fields": {"budget": null, "deadline_text": null, "contact": null, "goal": null}}\n```',
+    'Вот результат классификации:\n{"intent": "support", "service": "unknown", "confidence": 0.6, "summary": "Ошибка", '
+    '"fields": {"budget": null, "deadline_text": null, "contact": "@user", "goal": "починить бота"}}\nНадеюсь, это поможет!',
+    'Ответ {не json} и дальше {"intent": "lead", "service": "ai_agents", "confidence": 0.9, "summary": "Агент", '
+    '"fields": {"budget": "100-150к", "deadline_text": "до конца месяца", "contact": "+7 999 123-45-67", '
+    '"goal": "агент поддержки", "meta": {"nested": {"deep": [1, 2, {"x": "}"}]}}}}',
+    '{"intent": "lead", "service": "consultation", "confidence": "0.8", "summary": "Разбор", "goal": "стратегия"}',
+    '{"intent": "lead", "service": "make_automation", "confidence": 0.85, "summary": "обрезано", "fields": {"budget": 5',
+    "Извините, я не могу классифицировать это сообщение.",
+    "{" * 50 + "}" * 50 + ' текст {"intent": "other", "service": "unknown", "confidence": 0.1, "summary": "Не понятно"}',
+    "```\n" + '{"a": {"b": {"c": {"d": {}}}}} ' * 40 + "\n```",
+    # Длинное пояснение с фигурными скобками перед JSON
+    "Шаблон {name} для {service}, поле {budget} — число. " * 60
+    + '{"intent": "lead", "service": "ai_agents", "confidence": 0.8, "summary": "Агент", '
+    '"fields": {"budget": 90000, "deadline_text": null, "contact": null, "goal": "агент продаж"}}',
+    # Обрезанный ответ с глубокой вложенностью: валидного объекта нет
+    '{"intent": "lead", "fields": {"meta": ' * 40 + '{"x": 1',
+    # Несколько незакрытых объектов подряд, валидный — в конце
+    '{"intent": "lead", "summary": "обрезано\n' * 30
+    + '{"intent": "question", "service": "consultation", "confidence": 0.5, "summary": "Вопрос", "fields": {}}',
+]
+
+# Ответы в режиме json_schema (OPENAI_JSON_SCHEMA): ровно по схеме
+STRUCTURED_OUTPUTS = [
+    '{"intent": "lead", "service": "make_automation", "confidence": 0.85, "summary": "Автоматизация на Make", '
+    '"fields": {"budget": 30000, "deadline_text": "до понедельника", "contact": "@nikkk8", "goal": "автоматизация"}}',
+    '{"intent": "question", "service": "gpt_assistants", "confidence": 0.7, "summary": "Вопрос о цене", '
+    '"fields": {"budget": null, "deadline_text": null, "contact": null, "goal": null}}',
+    '{"intent": "support", "service": "unknown", "confidence": 0.6, "summary": "Ошибка", '
+    '"fields": {"budget": null, "deadline_text": null, "contact": "@user", "goal": "починить бота"}}',
+]
+
+# Значения бюджета, которые возвращает LLM
+BUDGETS = [
+    None, 50000, 49999.5, "50k", "50к", "40-60", "40-60к", "40 – 60k", "1 500", "1,5к", "около 50", "", "abc",
+]
+
+# Сырые результаты для _validate_result
+RAW_RESULTS = [
+    {"intent": "lead", "service": "make_automation", "confidence": 0.85, "summary": "Автоматизация",
+     "fields": {"budget": "30к", "deadline_text": "до понедельника", "contact": "@nikkk8", "goal": "сценарий"}},
+    {"intent": "spam", "service": "crypto", "confidence": "высокая", "summary": None, "fields": None},
+    {"intent": "question", "confidence": 2.5, "goal": "узнать цену"},
+    {},
+]
+
+# Аргументы для bot.build_payload
+PAYLOAD_ARGS = [
+    {
+        "trace_id": "123456789:55",
+        "created_at": "2026-01-31T12:00:00Z",
+        "chat_id": 123456789,
+        "message_id": 55,
+        "user_info": {"id": 111, "username": "username", "name": "Имя Фамилия"},
+        "text": MESSAGES[0],
+        "classification": RAW_RESULTS[0],
+    },
+    {
+        "trace_id": "123456789:56",
+        "created_at": "2026-01-31T12:00:01Z",
+        "chat_id": 123456789,
+        "message_id": 56,
+        "user_info": {"id": 111, "username": None, "name": None},
+        "text": MESSAGES[9],
+        "classification": {"intent": "other", "service": "unknown", "confidence": 0.0, "summary": "Не понятно"},
+    },
+]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарки горячих путей классификатора и payload.
+Работает офлайн, OpenAI ключ не нужен.
+
+Примеры:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --save bench_baseline.json
+    python scripts/benchmark.py --compare bench_baseline.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_DIR))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import bench_corpus  # noqa: E402
+from bot import build_payload  # noqa: E402
+from classifier import (  # noqa: E402
+    extract_goal, _extract_json, _parse_budget, _structured_result, _validate_result,
+)
+
+
+# Имя -> (функция одного вызова, входы)
+BENCHMARKS: dict[str, tuple[Callable[[Any], Any], list[Any]]] = {
+    "extract_goal": (extract_goal, bench_corpus.MESSAGES),
+    "_extract_json": (_extract_json, bench_corpus.LLM_OUTPUTS),
+    "_parse_budget": (_parse_budget, bench_corpus.BUDGETS),
+    "_validate_result": (_validate_result, bench_corpus.RAW_RESULTS),
+    # Ответ по схеме: обычный путь (поиск JSON + валидация) и быстрый (OPENAI_JSON_SCHEMA)
+    "parse_tolerant": (lambda text: _validate_result(_extract_json(text)), bench_corpus.STRUCTURED_OUTPUTS),
+    "parse_structured": (_structured_result, bench_corpus.STRUCTURED_OUTPUTS),
+    "build_payload": (lambda kwargs: build_payload(**kwargs), bench_corpus.PAYLOAD_ARGS),
+}
+
+
+def _percentile(sorted_values: list[int], percent: float) -> int:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def run_benchmark(func: Callable[[Any], Any], inputs: list[Any], rounds: int, warmup: int = 10) -> dict[str, float]:
+    """Прогоняет func по всем входам rounds раз, меряет каждый вызов."""
+    for _ in range(warmup):
+        for item in inputs:
+            func(item)
+
+    timings = []
+    clock = time.perf_counter_ns
+    for _ in range(rounds):
+        for item in inputs:
+            start = clock()
+            func(item)
+            timings.append(clock() - start)
+
+    timings.sort()
+    total_ns = sum(timings) or 1
+    return {
+        "calls": len(timings),
+        "ops_per_sec": round(len(timings) / total_ns * 1e9, 1),
+        "p50_us": round(_percentile(timings, 50) / 1000, 3),
+        "p99_us": round(_percentile(timings, 99) / 1000, 3),
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], max_regression: float) -> list[str]:
+    """Сравнивает с baseline. Возвращает список регрессий по ops/sec."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = current["ops_per_sec"] / base["ops_per_sec"]
+        print(f"  {name:<18} ops/sec {ratio:6.2f}x   p99 {base['p99_us']:>10.3f} -> {current['p99_us']:.3f} us")
+        if ratio < 1 - max_regression:
+            regressions.append(f"{name}: ops/sec {base['ops_per_sec']} -> {current['ops_per_sec']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей классификатора")
+    parser.add_argument("--rounds", type=int, default=200, help="Сколько раз прогнать корпус (по умолчанию: 200)")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="Запустить только этот бенчмарк")
+    parser.add_argument("--save", metavar="PATH", help="Сохранить результаты как JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Сравнить с JSON baseline")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.25,
+        help="Допустимое падение ops/sec относительно baseline (по умолчанию: 0.25)"
+    )
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    results = {}
+    print(f"{'benchmark':<18} {'ops/sec':>12} {'p50, us':>10} {'p99, us':>10}")
+    for name in names:
+        func, inputs = BENCHMARKS[name]
+        result = run_benchmark(func, inputs, args.rounds)
+        results[name] = result
+        print(f"{name:<18} {result['ops_per_sec']:>12,.0f} {result['p50_us']:>10.3f} {result['p99_us']:>10.3f}")
+
+    if args.save:
+        data = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "rounds": args.rounds,
+            "results": results,
+        }
+        Path(args.save).write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\nBaseline saved: {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"\nCompare with {args.compare}:")
+        regressions = compare(results, baseline.get("results", {}), args.max_regression)
+        if regressions:
+            print("\n[REGRESSION]")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n[OK] No regressions")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
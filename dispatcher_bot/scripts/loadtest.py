@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест: синтетические update через настоящий Application и handlers бота.
+
+Telegram Bot API, OpenAI и Make заменяются локальными заглушками на 127.0.0.1,
+поэтому тест работает офлайн. Update подаются в очередь Application с заданной
+частотой; задержка считается от постановки в очередь до конца обработки.
+
+Примеры:
+    python scripts/loadtest.py --rate 50 --duration 30
+    python scripts/loadtest.py --rate 200 --chats 500 --openai-latency-ms 800 --json load.json
+    CLASSIFY_CACHE_SIZE=0 SEMANTIC_CACHE_SIZE=0 RULES_MIN_CONFIDENCE=2 python scripts/loadtest.py
+
+Любые переменные окружения бота (кэши, OUTBOX_*, MAKE_BATCH_SIZE, UPDATE_WORKERS...)
+можно задать как обычно — скрипт переопределяет только адреса внешних сервисов.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_DIR))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from tornado import httpserver, httputil, netutil, web  # noqa: E402
+
+import bench_corpus  # noqa: E402
+from update_processor import ChatOrderedUpdateProcessor  # noqa: E402
+
+
+BOT_TOKEN = "123456:LOADTEST"
+ADMIN_CHAT_ID = 1
+FIRST_CHAT_ID = 100000
+
+# Реалистичные сообщения клиентов (без патологически длинных из бенчмарков)
+TEXTS = [text for text in bench_corpus.MESSAGES if len(text) < 500]
+
+# Ответ заглушки OpenAI
+LLM_RESULT = {
+    "intent": "lead",
+    "service": "gpt_assistants",
+    "confidence": 0.85,
+    "summary": "Заявка на бота",
+    "fields": {"budget": 50000, "deadline_text": "до пятницы", "contact": "@username", "goal": "бот для записи"},
+}
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    """'text=8,button=1,status=1' -> доли видов update."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("text", "button", "status"):
+            raise argparse.ArgumentTypeError(f"unknown update kind: {kind}")
+        mix[kind] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("mix is empty")
+    return mix
+
+
+StandInResponse = tuple[int, bytes, str]
+
+
+class _Route(web.RequestHandler):
+    """POST на путь заглушки -> async handle(request) -> (статус, тело, Content-Type)."""
+
+    def initialize(self, handle) -> None:
+        self.handle = handle
+
+    async def post(self) -> None:
+        status, body, content_type = await self.handle(self.request)
+        self.set_status(status)
+        self.set_header("Content-Type", content_type)
+        self.write(body)
+
+
+class StandInServer:
+    """HTTP сервер заглушек на свободном порту."""
+
+    def __init__(self, routes: dict):
+        app = web.Application([(path, _Route, {"handle": handle}) for path, handle in routes.items()])
+        self._server = httpserver.HTTPServer(app)
+        self.port = 0
+
+    async def start(self, host: str, port: int) -> None:
+        sockets = netutil.bind_sockets(port, host)
+        self.port = sockets[0].getsockname()[1]
+        self._server.add_sockets(sockets)
+
+    async def stop(self) -> None:
+        self._server.stop()
+        await self._server.close_all_connections()
+
+
+class StandIns:
+    """Заглушки Telegram Bot API, OpenAI и Make с настраиваемой задержкой."""
+
+    def __init__(self, telegram_latency: float, openai_latency: float, make_latency: float):
+        self.telegram_latency = telegram_latency
+        self.openai_latency = openai_latency
+        self.make_latency = make_latency
+        self.calls: Counter[str] = Counter()
+        self.make_items = 0
+        self._message_id = 0
+        self.server = StandInServer(self._routes())
+
+    def _routes(self) -> dict:
+        routes: dict = {
+            "/v1/chat/completions": self._openai,
+            "/make": self._make,
+            "/make-status": self._make,
+        }
+        for method in ("getMe", "sendMessage", "editMessageText", "answerCallbackQuery"):
+            routes[f"/bot{BOT_TOKEN}/{method}"] = self._telegram
+        return routes
+
+    @staticmethod
+    def _telegram_params(request: httputil.HTTPServerRequest) -> dict[str, Any]:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return json.loads(request.body or b"{}")
+        return {key: values[-1] for key, values in parse_qs(request.body.decode("utf-8")).items()}
+
+    async def _telegram(self, request: httputil.HTTPServerRequest) -> StandInResponse:
+        method = request.path.rsplit("/", 1)[-1]
+        self.calls[f"telegram.{method}"] += 1
+        await asyncio.sleep(self.telegram_latency)
+
+        params = self._telegram_params(request)
+        if method == "getMe":
+            result: Any = {"id": 123456, "is_bot": True, "first_name": "Dispatcher", "username": "dispatcher_load_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            chat_id = int(params.get("chat_id") or ADMIN_CHAT_ID)
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode(), "application/json"
+
+    async def _openai(self, request: httputil.HTTPServerRequest) -> StandInResponse:
+        self.calls["openai"] += 1
+        await asyncio.sleep(self.openai_latency)
+        content = json.dumps(LLM_RESULT, ensure_ascii=False)
+        # Пакетный запрос (CLASSIFY_BATCH_SIZE): во входе JSON-массив сообщений
+        try:
+            messages = json.loads(json.loads(request.body)["messages"][-1]["content"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            messages = None
+        if isinstance(messages, list):
+            self.calls["openai.batched"] += len(messages)
+            results = [{"index": item["index"], **LLM_RESULT} for item in messages]
+            content = json.dumps({"results": results}, ensure_ascii=False)
+        body = {
+            "id": f"chatcmpl-{self.calls['openai']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+        }
+        return 200, json.dumps(body).encode(), "application/json"
+
+    async def _make(self, request: httputil.HTTPServerRequest) -> StandInResponse:
+        self.calls[f"make{request.path[len('/make'):]}"] += 1
+        await asyncio.sleep(self.make_latency)
+        data = json.loads(request.body or b"null")
+        if request.path == "/make":
+            self.make_items += len(data) if isinstance(data, list) else 1
+        return 200, b"Accepted", "text/plain; charset=utf-8"
+
+
+class UpdateFactory:
+    """Синтетические update в формате Bot API: сообщения, кнопки, нажатия статуса."""
+
+    def __init__(self, chats: int, mix: dict[str, float], seed: int):
+        self._random = random.Random(seed)
+        self._chats = chats
+        self._kinds = list(mix)
+        self._weights = [mix[kind] for kind in self._kinds]
+        self._update_id = 0
+        self._message_ids: Counter[int] = Counter()
+        self._trace_ids: list[str] = []
+
+    def _message(self, text: str) -> dict[str, Any]:
+        chat_id = FIRST_CHAT_ID + self._random.randrange(self._chats)
+        self._message_ids[chat_id] += 1
+        return {
+            "message_id": self._message_ids[chat_id],
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load", "username": f"user{chat_id}"},
+            "text": text,
+        }
+
+    def next(self) -> tuple[str, dict[str, Any]]:
+        """Следующий update: (вид, данные)."""
+        import bot
+
+        self._update_id += 1
+        kind = self._random.choices(self._kinds, self._weights)[0]
+        # Нажимать статус можно только у уже отправленных заявок
+        if kind == "status" and not self._trace_ids:
+            kind = "text"
+
+        if kind == "text":
+            message = self._message(self._random.choice(TEXTS))
+            self._trace_ids.append(f"{message['chat']['id']}:{message['message_id']}")
+            return kind, {"update_id": self._update_id, "message": message}
+
+        if kind == "button":
+            message = self._message(self._random.choice([bot.BTN_NEW_REQUEST, bot.BTN_HOW_TO]))
+            return kind, {"update_id": self._update_id, "message": message}
+
+        trace_id = self._random.choice(self._trace_ids)
+        status = self._random.choice(bot.LEAD_STATUSES)
+        admin = {"id": ADMIN_CHAT_ID, "is_bot": False, "first_name": "Admin"}
+        return kind, {
+            "update_id": self._update_id,
+            "callback_query": {
+                "id": str(self._update_id),
+                "from": admin,
+                "chat_instance": "1",
+                "data": f"status|{trace_id}|{status}",
+                "message": {
+                    "message_id": self._update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": ADMIN_CHAT_ID, "type": "private"},
+                    "text": f"Новое обращение\ntrace_id: {trace_id}",
+                },
+            },
+        }
+
+
+class MeasuringProcessor(ChatOrderedUpdateProcessor):
+    """Тот же процессор, что у бота, плюс отметка времени окончания обработки."""
+
+    def __init__(self, workers: int, queue_depth: int):
+        super().__init__(workers, queue_depth)
+        self.enqueued_at: dict[int, tuple[str, float]] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.all_done = asyncio.Event()
+
+    async def do_process_update(self, update: object, coroutine: Any) -> None:
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            kind, started = self.enqueued_at.pop(update.update_id)
+            self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+            if not self.enqueued_at:
+                self.all_done.set()
+
+
+def _configure_env(stand_ins_url: str, outbox_dir: str) -> None:
+    """Адреса заглушек; остальное можно переопределить окружением."""
+    os.environ["BOT_TOKEN"] = BOT_TOKEN
+    os.environ["MAKE_WEBHOOK_URL"] = f"{stand_ins_url}/make"
+    os.environ["MAKE_STATUS_WEBHOOK_URL"] = f"{stand_ins_url}/make-status"
+    os.environ["OPENAI_BASE_URL"] = f"{stand_ins_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-loadtest"
+    os.environ["ADMIN_CHAT_ID"] = str(ADMIN_CHAT_ID)
+    os.environ.setdefault("OUTBOX_PATH", str(Path(outbox_dir) / "outbox.sqlite3"))
+    os.environ.setdefault("LEADS_PATH", str(Path(outbox_dir) / "leads.sqlite3"))
+    os.environ.setdefault("CLASSIFY_CACHE_PATH", "")
+    # Синтетические чаты шлют часто и повторяются — защита от флуда отсеяла бы нагрузку
+    os.environ.setdefault("FLOOD_MAX_MESSAGES", "0")
+    os.environ.setdefault("FLOOD_DUPLICATE_WINDOW", "0")
+
+
+async def run_load(args: argparse.Namespace) -> dict[str, Any]:
+    stand_ins = StandIns(args.telegram_latency_ms / 1000, args.openai_latency_ms / 1000, args.make_latency_ms / 1000)
+    await stand_ins.server.start("127.0.0.1", 0)
+    stand_ins_url = f"http://127.0.0.1:{stand_ins.server.port}"
+
+    outbox_dir = tempfile.mkdtemp(prefix="dispatcher-load-")
+    _configure_env(stand_ins_url, outbox_dir)
+
+    # config читает окружение при импорте — импортируем бота после настройки
+    import bot
+    from config import UPDATE_WORKERS, UPDATE_QUEUE_DEPTH
+    from logging_setup import setup_logging, stop_logging
+
+    # Логи бота пишутся фоновым потоком, как в проде
+    listener = setup_logging(level=logging.INFO if args.verbose else logging.WARNING)
+
+    processor = MeasuringProcessor(UPDATE_WORKERS, UPDATE_QUEUE_DEPTH)
+    application = bot.build_application(BOT_TOKEN, update_processor=processor, base_url=f"{stand_ins_url}/bot")
+
+    factory = UpdateFactory(args.chats, args.mix, args.seed)
+    try:
+        return await _drive(application, processor, stand_ins, factory, args)
+    finally:
+        stop_logging(listener)
+
+
+async def _drive(application: Any, processor: MeasuringProcessor, stand_ins: StandIns,
+                 factory: UpdateFactory, args: argparse.Namespace) -> dict[str, Any]:
+    """Подаёт update с заданной частотой, ждёт обработки и доставки в Make."""
+    import bot
+    from telegram import Update
+
+    total = max(1, int(args.rate * args.duration))
+    sent: Counter[str] = Counter()
+    errors: Counter[str] = Counter()
+
+    async def on_error(update: object, context: Any) -> None:
+        errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    try:
+        started = time.perf_counter()
+        for i in range(total):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind, data = factory.next()
+            sent[kind] += 1
+            processor.enqueued_at[data["update_id"]] = (kind, time.perf_counter())
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        send_finished = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(processor.all_done.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        processed_at = time.perf_counter()
+
+        # Ждём, пока фоновый воркер доставит outbox в Make
+        outbox = application.bot_data[bot.OUTBOX_DRAINER_KEY].outbox
+        drain_deadline = time.perf_counter() + args.timeout
+        while outbox.count() and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.05)
+        undelivered = outbox.count()
+    finally:
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+        await stand_ins.server.stop()
+
+    elapsed = processed_at - started
+    completed = sum(len(values) for values in processor.latencies.values())
+    latencies = {kind: sorted(values) for kind, values in processor.latencies.items()}
+    latencies["all"] = sorted(value for values in processor.latencies.values() for value in values)
+
+    return {
+        "target_rate": args.rate,
+        "sent": dict(sent),
+        "send_seconds": round(send_finished - started, 3),
+        "completed": completed,
+        "incomplete": len(processor.enqueued_at),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_sec": round(completed / elapsed, 1) if elapsed else 0.0,
+        "leads_per_min": round(sent["text"] / elapsed * 60, 1) if elapsed else 0.0,
+        "latency_ms": {
+            kind: {
+                "p50": round(_percentile(values, 50) * 1000, 1),
+                "p95": round(_percentile(values, 95) * 1000, 1),
+                "p99": round(_percentile(values, 99) * 1000, 1),
+                "max": round(values[-1] * 1000, 1) if values else 0.0,
+            }
+            for kind, values in latencies.items()
+        },
+        "errors": dict(errors),
+        "make_delivered": stand_ins.make_items,
+        "make_undelivered": undelivered,
+        "stand_in_calls": dict(stand_ins.calls),
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(f"target rate      {report['target_rate']} updates/sec")
+    print(f"sent             {sum(report['sent'].values())} {report['sent']} in {report['send_seconds']}s")
+    print(f"completed        {report['completed']} (incomplete: {report['incomplete']}) in {report['elapsed_seconds']}s")
+    print(f"throughput       {report['throughput_per_sec']} updates/sec, {report['leads_per_min']} leads/min")
+    print(f"errors           {sum(report['errors'].values())} {report['errors'] or ''}")
+    print(f"make             delivered {report['make_delivered']}, undelivered {report['make_undelivered']}")
+    print(f"stand-in calls   {report['stand_in_calls']}")
+    print()
+    print(f"{'latency, ms':<12} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for kind, values in report["latency_ms"].items():
+        print(f"{kind:<12} {values['p50']:>9.1f} {values['p95']:>9.1f} {values['p99']:>9.1f} {values['max']:>9.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест handlers бота на локальных заглушках")
+    parser.add_argument("--rate", type=float, default=20, help="Update в секунду (по умолчанию: 20)")
+    parser.add_argument("--duration", type=float, default=10, help="Длительность подачи, секунд (по умолчанию: 10)")
+    parser.add_argument("--chats", type=int, default=100, help="Число разных чатов (по умолчанию: 100)")
+    parser.add_argument(
+        "--mix", type=_parse_mix, default=_parse_mix("text=8,button=1,status=1"),
+        help="Доли видов update (по умолчанию: text=8,button=1,status=1)"
+    )
+    parser.add_argument("--telegram-latency-ms", type=float, default=30, help="Задержка заглушки Bot API (по умолчанию: 30)")
+    parser.add_argument("--openai-latency-ms", type=float, default=500, help="Задержка заглушки OpenAI (по умолчанию: 500)")
+    parser.add_argument("--make-latency-ms", type=float, default=100, help="Задержка заглушки Make (по умолчанию: 100)")
+    parser.add_argument("--timeout", type=float, default=60, help="Сколько ждать окончания обработки, секунд (по умолчанию: 60)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed генератора update")
+    parser.add_argument("--json", metavar="PATH", help="Сохранить отчёт в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Выводить INFO логи бота")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\nReport saved: {args.json}")
+
+    return 1 if report["incomplete"] or report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Обучение локальной модели классификации на ответах LLM.
+
+Данные — JSONL, который бот пишет при CLASSIFY_DATASET_PATH: по строке
+{"text": ..., "intent": ..., "service": ..., "confidence": ...} на каждый
+ответ OpenAI. Повторы одного текста схлопываются (берётся последний ответ).
+
+Примеры:
+    python scripts/train_local_model.py dataset.jsonl --out local_model.npz
+    python scripts/train_local_model.py old.jsonl new.jsonl --min-confidence 0.6 --epochs 60
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from cache import normalize_text  # noqa: E402
+from classifier import VALID_INTENTS, VALID_SERVICES  # noqa: E402
+from local_model import LocalClassifier, is_available  # noqa: E402
+
+
+def load_dataset(paths: list[str], min_confidence: float) -> tuple[list[str], dict[str, list[str]], Counter]:
+    """Тексты и метки из JSONL; пропущенные строки считаются по причинам."""
+    examples: dict[str, tuple[str, str, str]] = {}
+    skipped: Counter[str] = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    text, intent, service = record["text"], record["intent"], record["service"]
+                    confidence = float(record.get("confidence", 1.0))
+                    if not isinstance(text, str):
+                        raise TypeError("text is not a string")
+                except (ValueError, KeyError, TypeError):
+                    skipped["malformed"] += 1
+                    continue
+                if intent not in VALID_INTENTS or service not in VALID_SERVICES:
+                    skipped["unknown_label"] += 1
+                    continue
+                if confidence < min_confidence:
+                    skipped["low_confidence"] += 1
+                    continue
+                examples[normalize_text(text)] = (text, intent, service)
+
+    texts = [text for text, _, _ in examples.values()]
+    labels = {
+        "intent": [intent for _, intent, _ in examples.values()],
+        "service": [service for _, _, service in examples.values()],
+    }
+    return texts, labels, skipped
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Обучение локальной модели классификации на ответах LLM")
+    parser.add_argument("dataset", nargs="+", help="JSONL с парами (текст, классификация)")
+    parser.add_argument("--out", default="local_model.npz", help="Файл модели (по умолчанию: local_model.npz)")
+    parser.add_argument(
+        "--min-confidence", type=float, default=0.5,
+        help="Не учиться на ответах LLM с меньшей уверенностью (по умолчанию: 0.5)"
+    )
+    parser.add_argument("--dim", type=int, default=4096, help="Размер хэш-пространства n-грамм (по умолчанию: 4096)")
+    parser.add_argument("--epochs", type=int, default=40, help="Эпох обучения (по умолчанию: 40)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Доля для калибровки и оценки (по умолчанию: 0.2)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed разбиения и порядка примеров")
+    args = parser.parse_args()
+
+    if not is_available():
+        print("[ERROR] Нужен numpy: pip install numpy")
+        return 1
+
+    texts, labels, skipped = load_dataset(args.dataset, args.min_confidence)
+    print(f"Examples: {len(texts)} (skipped: {dict(skipped) or 0})")
+    if len(texts) < 20:
+        print("[ERROR] Слишком мало примеров для обучения (нужно хотя бы 20)")
+        return 1
+
+    started = time.perf_counter()
+    model, report = LocalClassifier.train(
+        texts, labels, dim=args.dim, epochs=args.epochs, holdout=args.holdout, seed=args.seed
+    )
+    print(f"Trained in {time.perf_counter() - started:.1f}s: train {report['train']}, holdout {report['holdout']}")
+    for name in ("intent", "service"):
+        head = report[name]
+        counts = Counter(labels[name])
+        print(f"  {name:<8} accuracy {head['accuracy']}  temperature {head['temperature']}  classes {dict(counts)}")
+
+    model.save(args.out)
+    sample = texts[:200]
+    started = time.perf_counter()
+    for text in sample:
+        model.predict(text)
+    per_call_us = (time.perf_counter() - started) / len(sample) * 1e6
+    print(f"Saved {args.out}: {Path(args.out).stat().st_size / 1024:.0f} KB, predict {per_call_us:.0f} us/message")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
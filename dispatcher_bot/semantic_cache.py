@@ -0,0 +1,93 @@
+"""
+Кэш почти-дубликатов для классификации.
+
+Тексты превращаются в локальные векторы (хэшированные символьные n-граммы),
+похожесть — косинус, одним матричным умножением по всем недавним сообщениям.
+Внешний сервис эмбеддингов не нужен.
+"""
+
+import json
+import re
+import zlib
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # Без numpy кэш почти-дубликатов выключен
+    np = None
+
+from cache import normalize_text
+
+
+_DIGITS_RE = re.compile(r"\d")
+
+
+def is_available() -> bool:
+    """Доступен ли кэш (установлен ли numpy)."""
+    return np is not None
+
+
+class SemanticCache:
+    """
+    Кольцевой буфер из capacity последних результатов с векторами текстов.
+    lookup возвращает результат самого похожего текста, если косинус >= threshold.
+    """
+
+    def __init__(self, capacity: int, threshold: float, dim: int = 1024, ngram: int = 3):
+        if np is None:
+            raise RuntimeError("numpy is required for SemanticCache")
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self.ngram = ngram
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._results: list[dict[str, Any] | None] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _vectorize(self, text: str) -> "np.ndarray":
+        """Нормированный вектор хэшированных n-грамм. Цифры заменяются на 0 (бюджеты не важны)."""
+        text = _DIGITS_RE.sub("0", normalize_text(text))
+        padded = f" {text} "
+        n = self.ngram
+        if len(padded) < n:
+            padded = padded.ljust(n)
+        indices = [zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dim for i in range(len(padded) - n + 1)]
+        vector = np.bincount(indices, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, text: str) -> tuple[dict[str, Any], float] | None:
+        """Возвращает (копия результата, похожесть) или None."""
+        if self._size == 0:
+            self.misses += 1
+            return None
+
+        vector = self._vectorize(text)
+        similarities = self._matrix[:self._size] @ vector
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(json.dumps(self._results[best])), similarity
+
+    def add(self, text: str, result: dict[str, Any]) -> None:
+        """Добавляет результат, вытесняя самый старый при переполнении."""
+        if self.capacity <= 0:
+            return
+        self._matrix[self._next] = self._vectorize(text)
+        self._results[self._next] = json.loads(json.dumps(result))
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий/промахов."""
+        return {"size": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,38 @@
+"""
+Приём update от Telegram через webhook (вместо long polling).
+
+HTTP-ресивер — встроенный в python-telegram-bot (extra [webhooks]):
+он проверяет секретный токен из заголовка X-Telegram-Bot-Api-Secret-Token,
+регистрирует webhook в Telegram при старте и кладёт update в очередь
+Application. Здесь — только параметры ресивера из config.
+"""
+
+from typing import Any
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_URL,
+)
+
+
+def webhook_options() -> dict[str, Any]:
+    """Параметры Application.run_webhook / Updater.start_webhook из config."""
+    return {
+        "listen": WEBHOOK_LISTEN,
+        "port": WEBHOOK_PORT,
+        "url_path": WEBHOOK_PATH.strip("/"),
+        "secret_token": WEBHOOK_SECRET_TOKEN,
+        "webhook_url": WEBHOOK_URL,
+        "allowed_updates": Update.ALL_TYPES,
+    }
+
+
+def run(application: Application) -> None:
+    """Запускает Application в режиме webhook до SIGINT/SIGTERM (для bot.main)."""
+    application.run_webhook(**webhook_options())
@@ -0,0 +1,83 @@
+"""
+Тесты для cache (кэш классификации).
+Запуск: python -m pytest test_cache.py
+"""
+
+import json
+
+from cache import ResultCache, make_key, normalize_text
+
+
+def test_normalize_text():
+    """Регистр, пробелы и @username не влияют на ключ."""
+    assert normalize_text("  Сколько   СТОИТ? @user_1 ") == "сколько стоит?"
+    assert make_key("Сколько стоит?", "m", "p") == make_key("сколько  стоит? @x", "m", "p")
+    assert make_key("Сколько стоит?", "m", "p") != make_key("Сколько стоит?", "m2", "p")
+    assert make_key("Сколько стоит?", "m", "p") != make_key("Сколько стоит?", "m", "p2")
+
+
+def test_lru_eviction():
+    """При переполнении вытесняется давно не использованная запись."""
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    cache.get("a")
+    cache.put("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    """Истёкшая запись — промах."""
+    import cache as cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ResultCache(max_size=10, ttl=5)
+    cache.put("a", {"v": 1})
+    now[0] += 6
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_returns_copies():
+    """Изменение полученного значения не портит кэш."""
+    cache = ResultCache(max_size=10, ttl=60)
+    cache.put("a", {"fields": {"contact": "@a"}})
+    cache.get("a")["fields"]["contact"] = "@b"
+
+    assert cache.get("a")["fields"]["contact"] == "@a"
+
+
+def test_persistence(tmp_path):
+    """save/load переносит записи между экземплярами."""
+    path = str(tmp_path / "cache.json")
+    cache = ResultCache(max_size=10, ttl=60, path=path)
+    cache.put("a", {"v": 1})
+    cache.save()
+
+    restored = ResultCache(max_size=10, ttl=60, path=path)
+    assert restored.load() == 1
+    assert restored.get("a") == {"v": 1}
+
+
+def test_load_skips_corrupt_entries(tmp_path):
+    """Записи с неверными типами пропускаются, остальные загружаются."""
+    path = tmp_path / "cache.json"
+    far = 4102444800  # 2100 год
+    path.write_text(json.dumps([
+        ["ok", far, {"v": 1}],
+        ["bad_expires", "soon", {"v": 2}],
+        ["null_expires", None, {"v": 3}],
+        ["bad_value", far, "not a dict"],
+        [["list", "key"], far, {"v": 4}],
+        ["short", far],
+    ]), encoding="utf-8")
+
+    cache = ResultCache(max_size=10, ttl=60, path=str(path))
+    assert cache.load() == 1
+    assert cache.get("ok") == {"v": 1}
+    assert cache.get("bad_value") is None
@@ -0,0 +1,130 @@
+"""
+Тесты для circuit breaker: открытие по доле ошибок, half-open и пробные запросы.
+Запуск: python -m pytest test_circuit_breaker.py
+"""
+
+import asyncio
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import (
+    CircuitOpenError,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+)
+
+
+async def _ok():
+    return "ok"
+
+
+async def _fail():
+    raise RuntimeError("down")
+
+
+async def _raise(error):
+    raise error
+
+
+def test_opens_on_failure_rate(make_breaker):
+    """Открывается, когда ошибок не меньше failure_rate и запросов не меньше min_calls."""
+    breaker = make_breaker()
+    breaker.success(breaker.allow())
+    breaker.failure(breaker.allow())
+    breaker.success(breaker.allow())
+    assert breaker.state == STATE_CLOSED  # 1 ошибка из 3: меньше min_calls
+
+    breaker.failure(breaker.allow())  # 2 из 4
+    assert breaker.state == STATE_OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_in == pytest.approx(30)
+
+
+def test_half_open_probe_closes_or_reopens(clock, make_breaker):
+    """Через open_seconds — один пробный запрос: успех закрывает, ошибка снова открывает."""
+    breaker = make_breaker(min_calls=1)
+    breaker.failure(breaker.allow())
+
+    clock.now += 30
+    assert breaker.state == STATE_HALF_OPEN
+    probe = breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # Пробный уже идёт
+    breaker.failure(probe)
+    assert breaker.state == STATE_OPEN
+
+    clock.now += 30
+    breaker.success(breaker.allow())
+    assert breaker.state == STATE_CLOSED
+    breaker.success(breaker.allow())
+
+
+def test_stale_result_is_ignored(make_breaker):
+    """Результат запроса, начатого до открытия, не закрывает breaker."""
+    breaker = make_breaker(min_calls=1)
+    slow = breaker.allow()
+    breaker.failure(breaker.allow())
+    assert breaker.state == STATE_OPEN
+
+    breaker.success(slow)
+    assert breaker.state == STATE_OPEN
+
+
+def test_call_classifies_errors_and_releases_on_cancel(clock, make_breaker):
+    """call(): is_failure=False — ответ живого сервиса; отмена освобождает пробный запрос."""
+    breaker = make_breaker(min_calls=1)
+
+    with pytest.raises(ValueError):
+        asyncio.run(breaker.call(lambda: _raise(ValueError("4xx")), is_failure=lambda e: False))
+    assert breaker.state == STATE_CLOSED
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(breaker.call(_fail))
+    clock.now += 30
+
+    async def cancelled_probe():
+        task = asyncio.create_task(breaker.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await breaker.call(_ok)
+
+    assert asyncio.run(cancelled_probe()) == "ok"
+    assert breaker.state == STATE_CLOSED
+
+
+def test_listener_sees_transitions(clock, make_breaker):
+    """Подписчики получают смену состояния; ошибка подписчика не ломает breaker."""
+    seen = []
+
+    def listener(breaker, state):
+        seen.append((breaker.name, state))
+
+    def broken(breaker, state):
+        raise RuntimeError("listener bug")
+
+    circuit_breaker.add_listener(broken)
+    circuit_breaker.add_listener(listener)
+    try:
+        breaker = make_breaker(min_calls=1)
+        breaker.failure(breaker.allow())
+        clock.now += 30
+        breaker.success(breaker.allow())
+    finally:
+        circuit_breaker.remove_listener(broken)
+        circuit_breaker.remove_listener(listener)
+
+    assert seen == [("test", STATE_OPEN), ("test", STATE_HALF_OPEN), ("test", STATE_CLOSED)]
+
+
+def test_disabled_with_rate_above_one(make_breaker):
+    """failure_rate > 1 — breaker никогда не открывается."""
+    breaker = make_breaker(failure_rate=1.5, min_calls=1)
+    for _ in range(20):
+        breaker.failure(breaker.allow())
+    assert breaker.state == STATE_CLOSED
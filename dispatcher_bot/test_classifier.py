@@ -0,0 +1,408 @@
+"""
+Тесты для classifier.
+Запуск: python -m pytest test_classifier.py
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import classifier
+from cache import ResultCache
+from circuit_breaker import CircuitBreaker
+from deadline import Deadline
+
+
+class FakeCompletions:
+    """Имитация client.chat.completions с задержкой и счётчиком параллелизма."""
+
+    def __init__(self, content: str, delay: float = 0.05):
+        self.content = content
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.kwargs = kwargs
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _fake_client(completions: FakeCompletions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Каждый тест — с пустым кэшем, без кэша почти-дубликатов, без правил и с закрытым breaker."""
+    cache = ResultCache(100, 60)
+    monkeypatch.setattr(classifier, "_cache", cache)
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai"))
+    monkeypatch.setattr(classifier, "_semantic_cache", None)
+    monkeypatch.setattr(classifier, "RULES_MIN_CONFIDENCE", 2.0)
+    return cache
+
+
+def test_classify_async_concurrency_cap(monkeypatch):
+    """classify_async не превышает OPENAI_CONCURRENCY и не блокирует loop."""
+    completions = FakeCompletions(
+        '{"intent": "lead", "service": "make_automation", "confidence": 0.9, '
+        '"summary": "Автоматизация", "fields": {"goal": "сценарий Make"}}'
+    )
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "OPENAI_CONCURRENCY", 3)
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+    async def run():
+        return await asyncio.gather(*(classifier.classify_async(f"Нужен сценарий {i}") for i in range(10)))
+
+    results = asyncio.run(run())
+
+    assert completions.calls == 10
+    assert completions.max_in_flight == 3
+    assert all(r["intent"] == "lead" for r in results)
+    assert results[0]["fields"]["goal"] == "сценарий Make"
+
+
+def test_classify_async_fallback_on_error(monkeypatch):
+    """Ошибка OpenAI -> fallback с goal из текста."""
+
+    class BrokenCompletions:
+        async def create(self, **kwargs):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(BrokenCompletions()))
+
+    result = asyncio.run(classifier.classify_async("Нужна интеграция с CRM, @username"))
+
+    assert result["intent"] == "other"
+    assert result["confidence"] == 0.0
+    assert "интеграци" in result["fields"]["goal"]
+
+
+def test_cache_hit_skips_llm(monkeypatch, fresh_cache):
+    """Повтор с другим регистром/@username берётся из кэша, контакт — из нового текста."""
+    completions = FakeCompletions(
+        '{"intent": "question", "service": "unknown", "confidence": 0.8, '
+        '"summary": "Вопрос о цене", "fields": {"contact": "@alice"}}'
+    )
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+    first = asyncio.run(classifier.classify_async("Сколько стоит бот? @alice"))
+    second = asyncio.run(classifier.classify_async("сколько  стоит бот? @bob"))
+
+    assert completions.calls == 1
+    assert second["summary"] == first["summary"]
+    assert second["fields"]["contact"] == "@bob"
+    assert fresh_cache.stats()["hits"] == 1
+
+
+def test_cache_hit_picks_up_new_contact(monkeypatch):
+    """Закэшировано без контакта, повтор с @username -> контакт из нового текста."""
+    completions = FakeCompletions(
+        '{"intent": "lead", "service": "tg_bot", "confidence": 0.9, '
+        '"summary": "Бот записи", "fields": {"budget": 50000, "contact": null}}'
+    )
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+    asyncio.run(classifier.classify_async("Нужен бот для записи клиентов, бюджет 50к"))
+    second = asyncio.run(classifier.classify_async("Нужен бот для записи клиентов, бюджет 50к @newclient"))
+
+    assert completions.calls == 1
+    assert second["fields"]["contact"] == "@newclient"
+
+
+def test_near_duplicate_reextracts_fields(monkeypatch):
+    """Почти-дубликат не идёт в LLM, бюджет и контакт — из нового текста."""
+    pytest.importorskip("numpy")
+    from semantic_cache import SemanticCache
+
+    completions = FakeCompletions(
+        '{"intent": "lead", "service": "gpt_assistants", "confidence": 0.9, '
+        '"summary": "Бот записи", "fields": {"budget": 50000, "contact": "@alice", "goal": "бот записи"}}'
+    )
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+    monkeypatch.setattr(classifier, "_semantic_cache", SemanticCache(10, 0.9))
+
+    asyncio.run(classifier.classify_async("Нужен бот записи, бюджет 50к, до пятницы, @alice"))
+    result = asyncio.run(classifier.classify_async("Нужен бот записи, бюджет 70к, до пятницы, @bob_smith"))
+
+    assert completions.calls == 1
+    assert result["intent"] == "lead"
+    assert result["fields"]["budget"] == 70000
+    assert result["fields"]["contact"] == "@bob_smith"
+
+
+def test_extract_budget():
+    """Бюджет из текста для почти-дубликатов."""
+    assert classifier.extract_budget("Нужен бот, бюджет 50к") == 50000
+    assert classifier.extract_budget("бюджет: 40-60 тыс") == 40000
+    assert classifier.extract_budget("готовы заплатить 50 000 руб") == 50000
+    assert classifier.extract_budget("Привет") is None
+
+
+STRUCTURED = (
+    '{"intent": "lead", "service": "ai_agents", "confidence": 1.5, "summary": "Агент", '
+    '"fields": {"budget": 90000, "deadline_text": null, "contact": "@client", "goal": " агент продаж "}}'
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"intent": "lead"}\n```', {"intent": "lead"}),
+    ('Шаблон {name}: {"intent": "question", "fields": {"goal": "}"}} конец', {"intent": "question", "fields": {"goal": "}"}}),
+    ('Ответ {не json} и {} потом {"intent": "support"}', {"intent": "support"}),
+    ('{"intent": "lead", "fields": {"budget": 5', None),
+    ("Не могу классифицировать", None),
+])
+def test_extract_json(text, expected):
+    """JSON-объект находится в markdown и пояснениях, битый и пустой пропускаются."""
+    assert classifier._extract_json(text) == expected
+
+
+def test_structured_result_matches_validate():
+    """Быстрый путь по схеме даёт то же, что обычная валидация."""
+    fast = classifier._structured_result(STRUCTURED)
+    assert fast == classifier._validate_result(classifier._extract_json(STRUCTURED))
+    assert fast["confidence"] == 1.0
+    assert fast["fields"]["goal"] == "агент продаж"
+    assert classifier._structured_result(" " + STRUCTURED + "\n") == fast
+
+
+@pytest.mark.parametrize("text", [
+    '{"intent": "lead"}',
+    STRUCTURED.replace('"ai_agents"', '"crypto"'),
+    STRUCTURED.replace('"fields": {', '"extra": 1, "fields": {'),
+    "```json\n" + STRUCTURED + "\n```",
+    STRUCTURED + ' {"intent": "other"}',
+    STRUCTURED + " Готово.",
+])
+def test_structured_result_rejects_off_schema(text):
+    """Ответ не по схеме — None, его разбирает обычный путь."""
+    assert classifier._structured_result(text) is None
+
+
+def test_json_schema_option(monkeypatch):
+    """OPENAI_JSON_SCHEMA передаёт response_format со схемой; ответ не по схеме тоже разбирается."""
+    completions = FakeCompletions("Результат: " + STRUCTURED, delay=0)
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "OPENAI_JSON_SCHEMA", True)
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+    result = asyncio.run(classifier.classify_async("Нужен агент продаж"))
+
+    assert completions.kwargs["response_format"]["json_schema"]["schema"] is classifier.CLASSIFICATION_SCHEMA
+    assert result["service"] == "ai_agents"
+    assert result["fields"]["contact"] == "@client"
+
+
+class BatchCompletions:
+    """Отвечает на пакетный запрос по индексам; drop — индексы, которые «теряет» модель."""
+
+    SERVICES = ["ai_agents", "make_automation", "gpt_assistants", "consultation"]
+
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        system, user = kwargs["messages"]
+        self.requests.append(system["content"])
+        await asyncio.sleep(0)
+        if system["content"] == classifier.BATCH_PROMPT:
+            items = [
+                {"index": item["index"], "intent": "lead", "service": self.SERVICES[item["index"] % 4],
+                 "confidence": 0.9, "summary": item["text"], "fields": {"goal": f"цель {item['index']}"}}
+                for item in json.loads(user["content"]) if item["index"] not in self.drop
+            ]
+            content = json.dumps({"results": items}, ensure_ascii=False)
+        else:
+            content = ('{"intent": "question", "service": "unknown", "confidence": 0.5, '
+                       '"summary": "отдельно", "fields": {}}')
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _batching(monkeypatch, completions, size=8):
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "CLASSIFY_BATCH_SIZE", size)
+    monkeypatch.setattr(classifier, "CLASSIFY_BATCH_WAIT_MS", 20)
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+
+def _classify_all(texts):
+    async def run():
+        return await asyncio.gather(*(classifier.classify_async(text) for text in texts))
+
+    return asyncio.run(run())
+
+
+def test_batch_splits_results_by_index(monkeypatch):
+    """Сообщения одного окна — один запрос; каждый получает свой результат."""
+    completions = BatchCompletions()
+    _batching(monkeypatch, completions, size=4)
+
+    texts = [f"Сообщение номер {i}" for i in range(6)]
+    results = _classify_all(texts)
+
+    # 4 — по размеру пачки, оставшиеся 2 — по таймеру
+    assert completions.requests == [classifier.BATCH_PROMPT] * 2
+    assert [r["summary"] for r in results] == texts
+    assert [r["service"] for r in results] == [BatchCompletions.SERVICES[i % 4] for i in (0, 1, 2, 3, 0, 1)]
+    assert results[5]["fields"]["goal"] == "цель 1"
+
+
+def test_batch_unparsed_items_fall_back_to_single_calls(monkeypatch):
+    """Пропущенный в ответе элемент классифицируется отдельным запросом."""
+    completions = BatchCompletions(drop={1})
+    _batching(monkeypatch, completions)
+
+    results = _classify_all(["Первое сообщение", "Второе сообщение", "Третье сообщение"])
+
+    assert completions.requests == [classifier.BATCH_PROMPT, classifier.SYSTEM_PROMPT]
+    assert [r["summary"] for r in results] == ["Первое сообщение", "отдельно", "Третье сообщение"]
+
+
+def test_batch_single_message_uses_regular_request(monkeypatch):
+    """Одно сообщение в окне — обычный запрос без пакетного промпта."""
+    completions = BatchCompletions()
+    _batching(monkeypatch, completions)
+
+    result = asyncio.run(classifier.classify_async("Одно сообщение"))
+
+    assert completions.requests == [classifier.SYSTEM_PROMPT]
+    assert result["summary"] == "отдельно"
+
+
+def test_batch_request_error_falls_back(monkeypatch):
+    """Ошибка пакетного запроса -> fallback у всех сообщений пачки."""
+
+    class BrokenCompletions:
+        async def create(self, **kwargs):
+            raise RuntimeError("boom")
+
+    _batching(monkeypatch, BrokenCompletions())
+
+    results = _classify_all(["Нужна интеграция с CRM", "Нужен бот"])
+
+    assert [r["intent"] for r in results] == ["other", "other"]
+
+
+def test_open_circuit_falls_back_without_llm(monkeypatch):
+    """После серии ошибок OpenAI breaker открывается: fallback сразу, без запроса."""
+
+    class BrokenCompletions:
+        calls = 0
+
+        async def create(self, **kwargs):
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    completions = BrokenCompletions()
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai", min_calls=3, open_seconds=60))
+
+    async def run():
+        return [await classifier.classify_async(f"Нужна интеграция {i}") for i in range(10)]
+
+    results = asyncio.run(run())
+
+    assert completions.calls == 3
+    assert all(r["intent"] == "other" for r in results)
+
+
+def test_deadline_cuts_slow_llm(monkeypatch):
+    """Медленный OpenAI обрывается по бюджету: fallback в пределах бюджета, breaker не открывается."""
+    completions = FakeCompletions('{"intent": "lead"}', delay=5)
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai", min_calls=1))
+
+    deadline = Deadline(0.6)
+    result = asyncio.run(classifier.classify_async("Нужна интеграция с CRM", deadline=deadline))
+
+    assert result["intent"] == "other"
+    assert deadline.elapsed < 1
+    assert deadline.degraded == ["classify"]
+    assert classifier._breaker.state == "closed"
+
+
+def test_short_budget_skips_llm(monkeypatch):
+    """Остатка бюджета меньше MIN_LLM_BUDGET — OpenAI не вызывается."""
+    completions = FakeCompletions('{"intent": "lead"}')
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(completions))
+
+    result = asyncio.run(classifier.classify_async("Нужна интеграция с CRM", deadline=Deadline(0.1)))
+
+    assert result["intent"] == "other"
+    assert completions.calls == 0
+
+
+def test_client_timeout_without_deadline_is_llm_error(monkeypatch):
+    """TimeoutError клиента без Deadline -> обычный fallback, а не падение."""
+
+    class TimingOutCompletions:
+        async def create(self, **kwargs):
+            raise TimeoutError("read timeout")
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(TimingOutCompletions()))
+
+    result = asyncio.run(classifier.classify_async("Нужна интеграция с CRM"))
+
+    assert result["intent"] == "other"
+    assert result["confidence"] == 0.0
+
+
+def test_client_timeout_within_deadline_is_llm_error(monkeypatch):
+    """TimeoutError клиента при неисчерпанном бюджете — ошибка OpenAI (breaker), а не обрыв по бюджету."""
+
+    class TimingOutCompletions:
+        async def create(self, **kwargs):
+            raise TimeoutError("read timeout")
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", _fake_client(TimingOutCompletions()))
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai", min_calls=1))
+
+    deadline = Deadline(30)
+    result = asyncio.run(classifier.classify_async("Нужна интеграция с CRM", deadline=deadline))
+
+    assert result["intent"] == "other"
+    assert deadline.degraded == []
+    assert classifier._breaker.state == "open"
+
+
+def test_sync_client_error_keeps_probe_slot(monkeypatch, clock, make_breaker):
+    """Ошибка создания клиента в half-open не занимает пробный запрос."""
+    import openai
+
+    breaker = make_breaker(min_calls=1)
+    breaker.failure(breaker.allow())
+    clock.now += 30
+    monkeypatch.setattr(classifier, "_breaker", breaker)
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+
+    def broken_client(**kwargs):
+        raise RuntimeError("bad config")
+
+    monkeypatch.setattr(openai, "OpenAI", broken_client)
+    assert classifier.classify("Нужна интеграция с CRM")["intent"] == "other"
+
+    assert breaker.state == "half_open"
+    breaker.allow()  # Пробный запрос всё ещё доступен
@@ -0,0 +1,159 @@
+"""
+Тесты для запуска несколькими процессами: что поднимает каждая роль и полный путь update через worker.
+Запуск: python -m pytest test_cluster.py
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from telegram import Bot, Chat, Message, User
+
+import bot
+import classifier
+import cluster
+from cache import ResultCache
+from circuit_breaker import CircuitBreaker
+from leads import LeadStore
+from outbox import Outbox
+from update_queue import UpdateQueue
+
+
+LEAD_TEXT = "Нужен бот записи, бюджет 50к, срок до пятницы, @username"
+
+LLM_ANSWER = (
+    '{"intent": "lead", "service": "gpt_assistants", "confidence": 0.9, "summary": "Бот записи", '
+    '"fields": {"budget": 50000, "deadline_text": "до пятницы", "contact": "@username", "goal": "бот записи"}}'
+)
+
+
+def message_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1769860800,
+            "chat": {"id": chat_id, "type": "private", "first_name": "Имя"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Имя", "username": "username"},
+            "text": text,
+        },
+    }
+
+
+class FakeCompletions:
+    """OpenAI chat.completions: всегда отвечает LLM_ANSWER."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=LLM_ANSWER))])
+
+
+@pytest.fixture
+def role(monkeypatch, tmp_path):
+    """Пути outbox/лидов/кэша во временной папке, без админа и метрик; роль задаёт тест."""
+    monkeypatch.setattr(bot, "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(bot, "LEADS_PATH", str(tmp_path / "leads.sqlite3"))
+    monkeypatch.setattr(bot, "ADMIN_CHAT_ID", None)
+    monkeypatch.setattr(bot, "METRICS_PORT", 0)
+    monkeypatch.setattr(classifier, "_cache", ResultCache(100, 60, str(tmp_path / "cache.json")))
+    monkeypatch.setattr(classifier, "_semantic_cache", None)
+    monkeypatch.setattr(classifier, "_local_model", None)
+    monkeypatch.setattr(classifier, "_dataset", None)
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai"))
+    monkeypatch.setattr(classifier, "RULES_MIN_CONFIDENCE", 2.0)
+
+    def set_role(name: str) -> None:
+        monkeypatch.setattr(bot, "BOT_ROLE", name)
+
+    return set_role
+
+
+def test_roles_start_only_their_state(role, tmp_path):
+    """Ingress доставляет outbox, но не держит состояние handlers; worker — наоборот."""
+    cache_path = tmp_path / "cache.json"
+    started = {}
+
+    async def start(name):
+        role(name)
+        application = bot.build_application("123456:TEST")
+        await bot.on_startup(application)
+        data = dict(application.bot_data)
+        started[name] = (data, data[bot.OUTBOX_DRAINER_KEY]._task is not None)
+        classifier.get_cache().put("k", {"intent": "lead"})
+        await bot.on_shutdown(application)
+
+    asyncio.run(start("ingress"))
+    assert not cache_path.exists()  # Ingress не классифицирует и кэш не сохраняет
+    asyncio.run(start("worker"))
+    assert cache_path.exists()
+
+    ingress, delivering = started["ingress"]
+    assert delivering
+    assert bot.LEAD_STORE_KEY not in ingress and bot.FLOOD_GATE_KEY not in ingress
+
+    worker, delivering = started["worker"]
+    assert not delivering
+    assert bot.LEAD_STORE_KEY in worker and bot.FLOOD_GATE_KEY in worker
+
+
+def test_worker_handles_message_end_to_end(role, monkeypatch, tmp_path):
+    """
+    Update из общей очереди проходит настоящий handle_message в роли worker:
+    классификация, payload в outbox (без доставки), лид в хранилище, ответ пользователю.
+    """
+    role("worker")
+    completions = FakeCompletions()
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    replies = []
+
+    async def get_me(self, *args, **kwargs):
+        # Как настоящий get_me: запоминает пользователя бота (Bot.bot, Bot.id)
+        self._bot_user = User(123456, "Dispatcher", is_bot=True, username="dispatcher_test_bot")
+        return self._bot_user
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        replies.append((chat_id, text))
+        chat = Chat(chat_id, Chat.PRIVATE)
+        return Message(len(replies), datetime.now(timezone.utc), chat, text=text)
+
+    monkeypatch.setattr(Bot, "get_me", get_me)
+    monkeypatch.setattr(Bot, "send_message", send_message)
+
+    queue = UpdateQueue(str(tmp_path / "updates.sqlite3"))
+    queue.put(message_update(1, chat_id=123456789, text=LEAD_TEXT))
+    application = bot.build_application("123456:TEST")
+
+    async def run():
+        stop = asyncio.Event()
+        worker = asyncio.create_task(cluster.serve_worker(application, queue, "w1", concurrency=4, stop=stop))
+        deadline = time.monotonic() + 10
+        while (queue.count() or not replies) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.wait_for(worker, 10)
+
+    try:
+        asyncio.run(run())
+    finally:
+        queue.close()
+
+    assert completions.calls == 1
+    assert len(replies) == 1
+    chat_id, text = replies[0]
+    assert chat_id == 123456789
+    assert text.startswith("Принято\nТип: lead\nУслуга: gpt_assistants")
+
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    assert outbox.count() == 1  # Worker только пишет в outbox, доставляет ingress
+    outbox.close()
+
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    lead = store.get("123456789:1")
+    store.close()
+    assert lead is not None
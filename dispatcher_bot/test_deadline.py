@@ -0,0 +1,43 @@
+"""
+Тесты для бюджета времени на сообщение.
+Запуск: python -m pytest test_deadline.py
+"""
+
+import pytest
+
+from deadline import Deadline
+
+
+def test_remaining_and_timeout(clock):
+    """Таймаут этапа — не больше cap и остатка; после истечения — 0."""
+    deadline = Deadline(8, clock=clock)
+
+    clock.now += 3
+    assert deadline.remaining() == pytest.approx(5)
+    assert deadline.timeout(25) == pytest.approx(5)
+    assert deadline.timeout(2) == 2
+
+    clock.now += 10
+    assert deadline.remaining() == 0
+
+
+def test_no_budget_is_unbounded():
+    """Бюджет 0 — таймауты из config без изменений."""
+    deadline = Deadline(0)
+    assert deadline.timeout(25) == 25
+
+
+def test_leaving_shares_stages(clock):
+    """leaving(): этап заканчивается раньше, но время и деградации пишутся в общий Deadline."""
+    deadline = Deadline(8, clock=clock)
+    classify = deadline.leaving(2)
+    assert classify.remaining() == pytest.approx(6)
+
+    with deadline.stage("classify"):
+        clock.now += 6.5
+        classify.degrade("classify")
+    with deadline.stage("reply"):
+        clock.now += 0.04
+
+    assert deadline.remaining() == pytest.approx(1.46)
+    assert deadline.report() == "classify=6500ms reply=40ms (degraded: classify)"
@@ -0,0 +1,78 @@
+"""
+Тесты линейного времени для извлечения goal/полей.
+Запуск: python -m pytest test_extraction.py
+"""
+
+import timeit
+
+import pytest
+
+from classifier import extract_goal, extract_budget, _extract_json, _parse_budget
+
+
+# Патологические входы: длинные пробелы, повторы "до", триггеры без терминатора
+ADVERSARIAL = {
+    "spaces_after_goal": lambda n: "нужен бот" + " " * n + "x",
+    "repeated_do": lambda n: "хочу " + "до " * (n // 3),
+    "triggers_without_terminator": lambda n: "хочу x\n" * (n // 7),
+    "digits": lambda n: "хочу а" + "1" * n,
+    "long_word": lambda n: "хочу до " + "д" * n,
+    "budget_spaces": lambda n: "бюджет" + " " * n + "50к",
+}
+
+# Ответы LLM: скобки в пояснениях, обрезанная вложенность, незакрытые строки
+ADVERSARIAL_JSON = {
+    "prose_braces": lambda n: "шаблон {name} " * (n // 14) + '{"intent": "lead"}',
+    "open_braces": lambda n: "{" * n,
+    "truncated_nesting": lambda n: '{"a": ' * (n // 6),
+    "unterminated_strings": lambda n: '{"a": "x\n' * (n // 9),
+    "unterminated_strings_closed": lambda n: '{"a": "x\n' * (n // 9) + "}",
+}
+
+
+def _best_time(func, text: str) -> float:
+    return min(timeit.repeat(lambda: func(text), number=10, repeat=5))
+
+
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL))
+@pytest.mark.parametrize("func", [extract_goal, extract_budget])
+def test_linear_time(name, func):
+    """Рост длины в 8 раз не должен замедлять извлечение больше чем в ~24 раза (квадрат дал бы 64)."""
+    make = ADVERSARIAL[name]
+    small = _best_time(func, make(512))
+    large = _best_time(func, make(4096))
+
+    assert large < max(small, 1e-4) * 24, f"{func.__name__}/{name}: {small:.5f}s -> {large:.5f}s"
+
+
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL_JSON))
+def test_extract_json_linear_time(name):
+    """Поиск JSON в ответе LLM не пересканирует текст с каждой скобки."""
+    make = ADVERSARIAL_JSON[name]
+    small = _best_time(_extract_json, make(512))
+    large = _best_time(_extract_json, make(4096))
+
+    assert large < max(small, 1e-4) * 24, f"_extract_json/{name}: {small:.5f}s -> {large:.5f}s"
+
+
+def test_telegram_max_length_is_fast():
+    """Сообщение максимальной длины Telegram (4096) обрабатывается быстрее 20 мс."""
+    for make in ADVERSARIAL.values():
+        text = make(4096)
+        assert _best_time(extract_goal, text) / 10 < 0.02
+
+
+def test_goal_edge_cases():
+    """Поведение прежних regex сохранено в пограничных случаях."""
+    assert extract_goal("Нужен бот для записи\nбюджет 50к") == ""
+    assert extract_goal("Нужен бот хочу сайт, до пятницы") == "сайт"
+    assert extract_goal("Интересует автоматизация заявок до пятницы") == "автоматизация заявок до пятницы"
+    assert extract_goal("Нужен бот записи до 10 февраля") == "бот записи"
+
+
+def test_parse_budget():
+    """Диапазоны и суффиксы тысяч."""
+    assert _parse_budget("40-60k") == 40000
+    assert _parse_budget("50к") == 50000
+    assert _parse_budget("1 500") == 1500
+    assert _parse_budget("абв") is None
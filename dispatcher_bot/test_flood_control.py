@@ -0,0 +1,105 @@
+"""
+Тесты для защиты от флуда: лимит на пользователя, почти-дубликаты, ограничение памяти.
+Запуск: python -m pytest test_flood_control.py
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from flood_control import FloodGate, simhash, REASON_RATE, REASON_DUPLICATE
+
+pytest.importorskip("numpy")
+
+
+LEAD = "Здравствуйте! Нужен чат-бот для записи клиентов в салон, бюджет 50к"
+
+
+@pytest.fixture
+def make_gate(clock):
+    """FloodGate на общих часах; параметры по умолчанию переопределяются."""
+
+    def make(**overrides):
+        options = {"max_messages": 3, "window": 60, "duplicate_window": 600, "duplicate_distance": 3}
+        options.update(overrides)
+        return FloodGate(clock=clock, **options)
+
+    return make
+
+
+def test_simhash_ignores_noise():
+    """Регистр, знаки, цифры и @username не меняют отпечаток; другой текст — далеко."""
+    base = simhash(LEAD)
+    assert simhash(LEAD.upper().replace("50", "70") + "!!! @spam") == base
+    assert (base ^ simhash("Хочу консультацию по автоматизации Make для магазина")).bit_count() > 10
+
+
+def test_simhash_stable_across_processes():
+    """Отпечаток не зависит от PYTHONHASHSEED: совпадает в другом процессе (рестарт, другой worker)."""
+    code = f"from flood_control import simhash; print(simhash({LEAD!r}))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, "PYTHONHASHSEED": "12345"},
+    ).stdout
+    assert int(output) == simhash(LEAD)
+
+
+def test_rate_limit_sliding_window(clock, make_gate):
+    """Сверх лимита — отсев; ответ пользователю один раз за окно; окно сдвигается."""
+    gate = make_gate(duplicate_window=0)
+
+    decisions = []
+    for i in range(5):
+        decisions.append(gate.check(1, 1, f"сообщение {i}"))
+        clock.now += 1
+
+    assert decisions[:3] == [None, None, None]
+    assert [(d.reason, d.notify) for d in decisions[3:]] == [(REASON_RATE, True), (REASON_RATE, False)]
+
+    # Отсеянные тоже учитываются: окно освобождается через 60 с после них
+    clock.now += 60
+    assert gate.check(1, 1, "снова можно") is None
+    # Другой пользователь не затронут
+    assert gate.check(2, 2, "привет") is None
+
+
+def test_near_duplicates_in_same_chat(clock, make_gate):
+    """Повтор с другим бюджетом отсеивается в том же чате и пропускается в другом и после окна."""
+    gate = make_gate(max_messages=0)
+
+    assert gate.check(1, 10, LEAD) is None
+    decision = gate.check(1, 10, LEAD.replace("50к", "80к"))
+    assert (decision.reason, decision.notify) == (REASON_DUPLICATE, True)
+    assert gate.check(2, 20, LEAD) is None
+    assert gate.check(1, 10, "Ещё вопрос: а интеграция с amoCRM тоже возможна?") is None
+
+    clock.now += 601
+    assert gate.check(1, 10, LEAD) is None
+
+
+def test_forget_allows_resend(make_gate):
+    """После forget повтор того же сообщения не считается дубликатом."""
+    gate = make_gate(max_messages=0)
+    assert gate.check(1, 10, LEAD) is None
+    gate.forget(10, LEAD)
+    assert gate.check(1, 10, LEAD) is None
+    assert gate.check(1, 10, LEAD).reason == REASON_DUPLICATE
+
+
+def test_short_messages_are_not_duplicates(make_gate):
+    """Короткие "да"/"ок" повторяются законно."""
+    gate = make_gate(max_messages=0)
+    assert gate.check(1, 1, "да") is None
+    assert gate.check(1, 1, "да") is None
+
+
+def test_memory_is_bounded(make_gate):
+    """Состояние хранится не больше чем для max_keys пользователей и чатов."""
+    gate = make_gate(max_keys=100)
+    for user_id in range(1000):
+        gate.check(user_id, user_id, f"{LEAD} от {user_id}")
+
+    assert len(gate._users) == 100
+    assert len(gate._chats) == 100
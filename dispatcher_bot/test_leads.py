@@ -0,0 +1,87 @@
+"""
+Тесты для локального хранилища лидов.
+Запуск: python -m pytest test_leads.py
+"""
+
+from leads import Lead, LeadStore
+
+
+def _payload(trace_id: str, chat_id: int = 1, intent: str = "lead", service: str = "gpt_assistants", budget=50000):
+    return {
+        "trace_id": trace_id,
+        "chat_id": chat_id,
+        "message_id": int(trace_id.split(":")[1]),
+        "user": {"id": 111, "username": "username", "name": "Имя"},
+        "text": "Нужен бот записи, бюджет 50к",
+        "intent": intent,
+        "service": service,
+        "confidence": 0.9,
+        "summary": "Заявка на бота",
+        "goal": "бот записи",
+        "budget": budget,
+        "deadline_text": None,
+        "contact": "@username",
+    }
+
+
+def test_add_get_roundtrip(tmp_path):
+    """Лид из payload сохраняется и читается без потерь, статус — new."""
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    store.add(Lead.from_payload(_payload("1:1")))
+    store.add(Lead.from_payload(_payload("1:2", budget="40-60к")))
+
+    lead = store.get("1:1")
+    assert lead.status == "new"
+    assert lead.budget == 50000
+    assert lead.username == "username"
+    assert lead.goal == "бот записи"
+    assert store.get("1:2").budget == "40-60к"
+    assert store.get("9:9") is None
+
+
+def test_readd_keeps_status(tmp_path):
+    """Повторная запись того же trace_id не сбрасывает статус."""
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    store.add(Lead.from_payload(_payload("1:1")))
+    store.set_status("1:1", "booked", version=5)
+
+    store.add(Lead.from_payload(_payload("1:1", service="ai_agents")))
+
+    lead = store.get("1:1")
+    assert lead.status == "booked"
+    assert lead.service == "ai_agents"
+
+
+def test_set_status_ignores_stale_version(tmp_path):
+    """Статус с меньшей версией не перезаписывает более новый."""
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    store.add(Lead.from_payload(_payload("1:1")))
+
+    assert store.set_status("1:1", "closed", version=20).status == "closed"
+    assert store.set_status("1:1", "in_progress", version=10).status == "closed"
+    assert store.set_status("9:9", "closed", version=30) is None
+
+
+def test_find_and_counts(tmp_path):
+    """Поиск по статусу, типу, услуге и чату; новые первыми."""
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    store.add(Lead.from_payload(_payload("1:1", chat_id=1)))
+    store.add(Lead.from_payload(_payload("2:1", chat_id=2, intent="support", service="unknown")))
+    store.add(Lead.from_payload(_payload("1:2", chat_id=1)))
+    store.set_status("1:1", "spam", version=1)
+
+    assert [lead.trace_id for lead in store.find(chat_id=1)] == ["1:2", "1:1"]
+    assert [lead.trace_id for lead in store.find(status="new", intent="lead")] == ["1:2"]
+    assert [lead.trace_id for lead in store.find(intent="support", service="unknown")] == ["2:1"]
+    assert len(store.find(limit=2)) == 2
+    assert store.count_by_status() == {"new": 2, "spam": 1}
+
+
+def test_lookups_use_indexes(tmp_path):
+    """Фильтры по статусу и чату идут по индексам, а не полным сканом."""
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    for column in ("status", "chat_id"):
+        plan = store._conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM leads WHERE {column} = ? ORDER BY created_at DESC", ("x",)
+        ).fetchall()
+        assert any("USING INDEX" in row[-1] for row in plan), plan
@@ -0,0 +1,179 @@
+"""
+Тесты для локальной модели: обучение, файл модели, fallback и первый проход в classifier.
+Запуск: python -m pytest test_local_model.py
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import classifier
+from cache import ResultCache
+from dataset import DatasetWriter
+from local_model import LocalClassifier, FORMAT_VERSION
+
+pytest.importorskip("numpy")
+
+
+SERVICES = {
+    "make_automation": ["сценарий в Make", "интеграцию CRM через Make", "вебхук в мейк"],
+    "gpt_assistants": ["чат-бота для записи", "GPT-ассистента", "бота FAQ"],
+    "consultation": ["консультацию", "разбор процессов", "аудит автоматизации"],
+}
+TEMPLATES = {
+    "lead": ["Хочу заказать {}", "Нужен {}, бюджет {}к", "Нам нужно сделать {} до пятницы"],
+    "question": ["Сколько стоит {}?", "Какие сроки на {}?", "Вы делаете {}?"],
+    "support": ["Не работает {}, который вы делали", "Сломался {}, ошибка при запуске", "{} перестал отвечать"],
+}
+
+
+def _dataset(size=300, seed=1):
+    rng = random.Random(seed)
+    texts, labels = [], {"intent": [], "service": []}
+    for _ in range(size):
+        intent = rng.choice(sorted(TEMPLATES))
+        service = rng.choice(sorted(SERVICES))
+        template = rng.choice(TEMPLATES[intent])
+        texts.append(template.format(rng.choice(SERVICES[service]), rng.randint(10, 200)))
+        labels["intent"].append(intent)
+        labels["service"].append(service)
+    return texts, labels
+
+
+@pytest.fixture(scope="module")
+def model():
+    texts, labels = _dataset()
+    trained, report = LocalClassifier.train(texts, labels, dim=2048, epochs=20)
+    assert report["intent"]["accuracy"] > 0.9
+    assert report["service"]["accuracy"] > 0.9
+    return trained
+
+
+def test_predicts_intent_and_service(model):
+    """Модель различает intent и service и даёт уверенность в (0, 1]."""
+    prediction = model.predict("Сколько стоит чат-бота для записи?")
+    assert (prediction.intent, prediction.service) == ("question", "gpt_assistants")
+    assert 0 < prediction.confidence <= 1
+
+
+def test_predict_is_fast(model):
+    """Предсказание — меньше миллисекунды на сообщение."""
+    text = "Сломался сценарий в Make, ошибка при запуске " * 5
+    model.predict(text)
+    started = time.perf_counter()
+    for _ in range(100):
+        model.predict(text)
+    assert (time.perf_counter() - started) / 100 < 0.001
+
+
+def test_save_load_roundtrip(model, tmp_path):
+    """Модель из файла предсказывает то же; файл компактный."""
+    path = tmp_path / "model.npz"
+    model.save(str(path))
+    loaded = LocalClassifier.load(str(path))
+
+    assert path.stat().st_size < 64 * 1024
+    for text in ("Хочу заказать консультацию", "Вы делаете бота FAQ?"):
+        original, restored = model.predict(text), loaded.predict(text)
+        assert (original.intent, original.service) == (restored.intent, restored.service)
+        assert restored.confidence == pytest.approx(original.confidence, abs=0.02)
+
+
+def test_load_rejects_other_version(model, tmp_path, monkeypatch):
+    """Файл другой версии формата не загружается."""
+    monkeypatch.setattr("local_model.FORMAT_VERSION", FORMAT_VERSION + 1)
+    path = tmp_path / "model.npz"
+    model.save(str(path))
+    monkeypatch.setattr("local_model.FORMAT_VERSION", FORMAT_VERSION)
+
+    with pytest.raises(ValueError):
+        LocalClassifier.load(str(path))
+
+
+@pytest.fixture
+def isolated_classifier(monkeypatch):
+    monkeypatch.setattr(classifier, "_cache", ResultCache(100, 60))
+    monkeypatch.setattr(classifier, "_semantic_cache", None)
+    monkeypatch.setattr(classifier, "RULES_MIN_CONFIDENCE", 2.0)
+    monkeypatch.setattr(classifier, "CLASSIFY_BATCH_SIZE", 0)
+
+
+def test_fallback_uses_local_model(model, monkeypatch, isolated_classifier):
+    """Без OpenAI результат — предсказание локальной модели с полями из текста."""
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(classifier, "_local_model", model)
+
+    result = classifier.classify("Нужен сценарий в Make, бюджет 50к, пишите @client")
+
+    assert (result["intent"], result["service"]) == ("lead", "make_automation")
+    assert result["confidence"] > 0
+    assert result["fields"]["budget"] == 50000
+    assert result["fields"]["contact"] == "@client"
+
+
+def test_first_pass_skips_llm_when_confident(model, monkeypatch, isolated_classifier):
+    """При уверенности не ниже LOCAL_MODEL_MIN_CONFIDENCE запрос к OpenAI не делается."""
+
+    class NoCalls:
+        async def create(self, **kwargs):
+            raise AssertionError("LLM must not be called")
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_local_model", model)
+    monkeypatch.setattr(classifier, "LOCAL_MODEL_MIN_CONFIDENCE", 0.0)
+    monkeypatch.setattr(classifier, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=NoCalls())))
+
+    result = asyncio.run(classifier.classify_async("Вы делаете консультацию?"))
+
+    assert (result["intent"], result["service"]) == ("question", "consultation")
+
+
+def test_llm_results_written_to_dataset(monkeypatch, isolated_classifier, tmp_path):
+    """Ответы LLM дописываются в CLASSIFY_DATASET_PATH фоновым потоком, не в event loop."""
+
+    class Completions:
+        async def create(self, **kwargs):
+            content = '{"intent": "lead", "service": "ai_agents", "confidence": 0.9, "summary": "Агент", "fields": {}}'
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    path = tmp_path / "dataset.jsonl"
+    writer_threads = set()
+    append = DatasetWriter._append
+
+    def recording_append(self, batch):
+        writer_threads.add(threading.current_thread())
+        append(self, batch)
+
+    monkeypatch.setattr(DatasetWriter, "_append", recording_append)
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_local_model", None)
+    monkeypatch.setattr(classifier, "_dataset", DatasetWriter(str(path)))
+    monkeypatch.setattr(classifier, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=Completions())))
+
+    asyncio.run(classifier.classify_async("Нужен агент продаж"))
+    classifier.close_dataset()
+
+    assert threading.current_thread() not in writer_threads
+    record = json.loads(path.read_text(encoding="utf-8"))
+    assert (record["text"], record["intent"], record["service"]) == ("Нужен агент продаж", "lead", "ai_agents")
+
+
+def test_load_local_model_missing_file(tmp_path):
+    """Нет файла — модель выключена, без исключения."""
+    assert classifier.load_local_model(str(tmp_path / "missing.npz")) is None
+    assert classifier._local_model is None
+
+
+def test_load_local_model_corrupt_file(model, tmp_path):
+    """Обрезанный .npz — модель выключена, без исключения."""
+    path = tmp_path / "model.npz"
+    model.save(str(path))
+    path.write_bytes(path.read_bytes()[:200])
+
+    assert classifier.load_local_model(str(path)) is None
+    assert classifier._local_model is None
@@ -0,0 +1,76 @@
+"""
+Тесты для фонового логирования (очередь, JSON lines, ротация).
+Запуск: python -m pytest test_logging_setup.py
+"""
+
+import json
+import logging
+import threading
+
+from logging_setup import JsonFormatter, TraceFormatter, setup_logging, stop_logging
+
+
+def _record(message: str, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("dispatcher", logging.INFO, __file__, 1, message, None, None)
+    record.created = 1769860800.5  # 2026-01-31T12:00:00Z
+    for name, value in extra.items():
+        setattr(record, name, value)
+    return record
+
+
+def test_trace_formatter():
+    """Текстовый формат как раньше: [время] [уровень] [trace_id] сообщение."""
+    line = TraceFormatter().format(_record("Queued for Make", trace_id="1:2"))
+    assert line == "[2026-01-31T12:00:00Z] [INFO] [1:2] Queued for Make"
+
+    assert "[-] no trace" in TraceFormatter().format(_record("no trace"))
+
+
+def test_json_formatter_fields():
+    """JSON: trace_id, stage и duration_ms; пустые поля не пишутся."""
+    data = json.loads(JsonFormatter().format(
+        _record("Classified: lead/ai_agents", trace_id="1:2", stage="classify", duration_ms=12.5)
+    ))
+    assert data == {
+        "ts": "2026-01-31T12:00:00Z",
+        "level": "INFO",
+        "logger": "dispatcher",
+        "trace_id": "1:2",
+        "msg": "Classified: lead/ai_agents",
+        "stage": "classify",
+        "duration_ms": 12.5,
+    }
+
+    data = json.loads(JsonFormatter().format(_record("Привет", stage=None)))
+    assert data["msg"] == "Привет"
+    assert "stage" not in data
+
+
+def test_writes_on_background_thread_with_rotation(tmp_path):
+    """Запись идёт в потоке QueueListener, файл ротируется по размеру."""
+    path = tmp_path / "bot.log"
+    writer_threads = set()
+
+    class ThreadRecorder(logging.Filter):
+        def filter(self, record):
+            writer_threads.add(threading.current_thread())
+            return True
+
+    listener = setup_logging("dispatcher.test_logging", log_format="json", path=str(path), max_bytes=2000, backups=2)
+    listener.handlers[0].addFilter(ThreadRecorder())
+    logger = logging.getLogger("dispatcher.test_logging")
+    try:
+        for i in range(100):
+            logger.info(f"message {i}", extra={"trace_id": f"1:{i}", "stage": "test"})
+    finally:
+        stop_logging(listener, "dispatcher.test_logging")
+
+    assert threading.current_thread() not in writer_threads
+    assert not logger.handlers
+
+    rotated = sorted(tmp_path.glob("bot.log*"))
+    assert len(rotated) == 3  # bot.log, bot.log.1, bot.log.2
+    last = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert last[-1]["msg"] == "message 99"
+    assert last[-1]["trace_id"] == "1:99"
+    assert last[-1]["stage"] == "test"
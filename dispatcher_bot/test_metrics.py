@@ -0,0 +1,101 @@
+"""
+Тесты для реестра метрик и endpoint /metrics.
+Запуск: python -m pytest test_metrics.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import classifier
+import metrics
+
+
+def test_render_prometheus_text_format():
+    """Счётчик, gauge и гистограмма с метками в текстовом формате Prometheus."""
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("test_requests_total", "Requests", ["kind"]))
+    in_flight = registry.register(metrics.Gauge("test_in_flight", "In flight"))
+    latency = registry.register(metrics.Histogram("test_seconds", "Latency", ["source"], buckets=[0.1, 1]))
+
+    requests.labels(kind='a"b').inc()
+    requests.labels(kind='a"b').inc(2)
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+    for value in (0.05, 0.5, 3):
+        latency.labels(source="llm").observe(value)
+
+    text = registry.render()
+
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{kind="a\\"b"} 3' in text
+    assert "test_in_flight 1" in text
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{source="llm",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{source="llm",le="1"} 2' in text
+    assert 'test_seconds_bucket{source="llm",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{source="llm"} 3.55' in text
+    assert 'test_seconds_count{source="llm"} 3' in text
+
+
+def test_register_returns_existing_and_checks_labels():
+    """Повторная регистрация отдаёт ту же метрику; другие метки — ошибка."""
+    registry = metrics.Registry()
+    first = registry.register(metrics.Counter("test_total", "Test", ["a"]))
+    assert registry.register(metrics.Counter("test_total", "Test", ["a"])) is first
+
+    with pytest.raises(ValueError):
+        registry.register(metrics.Counter("test_total", "Test", ["b"]))
+    with pytest.raises(ValueError):
+        first.labels(b="x")
+
+
+def test_gauge_function():
+    """Gauge с функцией читает значение при каждом рендере."""
+    registry = metrics.Registry()
+    depth = registry.register(metrics.Gauge("test_depth", "Depth"))
+    values = iter([5, 7])
+    depth.set_function(lambda: next(values))
+
+    assert "test_depth 5" in registry.render()
+    assert "test_depth 7" in registry.render()
+
+
+def test_classify_records_source_and_fallback_reason(monkeypatch):
+    """Без API ключа классификация пишется как fallback с причиной no_api_key."""
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(classifier, "RULES_MIN_CONFIDENCE", 2.0)
+    fallbacks = classifier._FALLBACKS.labels(reason="no_api_key")
+    latency = classifier._CLASSIFY_SECONDS.labels(source="fallback")
+    before_fallbacks, before_count = fallbacks.value, latency.count
+
+    classifier.classify("Нужен бот для записи клиентов")
+
+    assert fallbacks.value == before_fallbacks + 1
+    assert latency.count == before_count + 1
+    assert 'dispatcher_classified_total{intent="other",service="unknown"}' in metrics.REGISTRY.render()
+
+
+def test_metrics_endpoint():
+    """GET /metrics отдаёт реестр, другие пути — 404."""
+    registry = metrics.Registry()
+    registry.register(metrics.Counter("test_hits_total", "Hits")).inc()
+
+    async def run():
+        server = await metrics.start_server("127.0.0.1", 0, registry)
+        try:
+            async with httpx.AsyncClient() as client:
+                ok = await client.get(f"http://127.0.0.1:{server.port}/metrics")
+                missing = await client.get(f"http://127.0.0.1:{server.port}/other")
+        finally:
+            await server.stop()
+        return ok, missing
+
+    ok, missing = asyncio.run(run())
+
+    assert ok.status_code == 200
+    assert ok.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "test_hits_total 1" in ok.text
+    assert missing.status_code == 404
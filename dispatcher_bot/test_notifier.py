@@ -0,0 +1,110 @@
+"""
+Тесты для уведомлений админу: отдельные сообщения, сводки при всплеске, дедупликация алертов.
+Запуск: python -m pytest test_notifier.py
+"""
+
+import asyncio
+
+import pytest
+
+from notifier import AdminNotifier, DIGEST_MAX_LEADS
+
+
+@pytest.fixture
+def make_notifier(clock):
+    """AdminNotifier на общих часах, отправленное складывается в sent."""
+
+    def make(sent, **overrides):
+        async def send(text, markup):
+            sent.append((text, markup))
+
+        options = {"threshold": 3, "interval": 60, "dedup_window": 300}
+        options.update(overrides)
+        return AdminNotifier(
+            send=send,
+            render_lead=lambda lead: (f"lead {lead}", f"keyboard {lead}"),
+            render_digest=lambda leads: (f"digest {leads}", f"keyboard {leads}"),
+            clock=clock,
+            **options,
+        )
+
+    return make
+
+
+def test_individual_below_threshold_digest_above(clock, make_notifier):
+    """До порога — отдельные сообщения, дальше — в сводку; после паузы снова отдельные."""
+    sent = []
+    notifier = make_notifier(sent, threshold=3)
+
+    async def run():
+        for lead in range(5):
+            await notifier.notify_lead(lead)
+        assert [text for text, _ in sent] == ["lead 0", "lead 1", "lead 2"]
+        assert notifier.bursting
+
+        await notifier.flush()
+        assert sent[-1] == ("digest [3, 4]", "keyboard [3, 4]")
+
+        clock.now += 61  # Минута без событий
+        await notifier.notify_lead(5)
+        assert sent[-1] == ("lead 5", "keyboard 5")
+
+    asyncio.run(run())
+
+
+def test_digest_split_by_button_limit(make_notifier):
+    """Сводка делится на сообщения по DIGEST_MAX_LEADS лидов (лимит кнопок Telegram)."""
+    sent = []
+    notifier = make_notifier(sent, threshold=1)
+
+    async def run():
+        for lead in range(DIGEST_MAX_LEADS + 6):
+            await notifier.notify_lead(lead)
+        sent.clear()
+        await notifier.flush()
+
+    asyncio.run(run())
+
+    assert len(sent) == 2
+    assert sent[0][0] == f"digest {list(range(1, DIGEST_MAX_LEADS + 1))}"
+    assert sent[1][0] == f"digest {list(range(DIGEST_MAX_LEADS + 1, DIGEST_MAX_LEADS + 6))}"
+
+
+def test_alerts_deduplicated_within_window(clock, make_notifier):
+    """Одинаковый алерт в окне — один раз; повторы попадают в сводку; после окна — снова."""
+    sent = []
+    notifier = make_notifier(sent, threshold=100, dedup_window=300)
+
+    async def run():
+        for _ in range(5):
+            await notifier.alert("make|timeout", "Make error: timeout")
+            clock.now += 1
+        await notifier.alert("make|HTTP 500", "Make error: HTTP 500")
+        assert [text for text, _ in sent] == ["Make error: timeout", "Make error: HTTP 500"]
+
+        await notifier.flush()
+        assert "Make error: timeout (повторов: 4)" in sent[-1][0]
+        assert "HTTP 500" not in sent[-1][0]
+
+        clock.now += 300
+        await notifier.flush()  # Окно истекло — состояние забыто
+        await notifier.alert("make|timeout", "Make error: timeout")
+        assert sent[-1] == ("Make error: timeout", None)
+
+    asyncio.run(run())
+
+
+def test_stop_flushes_pending(make_notifier):
+    """stop() отправляет накопленное."""
+    sent = []
+    notifier = make_notifier(sent, threshold=1)
+
+    async def run():
+        notifier.start()
+        await notifier.notify_lead(1)
+        await notifier.notify_lead(2)
+        await notifier.stop()
+
+    asyncio.run(run())
+
+    assert [text for text, _ in sent] == ["lead 1", "digest [2]"]
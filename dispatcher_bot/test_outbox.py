@@ -0,0 +1,157 @@
+"""
+Тесты для outbox (локальная очередь доставки в Make).
+Запуск: python -m pytest test_outbox.py
+"""
+
+import asyncio
+
+import outbox as outbox_module
+from circuit_breaker import CircuitOpenError
+from outbox import Outbox, OutboxDrainer, STATE_DEAD
+
+
+def test_put_due_ack(tmp_path):
+    """Запись -> выборка -> подтверждение удаляет запись."""
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.put("lead", "1:1", {"trace_id": "1:1", "text": "Нужен бот"})
+
+    items = box.due(10)
+    assert len(items) == 1
+    assert items[0].payload["text"] == "Нужен бот"
+
+    box.ack(items[0])
+    assert box.count() == 0
+
+
+def test_newer_version_survives_ack(tmp_path):
+    """Повторный put увеличивает version, ack старой версии её не удаляет."""
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.put("status", "1:1", {"status": "in_progress"})
+    old = box.due(10)[0]
+    box.put("status", "1:1", {"status": "booked"})
+
+    box.ack(old)
+
+    items = box.due(10)
+    assert len(items) == 1
+    assert items[0].version == old.version + 1
+    assert items[0].payload["status"] == "booked"
+
+
+def test_survives_restart(tmp_path):
+    """Недоставленное остаётся в файле после переоткрытия."""
+    path = str(tmp_path / "outbox.sqlite3")
+    box = Outbox(path)
+    box.put("lead", "1:1", {"trace_id": "1:1"})
+    box.close()
+
+    assert Outbox(path).count() == 1
+
+
+def test_drainer_retries_then_gives_up(tmp_path, monkeypatch):
+    """Ошибка доставки -> ретраи, после OUTBOX_MAX_ATTEMPTS -> dead + on_failure."""
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox_module, "OUTBOX_RETRY_BASE", 0)
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.put("lead", "1:1", {"trace_id": "1:1"})
+    failures = []
+
+    async def broken_sender(payload):
+        raise RuntimeError("Make is down")
+
+    async def on_failure(item, error):
+        failures.append((item.key, error))
+
+    async def run():
+        drainer = OutboxDrainer(box, {"lead": broken_sender}, on_failure=on_failure)
+        await drainer.drain_once()
+        await drainer.drain_once()
+
+    asyncio.run(run())
+
+    assert failures == [("1:1", "Make is down")]
+    assert box.count() == 0
+    assert box.count(STATE_DEAD) == 1
+
+
+def test_drainer_postpones_on_open_circuit(tmp_path, monkeypatch):
+    """Открытый breaker не тратит попытки: запись откладывается до пробного запроса."""
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_ATTEMPTS", 1)
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.put("lead", "1:1", {"trace_id": "1:1"})
+
+    async def sender(payload):
+        raise CircuitOpenError("make_lead", 30)
+
+    async def run():
+        drainer = OutboxDrainer(box, {"lead": sender})
+        await drainer.drain_once()
+
+    asyncio.run(run())
+
+    assert box.count() == 1
+    assert box.due(10) == []
+    assert 29 < box.next_due_in() <= 30
+    item = box.due(10, now=box.next_due_in() + 1e10)[0]
+    assert item.attempts == 0
+
+
+def test_drainer_background_delivery(tmp_path):
+    """Фоновый воркер доставляет запись после notify()."""
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    delivered = []
+
+    async def sender(payload):
+        delivered.append(payload["trace_id"])
+
+    async def run():
+        drainer = OutboxDrainer(box, {"lead": sender})
+        drainer.start()
+        box.put("lead", "1:1", {"trace_id": "1:1"})
+        drainer.notify()
+        for _ in range(100):
+            if delivered:
+                break
+            await asyncio.sleep(0.01)
+        await drainer.stop()
+
+    asyncio.run(run())
+
+    assert delivered == ["1:1"]
+    assert box.count() == 0
+
+
+def test_drainer_coalesces_and_orders_status_updates(tmp_path):
+    """
+    Нажатия во время отправки не обгоняют её: после неё уходит только
+    последний статус, промежуточные схлопываются.
+    """
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    delivered = []
+    in_flight = asyncio.Event()
+    release = asyncio.Event()
+
+    async def sender(payload):
+        delivered.append(payload["status"])
+        if len(delivered) == 1:
+            in_flight.set()
+            await release.wait()
+
+    async def run():
+        drainer = OutboxDrainer(box, {"status": sender})
+        box.put("status", "1:1", {"status": "in_progress"})
+        first = asyncio.create_task(drainer.drain_once())
+        await in_flight.wait()
+
+        # Пока in_progress отправляется, админ нажимает ещё дважды
+        box.put("status", "1:1", {"status": "booked"})
+        box.put("status", "1:1", {"status": "closed"})
+        release.set()
+        await first
+
+        await drainer.drain_once()
+
+    asyncio.run(run())
+
+    assert delivered == ["in_progress", "closed"]
+    assert box.count() == 0
@@ -0,0 +1,159 @@
+"""
+Тесты для лимитов исходящих сообщений Telegram: приоритеты, лимит на чат, 429.
+Запуск: python -m pytest test_rate_limiter.py
+"""
+
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+import config
+
+from rate_limiter import (
+    PriorityRateLimiter,
+    PriorityTokenBucket,
+    PRIORITY_USER,
+    PRIORITY_ADMIN_EDIT,
+    PRIORITY_NOTIFY,
+)
+
+
+ADMIN = 999
+
+
+async def _send(limiter, endpoint, chat_id, callback=None, rate_limit_args=None):
+    async def ok():
+        return endpoint
+
+    return await limiter.process_request(
+        callback or ok, (), {}, endpoint, {"chat_id": chat_id}, rate_limit_args
+    )
+
+
+def test_priority_from_endpoint_and_chat():
+    """Правки — admin_edit, сообщения в чат админа — notify, остальное — user."""
+    limiter = PriorityRateLimiter(admin_chat_id=str(ADMIN))
+    assert limiter.priority("sendMessage", {"chat_id": 1}) == PRIORITY_USER
+    assert limiter.priority("sendMessage", {"chat_id": ADMIN}) == PRIORITY_NOTIFY
+    assert limiter.priority("editMessageText", {"chat_id": ADMIN}) == PRIORITY_ADMIN_EDIT
+
+
+def test_bucket_serves_waiters_by_priority():
+    """Когда токенов нет, первым получает токен ожидающий с меньшим приоритетом."""
+    bucket = PriorityTokenBucket(rate=50, capacity=1)
+    order = []
+
+    async def waiter(priority):
+        await bucket.acquire(priority)
+        order.append(priority)
+
+    async def run():
+        await bucket.acquire()
+        tasks = []
+        for priority in (PRIORITY_NOTIFY, PRIORITY_USER, PRIORITY_ADMIN_EDIT):
+            tasks.append(asyncio.create_task(waiter(priority)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [PRIORITY_USER, PRIORITY_ADMIN_EDIT, PRIORITY_NOTIFY]
+
+
+def test_non_positive_rate_rejected(monkeypatch):
+    """Нулевая или отрицательная скорость — ошибка сразу, а не зависшие отправки."""
+    for rate in (0, -1):
+        with pytest.raises(ValueError):
+            PriorityTokenBucket(rate=rate, capacity=1)
+    with pytest.raises(ValueError):
+        PriorityRateLimiter(global_rate=0)
+    with pytest.raises(ValueError):
+        PriorityRateLimiter(chat_rate=0)
+
+    monkeypatch.setattr(config, "BOT_TOKEN", "123456:TEST")
+    monkeypatch.setattr(config, "MAKE_WEBHOOK_URL", "https://hook.example.com")
+    monkeypatch.setattr(config, "BOT_MODE", "polling")
+    monkeypatch.setattr(config, "TG_CHAT_RATE", 0.0)
+    with pytest.raises(SystemExit):
+        config.validate_config()
+
+
+def test_cancelled_waiter_leaves_queue():
+    """Отменённый запрос не занимает очередь."""
+    bucket = PriorityTokenBucket(rate=50, capacity=1)
+
+    async def run():
+        await bucket.acquire()
+        task = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        assert bucket.waiting == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert bucket.waiting == 0
+        await asyncio.wait_for(bucket.acquire(), 1)
+
+    asyncio.run(run())
+
+
+def test_chat_limit_does_not_block_other_chats():
+    """Лимит на чат задерживает только свой чат."""
+    limiter = PriorityRateLimiter(global_rate=1000, chat_rate=10, chat_burst=1)
+
+    async def run():
+        await _send(limiter, "sendMessage", 1)
+        started = time.perf_counter()
+        await _send(limiter, "sendMessage", 2)
+        other_chat = time.perf_counter() - started
+        await _send(limiter, "sendMessage", 1)
+        same_chat = time.perf_counter() - started
+        return other_chat, same_chat
+
+    other_chat, same_chat = asyncio.run(run())
+    assert other_chat < 0.05
+    assert same_chat >= 0.08
+
+
+def test_edits_skip_chat_limit():
+    """Правки не ждут лимит чата."""
+    limiter = PriorityRateLimiter(global_rate=1000, chat_rate=0.1, chat_burst=1)
+
+    async def run():
+        await _send(limiter, "sendMessage", ADMIN)
+        await asyncio.wait_for(_send(limiter, "editMessageText", ADMIN), 0.5)
+
+    asyncio.run(run())
+
+
+def test_unlimited_endpoint_passes_through():
+    """Методы без лимитов Telegram не ждут токены."""
+    limiter = PriorityRateLimiter(global_rate=0.1, chat_rate=0.1, chat_burst=1)
+
+    async def run():
+        await asyncio.wait_for(_send(limiter, "sendMessage", 1), 0.5)
+        return await asyncio.wait_for(_send(limiter, "answerCallbackQuery", 1), 0.5)
+
+    assert asyncio.run(run()) == "answerCallbackQuery"
+
+
+def test_retry_after_retries_then_raises():
+    """На 429 запрос повторяется max_retries раз, потом ошибка пробрасывается."""
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise RetryAfter(0)
+        return "sent"
+
+    async def always_429():
+        raise RetryAfter(0)
+
+    limiter = PriorityRateLimiter(global_rate=1000, chat_rate=1000, chat_burst=10, max_retries=1)
+
+    assert asyncio.run(_send(limiter, "sendMessage", 1, callback=flaky)) == "sent"
+    assert len(calls) == 2
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(_send(limiter, "sendMessage", 1, callback=always_429))
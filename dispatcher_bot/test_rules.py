@@ -0,0 +1,107 @@
+"""
+Тесты для rules (быстрая классификация без LLM).
+Запуск: python -m pytest test_rules.py
+"""
+
+import json
+from types import SimpleNamespace
+
+import openai
+
+import classifier
+import rules
+from cache import ResultCache
+from circuit_breaker import CircuitBreaker
+
+
+def test_small_talk():
+    """Приветствие и благодарность — other с высокой уверенностью."""
+    assert rules.match("привет").intent == "other"
+    assert rules.match("Спасибо!").summary == "Благодарность"
+    assert rules.match("Привет, расскажите подробнее о ваших проектах и команде") is None
+
+
+def test_support():
+    """Ошибка/не работает — support, услуга по ключевым словам."""
+    result = rules.match("Бот не отвечает, ошибка при оплате, @username")
+    assert (result.intent, result.service) == ("support", "gpt_assistants")
+    assert result.confidence >= 0.85
+
+
+def test_consultation_wins_over_topic():
+    """Консультация по Make — consultation, а не make_automation."""
+    result = rules.match("Хочу консультацию по Make на этой неделе")
+    assert (result.intent, result.service) == ("lead", "consultation")
+
+
+def test_low_confidence_goes_to_llm():
+    """Запрос без понятной услуги — низкая уверенность."""
+    result = rules.match("Нужно что-нибудь придумать для продаж")
+    assert result.intent == "lead"
+    assert result.confidence < 0.85
+
+
+def test_classify_skips_llm_with_full_fields(monkeypatch):
+    """С RULES_SKIP_LEADS уверенные правила дают полный результат лида без вызова OpenAI."""
+    monkeypatch.setattr(classifier, "RULES_SKIP_LEADS", True)
+    llm_calls = []
+
+    def client(**kwargs):
+        llm_calls.append(kwargs)
+        raise RuntimeError("LLM must not be called")
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai, "OpenAI", client)
+
+    result = classifier.classify("Нужен бот записи, бюджет 50к, срок до пятницы, @username")
+
+    assert llm_calls == []
+
+    assert result["intent"] == "lead"
+    assert result["service"] == "gpt_assistants"
+    assert result["fields"] == {
+        "budget": 50000,
+        "deadline_text": "до пятницы",
+        "contact": "@username",
+        "goal": "бот записи",
+    }
+
+
+def test_service_lead_reaches_llm_by_default(monkeypatch):
+    """По умолчанию лид с понятной услугой всё равно идёт в OpenAI — summary от LLM, а не шаблон."""
+    llm_result = {
+        "intent": "lead", "service": "gpt_assistants", "confidence": 0.95,
+        "summary": "Бот записи клиентов для салона", "fields": {"goal": "бот записи"},
+    }
+    llm_calls = []
+
+    class FakeOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=self)
+
+        def create(self, **kwargs):
+            llm_calls.append(kwargs)
+            message = SimpleNamespace(content=json.dumps(llm_result, ensure_ascii=False))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(classifier, "_cache", ResultCache(100, 60))
+    monkeypatch.setattr(classifier, "_semantic_cache", None)
+    monkeypatch.setattr(classifier, "_breaker", CircuitBreaker("openai"))
+    monkeypatch.setattr(openai, "OpenAI", FakeOpenAI)
+
+    text = "Нужен бот записи, бюджет 50к, срок до пятницы, @username"
+    assert rules.match(text).confidence >= classifier.RULES_MIN_CONFIDENCE
+    result = classifier.classify(text)
+
+    assert len(llm_calls) == 1
+    assert result["summary"] == "Бот записи клиентов для салона"
+
+
+def test_small_talk_skips_llm_by_default(monkeypatch):
+    """Приветствие по умолчанию решается правилами."""
+    monkeypatch.setattr(classifier, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai, "OpenAI", None)  # Вызов упал бы с TypeError
+
+    assert classifier.classify("Привет!")["summary"] == rules.match("Привет!").summary
+
@@ -0,0 +1,46 @@
+"""
+Тесты для semantic_cache (кэш почти-дубликатов).
+Запуск: python -m pytest test_semantic_cache.py
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from semantic_cache import SemanticCache
+
+
+TEMPLATE = "Нужен бот записи клиентов, бюджет 50к, до пятницы, @alice"
+
+
+def test_near_duplicate_hit():
+    """Тот же шаблон с другим бюджетом и @username — попадание."""
+    cache = SemanticCache(capacity=10, threshold=0.9)
+    cache.add(TEMPLATE, {"intent": "lead"})
+
+    found = cache.lookup("Нужен бот записи клиентов, бюджет 70к, до пятницы, @bob")
+
+    assert found is not None
+    result, similarity = found
+    assert result == {"intent": "lead"}
+    assert similarity > 0.99
+
+
+def test_different_text_miss():
+    """Непохожий текст — промах."""
+    cache = SemanticCache(capacity=10, threshold=0.9)
+    cache.add(TEMPLATE, {"intent": "lead"})
+
+    assert cache.lookup("Бот не отвечает, ошибка при оплате") is None
+    assert cache.stats() == {"size": 1, "hits": 0, "misses": 1}
+
+
+def test_ring_buffer_eviction():
+    """При переполнении вытесняется самая старая запись."""
+    cache = SemanticCache(capacity=2, threshold=0.9)
+    cache.add(TEMPLATE, {"n": 1})
+    cache.add("Хочу консультацию по Make на этой неделе", {"n": 2})
+    cache.add("Бот не отвечает, ошибка при оплате", {"n": 3})
+
+    assert len(cache) == 2
+    assert cache.lookup(TEMPLATE) is None
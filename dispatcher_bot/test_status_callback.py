@@ -0,0 +1,133 @@
+"""
+Тесты для кнопок статуса: ответ сразу, доставка в Make — через outbox.
+Запуск: python -m pytest test_status_callback.py
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import bot
+from leads import Lead, LeadStore
+from outbox import Outbox, OutboxDrainer
+
+
+class FakeQuery:
+    """CallbackQuery: запоминает ответы и правки сообщения."""
+
+    def __init__(self, data: str, text: str = "Новое обращение\ntrace_id: 1:1"):
+        self.data = data
+        self.message = SimpleNamespace(text=text)
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append(text)
+
+
+def test_callback_answers_immediately_and_coalesces(tmp_path, monkeypatch):
+    """Callback не ждёт Make; два нажатия подряд -> в outbox один, последний статус."""
+    monkeypatch.setattr(bot, "MAKE_STATUS_WEBHOOK_URL", "https://hook.example.com/status")
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    sent = []
+
+    async def sender(payload):
+        sent.append(payload)
+
+    drainer = OutboxDrainer(box, {"status": sender})
+    context = SimpleNamespace(bot_data={bot.OUTBOX_DRAINER_KEY: drainer}, bot=None)
+    first = FakeQuery("status|1:1|in_progress")
+    second = FakeQuery("status|1:1|booked")
+
+    async def run():
+        await bot.handle_status_callback(SimpleNamespace(callback_query=first), context)
+        await bot.handle_status_callback(SimpleNamespace(callback_query=second), context)
+        assert sent == []  # Обработчик не отправлял в Make сам
+        await drainer.drain_once()
+
+    asyncio.run(run())
+
+    assert first.answers == [f"Статус: {bot.STATUS_LABELS['in_progress']}"]
+    assert second.edits[0].startswith(f"[Статус: {bot.STATUS_LABELS['booked']}]")
+
+    assert len(sent) == 1
+    assert sent[0]["status_code"] == "booked"
+    assert sent[0]["trace_id"] == "1:1"
+    assert box.count() == 0
+
+
+def test_status_version_strictly_increases():
+    """Версия растёт даже при нажатиях в одну миллисекунду."""
+    versions = [bot.next_status_version() for _ in range(100)]
+    assert versions == sorted(set(versions))
+
+
+def _context(tmp_path, store=None):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    drainer = OutboxDrainer(box, {})
+    bot_data = {bot.OUTBOX_DRAINER_KEY: drainer}
+    if store is not None:
+        bot_data[bot.LEAD_STORE_KEY] = store
+    return SimpleNamespace(bot_data=bot_data, bot=None)
+
+
+def test_admin_message_rendered_from_store(tmp_path, monkeypatch):
+    """Сообщение админу перерисовывается из хранилища, префиксы не копятся."""
+    monkeypatch.setattr(bot, "MAKE_STATUS_WEBHOOK_URL", "https://hook.example.com/status")
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    store.add(Lead.from_payload({
+        "trace_id": "1:1", "chat_id": 1, "message_id": 1, "user": {"id": 1, "username": "user", "name": "Имя"},
+        "text": "Нужен бот", "intent": "lead", "service": "gpt_assistants", "confidence": 0.9,
+        "summary": "Заявка на бота", "goal": "бот",
+    }))
+    context = _context(tmp_path, store)
+
+    async def run():
+        for status in ("in_progress", "booked"):
+            query = FakeQuery(f"status|1:1|{status}")
+            await bot.handle_status_callback(SimpleNamespace(callback_query=query), context)
+        return query
+
+    query = asyncio.run(run())
+
+    text = query.edits[0]
+    assert text == bot.render_admin_message(store.get("1:1"))
+    assert f"Статус: {bot.STATUS_LABELS['booked']}" in text
+    assert "[Статус:" not in text
+    assert store.get("1:1").status == "booked"
+
+
+def test_legacy_message_prefix_replaced(tmp_path, monkeypatch):
+    """Лида нет в хранилище: старый префикс статуса заменяется, а не дописывается."""
+    monkeypatch.setattr(bot, "MAKE_STATUS_WEBHOOK_URL", "https://hook.example.com/status")
+    context = _context(tmp_path, LeadStore(str(tmp_path / "leads.sqlite3")))
+    old_text = f"[Статус: {bot.STATUS_LABELS['in_progress']}]\n\nНовое обращение\ntrace_id: 5:5"
+    query = FakeQuery("status|5:5|closed", text=old_text)
+
+    asyncio.run(bot.handle_status_callback(SimpleNamespace(callback_query=query), context))
+
+    assert query.edits == [f"[Статус: {bot.STATUS_LABELS['closed']}]\n\nНовое обращение\ntrace_id: 5:5"]
+
+
+def test_digest_button_rerenders_digest(tmp_path, monkeypatch):
+    """Кнопка в сводке меняет статус своего лида и перерисовывает всю сводку."""
+    monkeypatch.setattr(bot, "MAKE_STATUS_WEBHOOK_URL", "https://hook.example.com/status")
+    store = LeadStore(str(tmp_path / "leads.sqlite3"))
+    for trace_id in ("1:1", "2:1"):
+        store.add(Lead.from_payload({
+            "trace_id": trace_id, "text": "Нужен бот", "intent": "lead", "service": "gpt_assistants",
+            "confidence": 0.9, "summary": "Заявка", "goal": "бот", "user": {},
+        }))
+    text, keyboard = bot.render_lead_digest([store.get("1:1"), store.get("2:1")])
+    assert [len(row) for row in keyboard.inline_keyboard] == [5, 5]
+    assert keyboard.inline_keyboard[1][2].callback_data == "status|2:1|booked"
+
+    query = FakeQuery("status|2:1|booked", text=text)
+    query.message.reply_markup = keyboard
+    asyncio.run(bot.handle_status_callback(SimpleNamespace(callback_query=query), _context(tmp_path, store)))
+
+    assert query.edits == [bot.render_lead_digest([store.get("1:1"), store.get("2:1")])[0]]
+    assert bot.STATUS_LABELS["booked"] in query.edits[0]
+    assert store.get("2:1").status == "booked"
@@ -0,0 +1,126 @@
+"""
+Тесты для webhook режима: параметры ресивера python-telegram-bot из config.
+Запуск: python -m pytest test_telegram_webhook.py
+"""
+
+import asyncio
+import socket
+
+import httpx
+import pytest
+from telegram import Bot, Update, User
+from telegram.ext import Application
+
+import config
+import telegram_webhook
+
+
+SECRET = "test-secret"
+
+# Записанный update от Telegram (текстовое сообщение)
+RECORDED_UPDATE = {
+    "update_id": 100500,
+    "message": {
+        "message_id": 55,
+        "date": 1769860800,
+        "chat": {"id": 123456789, "type": "private", "first_name": "Имя"},
+        "from": {"id": 111, "is_bot": False, "first_name": "Имя", "last_name": "Фамилия", "username": "username"},
+        "text": "Нужен бот записи, бюджет 50к, срок до пятницы, @username",
+    },
+}
+
+
+@pytest.fixture
+def webhook_config(monkeypatch):
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_LISTEN", "127.0.0.1")
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_PORT", 8443)
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_PATH", "/telegram")
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_SECRET_TOKEN", SECRET)
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_URL", "https://bot.example.com/telegram")
+
+
+def test_options_from_config(webhook_config):
+    """Адрес, путь (без ведущего /), секрет и публичный URL берутся из config."""
+    assert telegram_webhook.webhook_options() == {
+        "listen": "127.0.0.1",
+        "port": 8443,
+        "url_path": "telegram",
+        "secret_token": SECRET,
+        "webhook_url": "https://bot.example.com/telegram",
+        "allowed_updates": Update.ALL_TYPES,
+    }
+
+
+def test_run_uses_run_webhook(webhook_config):
+    """run() запускает встроенный webhook python-telegram-bot с параметрами из config."""
+    calls = []
+
+    class FakeApplication:
+        def run_webhook(self, **kwargs):
+            calls.append(kwargs)
+
+    telegram_webhook.run(FakeApplication())
+
+    assert calls == [telegram_webhook.webhook_options()]
+
+
+def test_webhook_mode_requires_secret_and_url(monkeypatch):
+    """BOT_MODE=webhook без WEBHOOK_SECRET_TOKEN или WEBHOOK_URL — ошибка конфигурации."""
+    monkeypatch.setattr(config, "BOT_TOKEN", "123456:TEST")
+    monkeypatch.setattr(config, "MAKE_WEBHOOK_URL", "https://hook.example.com")
+    monkeypatch.setattr(config, "BOT_MODE", "webhook")
+    monkeypatch.setattr(config, "BOT_ROLE", "all")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET_TOKEN", SECRET)
+    monkeypatch.setattr(config, "WEBHOOK_URL", None)
+
+    with pytest.raises(SystemExit):
+        config.validate_config()
+
+    monkeypatch.setattr(config, "WEBHOOK_URL", "https://bot.example.com/telegram")
+    config.validate_config()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_updater_checks_secret(webhook_config, monkeypatch):
+    """Ресивер с параметрами из config: верный секрет — update в очереди, неверный — 403."""
+    registered = []
+
+    async def get_me(self, *args, **kwargs):
+        return User(123456, "Dispatcher", is_bot=True, username="dispatcher_test_bot")
+
+    async def set_webhook(self, url, **kwargs):
+        registered.append((url, kwargs.get("secret_token")))
+        return True
+
+    monkeypatch.setattr(Bot, "get_me", get_me)
+    monkeypatch.setattr(Bot, "set_webhook", set_webhook)
+    port = _free_port()
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_PORT", port)
+
+    application = Application.builder().token("123456:TEST").build()
+
+    async def run():
+        await application.initialize()
+        updates = await application.updater.start_webhook(**telegram_webhook.webhook_options())
+        try:
+            async with httpx.AsyncClient() as client:
+                url = f"http://127.0.0.1:{port}/telegram"
+                wrong = await client.post(url, json=RECORDED_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "nope"})
+                ok = await client.post(url, json=RECORDED_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            update = await asyncio.wait_for(updates.get(), 5)
+        finally:
+            await application.updater.stop()
+            await application.shutdown()
+        return wrong, ok, update
+
+    wrong, ok, update = asyncio.run(run())
+
+    assert registered == [("https://bot.example.com/telegram", SECRET)]
+    assert wrong.status_code == 403
+    assert ok.status_code == 200
+    assert update.message.chat_id == 123456789
@@ -0,0 +1,88 @@
+"""
+Тесты для ChatOrderedUpdateProcessor (параллельно между чатами, по очереди внутри чата).
+Запуск: python -m pytest test_update_processor.py
+"""
+
+import asyncio
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+USER = User(id=111, first_name="Имя", is_bot=False)
+
+
+def _message_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type="private")
+    message = Message(message_id=update_id, date=None, chat=chat, from_user=USER, text=f"msg {update_id}")
+    return Update(update_id=update_id, message=message)
+
+
+def _status_update(update_id: int, trace_id: str) -> Update:
+    query = CallbackQuery(id=str(update_id), from_user=USER, chat_instance="1", data=f"status|{trace_id}|booked")
+    return Update(update_id=update_id, callback_query=query)
+
+
+def test_ordering_key():
+    """Ключ: chat_id для сообщений, trace_id для кнопок статуса."""
+    assert ChatOrderedUpdateProcessor.ordering_key(_message_update(1, 42)) == ("chat", 42)
+    assert ChatOrderedUpdateProcessor.ordering_key(_status_update(2, "42:7")) == ("trace", "42:7")
+    assert ChatOrderedUpdateProcessor.ordering_key(object()) is None
+
+
+def test_parallel_across_chats_ordered_within_chat():
+    """Разные чаты идут параллельно, сообщения одного чата — в порядке поступления."""
+    processor = ChatOrderedUpdateProcessor(workers=4, queue_depth=100)
+    log = []
+    max_active = 0
+
+    async def handle(update: Update, delay: float):
+        nonlocal max_active
+        max_active = max(max_active, processor.active)
+        log.append(("start", update.update_id))
+        await asyncio.sleep(delay)
+        log.append(("end", update.update_id))
+
+    async def run():
+        updates = [
+            (_message_update(1, 10), 0.05),  # Первое сообщение чата 10 — медленное
+            (_message_update(2, 10), 0.0),
+            (_message_update(3, 20), 0.0),
+            (_message_update(4, 30), 0.0),
+        ]
+        tasks = [
+            asyncio.create_task(processor.process_update(update, handle(update, delay)))
+            for update, delay in updates
+        ]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    # Второе сообщение чата 10 стартует только после окончания первого
+    assert log.index(("start", 2)) > log.index(("end", 1))
+    # Другие чаты не ждут медленный чат 10
+    assert log.index(("end", 3)) < log.index(("end", 1))
+    assert log.index(("end", 4)) < log.index(("end", 1))
+    assert max_active >= 2
+    assert processor.pending == 0 and processor.active == 0
+
+
+def test_workers_limit():
+    """Одновременно обрабатывается не больше workers update."""
+    processor = ChatOrderedUpdateProcessor(workers=2, queue_depth=100)
+    max_active = 0
+
+    async def handle():
+        nonlocal max_active
+        max_active = max(max_active, processor.active)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(
+            processor.process_update(_message_update(i, i), handle()) for i in range(10)
+        ))
+
+    asyncio.run(run())
+
+    assert max_active == 2
@@ -0,0 +1,172 @@
+"""
+Тесты для общей очереди update (ingress + несколько worker-процессов).
+Запуск: python -m pytest test_update_queue.py
+"""
+
+import asyncio
+import json
+import multiprocessing
+import time
+from collections import defaultdict
+
+from update_queue import UpdateQueue, QueueWorker, ordering_key, owned_shards, SHARDS
+
+
+def message_update(update_id: int, chat_id: int, text: str = "Нужен бот") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Клиент"},
+            "text": text,
+        },
+    }
+
+
+def test_claim_keeps_chat_order(tmp_path):
+    """Следующий update чата не выдаётся, пока предыдущий не подтверждён; разные чаты — параллельно."""
+    queue = UpdateQueue(str(tmp_path / "updates.sqlite3"))
+    queue.put(message_update(1, chat_id=10))
+    queue.put(message_update(2, chat_id=10))
+    queue.put(message_update(3, chat_id=20))
+    all_shards = set(range(SHARDS))
+
+    first = queue.claim("a", all_shards, 10)
+    assert [item.data["update_id"] for item in first] == [1, 3]
+    assert queue.claim("b", all_shards, 10) == []
+
+    queue.ack(first[0])
+    second = queue.claim("b", all_shards, 10)
+    assert [item.data["update_id"] for item in second] == [2]
+
+
+def test_status_callback_ordered_by_trace():
+    """Кнопки статуса упорядочиваются по trace_id лида, а не по чату админа."""
+    update = {
+        "update_id": 5,
+        "callback_query": {
+            "id": "q1",
+            "chat_instance": "c",
+            "from": {"id": 1, "is_bot": False, "first_name": "Админ"},
+            "data": "status|123:45|booked",
+        },
+    }
+    assert ordering_key(update) == "trace:123:45"
+    assert ordering_key(message_update(1, chat_id=7)) == "chat:7"
+
+
+def test_owned_shards_rebalance():
+    """Шарды делятся без пересечений; новый worker забирает только часть шардов."""
+    before = {name: owned_shards(name, ["a", "b"]) for name in ("a", "b")}
+    assert before["a"] | before["b"] == set(range(SHARDS))
+    assert not before["a"] & before["b"]
+
+    after = {name: owned_shards(name, ["a", "b", "c"]) for name in ("a", "b", "c")}
+    assert after["a"] <= before["a"] and after["b"] <= before["b"]
+    assert 0 < len(after["c"]) < SHARDS // 2
+    assert owned_shards("d", ["a", "b"]) == set()
+
+
+def test_dead_worker_updates_requeued(tmp_path, clock):
+    """Update worker'а без heartbeat дольше lease возвращаются в очередь."""
+    queue = UpdateQueue(str(tmp_path / "updates.sqlite3"), clock=clock)
+    queue.put(message_update(1, chat_id=10))
+
+    queue.heartbeat("a", lease=5)
+    assert len(queue.claim("a", set(range(SHARDS)), 10)) == 1
+
+    clock.now += 10
+    assert queue.heartbeat("b", lease=5) == ["b"]
+    items = queue.claim("b", set(range(SHARDS)), 10)
+    assert [item.data["update_id"] for item in items] == [1]
+
+
+def _run_worker(path: str, name: str, log_path: str, stop) -> None:
+    """Процесс worker'а: пишет (чат, номер, начало, конец) каждого update в свой лог."""
+
+    async def main() -> None:
+        queue = UpdateQueue(path)
+        log = open(log_path, "a", encoding="utf-8")
+
+        async def process(data: dict) -> None:
+            started = time.monotonic()
+            await asyncio.sleep(0.005)
+            chat_id = data["message"]["chat"]["id"]
+            seq = int(data["message"]["text"])
+            log.write(json.dumps([name, chat_id, seq, started, time.monotonic()]) + "\n")
+            log.flush()
+
+        stopped = asyncio.Event()
+
+        async def watch_stop() -> None:
+            while not stop.is_set():
+                await asyncio.sleep(0.02)
+            stopped.set()
+
+        watcher = asyncio.create_task(watch_stop())
+        await QueueWorker(queue, name, process, concurrency=8, heartbeat=0.1, lease=5).run(stopped)
+        watcher.cancel()
+        log.close()
+        queue.close()
+
+    asyncio.run(main())
+
+
+def test_workers_on_one_box(tmp_path):
+    """
+    Несколько worker-процессов: каждый update обработан один раз, порядок
+    внутри чата сохраняется, третий worker подключается на ходу.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    path = str(tmp_path / "updates.sqlite3")
+    queue = UpdateQueue(path)
+    stop = ctx.Event()
+    chats, per_chat = 30, 10
+
+    def start(name: str):
+        process = ctx.Process(target=_run_worker, args=(path, name, str(tmp_path / f"{name}.jsonl"), stop))
+        process.start()
+        return process
+
+    workers = [start("w1"), start("w2")]
+    update_id = 0
+    try:
+        for seq in range(per_chat):
+            for chat_id in range(1, chats + 1):
+                update_id += 1
+                queue.put(message_update(update_id, chat_id, str(seq)))
+            if seq == per_chat // 2:
+                workers.append(start("w3"))
+                joined = time.monotonic() + 30
+                while "w3" not in queue.workers() and time.monotonic() < joined:
+                    time.sleep(0.05)
+
+        deadline = time.monotonic() + 60
+        while queue.count() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert queue.count() == 0
+    finally:
+        stop.set()
+        for process in workers:
+            process.join(timeout=30)
+        queue.close()
+
+    records = []
+    for name in ("w1", "w2", "w3"):
+        log = tmp_path / f"{name}.jsonl"
+        if log.exists():
+            records += [json.loads(line) for line in log.read_text(encoding="utf-8").splitlines()]
+
+    assert len(records) == chats * per_chat
+    by_chat = defaultdict(list)
+    for name, chat_id, seq, started, finished in records:
+        by_chat[chat_id].append((started, finished, seq))
+    for chat_id, runs in by_chat.items():
+        runs.sort()
+        assert [seq for _, _, seq in runs] == list(range(per_chat))
+        for previous, current in zip(runs, runs[1:]):
+            assert current[0] >= previous[1]
+
+    assert {record[0] for record in records} == {"w1", "w2", "w3"}
@@ -0,0 +1,183 @@
+"""
+Тесты для webhook (отправка в Make).
+Запуск: python -m pytest test_webhook.py
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import webhook
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from deadline import Deadline
+
+
+def _install_transport(url: str, handler) -> None:
+    """Подменяет пул для хоста url клиентом с MockTransport."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    parts = httpx.URL(url)
+    webhook._clients[f"{parts.scheme}://{parts.netloc.decode()}"] = client
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Паузы между ретраями не нужны в тестах."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(webhook.asyncio, "sleep", fake_sleep)
+    yield delays
+    webhook._clients.clear()
+    webhook._breakers.clear()
+
+
+def test_retries_5xx_then_success(no_sleep):
+    """5xx ретраится с неблокирующими паузами, затем успех."""
+    url = "https://hook.test/lead"
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502 if len(calls) < 3 else 200)
+
+    _install_transport(url, handler)
+    asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:1"}))
+
+    assert len(calls) == 3
+    assert no_sleep == [1, 2]
+
+
+def test_4xx_not_retried():
+    """4xx — ошибка в данных, без ретраев."""
+    url = "https://hook.test/lead"
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, text="bad payload")
+
+    _install_transport(url, handler)
+    with pytest.raises(webhook.WebhookError, match="HTTP 400"):
+        asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:1"}))
+
+    assert len(calls) == 1
+
+
+def test_one_pool_per_host():
+    """Один клиент на хост, независимо от пути."""
+    a = webhook._get_client("https://hook.eu2.make.com/aaa")
+    b = webhook._get_client("https://hook.eu2.make.com/bbb")
+    c = webhook._get_client("https://other.example.com/ccc")
+
+    assert a is b
+    assert a is not c
+
+
+def test_batch_per_item_results(monkeypatch):
+    """Пачка уходит одним запросом, ошибки — только у отклонённых элементов."""
+    url = "https://hook.test/batch"
+    requests_seen = []
+
+    def handler(request):
+        items = json.loads(request.content)
+        requests_seen.append(items)
+        return httpx.Response(200, json=[{"ok": item["trace_id"] != "1:2", "error": "dup"} for item in items])
+
+    _install_transport(url, handler)
+    monkeypatch.setattr(webhook, "MAKE_BATCH_SIZE", 3)
+    monkeypatch.setattr(webhook, "_batchers", {})
+
+    async def run():
+        return await asyncio.gather(
+            *(webhook._deliver(url, {"trace_id": f"1:{i}"}) for i in range(1, 4)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert len(requests_seen) == 1
+    assert [item["trace_id"] for item in requests_seen[0]] == ["1:1", "1:2", "1:3"]
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], webhook.WebhookError)
+
+
+def test_batch_flushes_after_wait(monkeypatch):
+    """Неполная пачка отправляется по таймеру MAKE_BATCH_WAIT_MS."""
+    url = "https://hook.test/batch"
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(json.loads(request.content))
+        return httpx.Response(200, text="Accepted")
+
+    _install_transport(url, handler)
+    monkeypatch.setattr(webhook, "MAKE_BATCH_SIZE", 10)
+    monkeypatch.setattr(webhook, "MAKE_BATCH_WAIT_MS", 10)
+    monkeypatch.setattr(webhook, "_batchers", {})
+
+    async def run():
+        await asyncio.gather(*(webhook._deliver(url, {"trace_id": f"1:{i}"}) for i in range(2)))
+
+    asyncio.run(run())
+
+    assert len(requests_seen) == 1
+    assert len(requests_seen[0]) == 2
+
+
+def test_open_circuit_fails_fast(no_sleep):
+    """Make недоступен: breaker открывается, следующие доставки — без HTTP запросов и пауз."""
+    url = "https://hook.test/lead"
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    _install_transport(url, handler)
+    webhook._breakers["other"] = CircuitBreaker("make_other", min_calls=2, open_seconds=60)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:1"}))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:2"}))
+
+    assert len(calls) == 2
+    assert no_sleep == [1]
+
+
+def test_4xx_does_not_open_circuit():
+    """4xx — Make отвечает, breaker остаётся закрытым."""
+    url = "https://hook.test/lead"
+    _install_transport(url, lambda request: httpx.Response(400, text="bad payload"))
+    webhook._breakers["other"] = CircuitBreaker("make_other", min_calls=1)
+
+    for _ in range(3):
+        with pytest.raises(webhook.WebhookError):
+            asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:1"}))
+
+    assert webhook._breakers["other"].state == "closed"
+
+
+def test_deadline_limits_retries(no_sleep):
+    """Бюджета не хватает на паузу и ещё одну попытку — ошибка сразу, без ретрая."""
+    url = "https://hook.test/lead"
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(503)
+
+    _install_transport(url, handler)
+    deadline = Deadline(2.5)
+
+    with pytest.raises(webhook.WebhookError, match="deadline"):
+        asyncio.run(webhook._send_with_retries(url, {"trace_id": "1:1"}, deadline))
+
+    assert len(timeouts) == 2
+    assert all(timeout <= 2.5 for timeout in timeouts)
+    assert no_sleep == [1]
+    assert deadline.degraded == ["make"]
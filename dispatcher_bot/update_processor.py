@@ -0,0 +1,100 @@
+"""
+Параллельная обработка update с сохранением порядка внутри чата.
+
+Update из разных чатов обрабатываются одновременно (не больше workers),
+update одного чата — строго по очереди. Нажатия кнопок статуса
+упорядочиваются по trace_id лида, а не по чату админа.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+
+_IN_FLIGHT = metrics.gauge("dispatcher_updates_in_flight", "Updates being processed right now")
+_WAITING = metrics.gauge("dispatcher_updates_waiting", "Updates waiting for their chat turn or a free worker")
+_UPDATE_SECONDS = metrics.histogram("dispatcher_update_seconds", "Update handling time (without waiting)")
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Args:
+        workers: Сколько update обрабатывается одновременно
+        queue_depth: Сколько update может ждать обработки (дальше PTB
+            придерживает чтение очереди)
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        super().__init__(max_concurrent_updates=max(queue_depth, workers, 2))
+        self._workers = asyncio.BoundedSemaphore(workers)
+        self._tails: dict[Hashable, asyncio.Future] = {}
+        self.pending = 0  # Приняты, ждут своей очереди или воркера
+        self.active = 0   # Обрабатываются прямо сейчас
+
+    @staticmethod
+    def ordering_key(update: object) -> Hashable | None:
+        """Ключ упорядочивания: trace_id для кнопок статуса, иначе chat_id."""
+        if not isinstance(update, Update):
+            return None
+
+        query = update.callback_query
+        if query is not None and query.data and query.data.startswith("status|"):
+            parts = query.data.split("|")
+            if len(parts) == 3:
+                return ("trace", parts[1])
+
+        chat = update.effective_chat
+        return ("chat", chat.id) if chat is not None else None
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.pending -= 1
+        _WAITING.dec()
+        async with self._workers:
+            self.active += 1
+            _IN_FLIGHT.inc()
+            started = time.perf_counter()
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+                _IN_FLIGHT.dec()
+                _UPDATE_SECONDS.observe(time.perf_counter() - started)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.pending += 1
+        _WAITING.inc()
+        key = self.ordering_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        started = False
+        try:
+            if previous is not None:
+                # shield: отмена этого update не должна отменять ожидание следующих
+                await asyncio.shield(previous)
+            started = True
+            await self._run(coroutine)
+        finally:
+            if not started:
+                self.pending -= 1
+                _WAITING.dec()
+                if hasattr(coroutine, "close"):
+                    coroutine.close()
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
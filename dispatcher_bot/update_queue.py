@@ -0,0 +1,283 @@
+"""
+Общая очередь update между ingress и worker-процессами (SQLite, WAL).
+
+Ingress кладёт сырой JSON update с ключом упорядочивания (chat_id, для
+кнопок статуса — trace_id лида) и шардом crc32(ключ) % SHARDS. Worker'ы
+отмечаются heartbeat'ом и делят шарды rendezvous-хэшированием: каждый сам
+вычисляет свои шарды по списку живых worker'ов. Добавить worker'а —
+запустить ещё один процесс, шарды перераспределятся (переезжает около 1/N).
+
+Порядок внутри ключа держит сама очередь: update выдаётся, только если
+в ней нет более раннего update с тем же ключом (ожидающего или в обработке),
+поэтому при переезде шарда новый владелец не обгонит старого. Обработанный
+update удаляется; update упавшего worker'а возвращается в очередь (at-least-once).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from telegram import Update
+
+from update_processor import ChatOrderedUpdateProcessor
+from config import WORKER_HEARTBEAT, WORKER_LEASE
+
+
+logger = logging.getLogger("dispatcher.update_queue")
+
+# Виртуальных шардов: больше, чем worker'ов, чтобы нагрузка делилась ровно
+SHARDS = 64
+
+# Пауза между проверками очереди, когда новых update нет (секунд)
+POLL_INTERVAL = 0.02
+
+
+@dataclass
+class QueuedUpdate:
+    """Update, выданный worker'у."""
+    id: int
+    key: str | None
+    data: dict[str, Any]
+
+
+def ordering_key(data: dict[str, Any]) -> str | None:
+    """Ключ упорядочивания сырого update — тот же, что у ChatOrderedUpdateProcessor."""
+    key = ChatOrderedUpdateProcessor.ordering_key(Update.de_json(data, None))
+    return None if key is None else f"{key[0]}:{key[1]}"
+
+
+def shard_of(key: str | None, update_id: int = 0, shards: int = SHARDS) -> int:
+    """Шард ключа; update без ключа раскладываются по update_id."""
+    if key is None:
+        return update_id % shards
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def _score(worker: str, shard: int) -> int:
+    # crc32 здесь не подходит: у похожих имён worker'ов хэши коррелируют
+    digest = hashlib.blake2b(f"{worker}|{shard}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def owned_shards(worker: str, live: list[str], shards: int = SHARDS) -> set[int]:
+    """Шарды worker'а: у каждого шарда владелец — живой worker с наибольшим хэшем (worker, шард)."""
+    if worker not in live:
+        return set()
+    return {shard for shard in range(shards) if max(live, key=lambda name: _score(name, shard)) == worker}
+
+
+class UpdateQueue:
+    """SQLite-таблица update: worker IS NULL — ждёт, иначе — в обработке у worker."""
+
+    def __init__(self, path: str, shards: int = SHARDS, clock: Callable[[], float] = time.time):
+        self.shards = shards
+        self._clock = clock
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS updates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT,
+                shard INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                worker TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_pending ON updates (worker, shard, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_key ON updates (key, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def put(self, data: dict[str, Any]) -> None:
+        """Кладёт update в очередь (порядок — порядок вызовов put)."""
+        key = ordering_key(data)
+        self._conn.execute(
+            "INSERT INTO updates (key, shard, payload, created_at) VALUES (?, ?, ?, ?)",
+            (key, shard_of(key, data.get("update_id", 0), self.shards),
+             json.dumps(data, ensure_ascii=False), self._clock())
+        )
+
+    def heartbeat(self, worker: str, lease: float = WORKER_LEASE) -> list[str]:
+        """
+        Отмечает worker живым, забывает worker'ов без heartbeat дольше lease
+        и возвращает их update в очередь.
+
+        Returns:
+            Имена живых worker'ов (по алфавиту)
+        """
+        now = self._clock()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT INTO workers (name, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker, now)
+            )
+            self._conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - lease,))
+            requeued = self._conn.execute(
+                "UPDATE updates SET worker = NULL "
+                "WHERE worker IS NOT NULL AND worker NOT IN (SELECT name FROM workers)"
+            ).rowcount
+            live = [name for name, in self._conn.execute("SELECT name FROM workers ORDER BY name")]
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if requeued:
+            logger.warning(f"Requeued {requeued} updates of stopped workers", extra={"trace_id": "-"})
+        return live
+
+    def leave(self, worker: str) -> None:
+        """Worker останавливается: его шарды переходят к остальным, невыполненное — в очередь."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("DELETE FROM workers WHERE name = ?", (worker,))
+            self._conn.execute("UPDATE updates SET worker = NULL WHERE worker = ?", (worker,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker: str, shards: set[int], limit: int) -> list[QueuedUpdate]:
+        """
+        Выдаёт worker'у до limit update из его шардов: по одному на ключ
+        и только если раньше по этому ключу в очереди ничего нет.
+        """
+        if not shards or limit <= 0:
+            return []
+        placeholders = ",".join("?" * len(shards))
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT id, key, payload FROM updates AS u
+                WHERE worker IS NULL AND shard IN ({placeholders})
+                  AND (key IS NULL OR NOT EXISTS (
+                      SELECT 1 FROM updates AS p WHERE p.key = u.key AND p.id < u.id
+                  ))
+                ORDER BY id
+                LIMIT ?
+                """,
+                (*sorted(shards), limit)
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    f"UPDATE updates SET worker = ? WHERE id IN ({','.join('?' * len(rows))})",
+                    (worker, *(row[0] for row in rows))
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return [QueuedUpdate(id=id_, key=key, data=json.loads(payload)) for id_, key, payload in rows]
+
+    def ack(self, item: QueuedUpdate) -> None:
+        """Удаляет обработанный update."""
+        self._conn.execute("DELETE FROM updates WHERE id = ?", (item.id,))
+
+    def workers(self) -> list[str]:
+        """Worker'ы, отметившиеся heartbeat'ом (по алфавиту)."""
+        return [name for name, in self._conn.execute("SELECT name FROM workers ORDER BY name")]
+
+    def count(self) -> int:
+        """Update в очереди (ожидающие и в обработке)."""
+        return self._conn.execute("SELECT COUNT(*) FROM updates").fetchone()[0]
+
+
+ProcessFunc = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class QueueWorker:
+    """
+    Забирает update своих шардов из очереди и обрабатывает через process.
+
+    Args:
+        queue: Общая очередь
+        name: Уникальное имя worker'а
+        process: Обработка сырого update (ошибки логируются, update всё равно удаляется)
+        concurrency: Сколько update обрабатывается одновременно
+        heartbeat: Период heartbeat и пересчёта шардов, секунд
+        lease: Сколько секунд без heartbeat worker считается живым
+        poll_interval: Пауза, когда новых update нет, секунд
+    """
+
+    def __init__(
+        self,
+        queue: UpdateQueue,
+        name: str,
+        process: ProcessFunc,
+        concurrency: int,
+        heartbeat: float = WORKER_HEARTBEAT,
+        lease: float = WORKER_LEASE,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.name = name
+        self._process = process
+        self._concurrency = max(1, concurrency)
+        self._heartbeat = heartbeat
+        self._lease = lease
+        self._poll_interval = poll_interval
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self.shards: set[int] = set()
+        self.processed = 0
+
+    def _refresh(self) -> None:
+        live = self.queue.heartbeat(self.name, self._lease)
+        shards = owned_shards(self.name, live, self.queue.shards)
+        if shards != self.shards:
+            logger.info(
+                f"Worker {self.name}: {len(shards)}/{self.queue.shards} shards, {len(live)} workers live",
+                extra={"trace_id": "-"}
+            )
+            self.shards = shards
+
+    async def _handle(self, item: QueuedUpdate) -> None:
+        try:
+            await self._process(item.data)
+        except Exception as e:
+            logger.error(f"Update {item.data.get('update_id')} failed: {e}", extra={"trace_id": "-"})
+        finally:
+            self.queue.ack(item)
+            self.processed += 1
+            self._wakeup.set()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Работает до stop, затем дожидается начатых update и уходит из очереди."""
+        next_heartbeat = 0.0
+        stopping = asyncio.ensure_future(stop.wait())
+        try:
+            while not stop.is_set():
+                self._wakeup.clear()
+                if time.monotonic() >= next_heartbeat:
+                    self._refresh()
+                    next_heartbeat = time.monotonic() + self._heartbeat
+
+                for item in self.queue.claim(self.name, self.shards, self._concurrency - len(self._tasks)):
+                    task = asyncio.create_task(self._handle(item))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+                wakeup = asyncio.ensure_future(self._wakeup.wait())
+                await asyncio.wait({wakeup, stopping}, timeout=self._poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                wakeup.cancel()
+        finally:
+            stopping.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.queue.leave(self.name)
@@ -1,13 +1,33 @@
 """
 Отправка данных в Make.com webhook с ретраями.
+Асинхронно, через пул keep-alive соединений (по одному на хост webhook).
+Опционально — пачками (MAKE_BATCH_SIZE > 1): несколько payload в одном запросе.
+У каждого webhook свой circuit breaker: пока Make недоступен, запросы
+не делаются и ошибка возвращается сразу (CircuitOpenError).
+С deadline таймауты попыток и ретраи ограничены остатком бюджета сообщения.
 """
 
+import asyncio
 import time
 from typing import Any
+from urllib.parse import urlsplit
 
-import requests
+import httpx
 
-from config import MAKE_WEBHOOK_URL, MAKE_STATUS_WEBHOOK_URL, MAKE_TIMEOUT, MAKE_RETRIES
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_OPEN
+from deadline import Deadline
+from config import (
+    MAKE_WEBHOOK_URL,
+    MAKE_STATUS_WEBHOOK_URL,
+    MAKE_TIMEOUT,
+    MAKE_RETRIES,
+    MAKE_POOL_MAX_CONNECTIONS,
+    MAKE_POOL_MAX_KEEPALIVE,
+    MAKE_POOL_KEEPALIVE_EXPIRY,
+    MAKE_BATCH_SIZE,
+    MAKE_BATCH_WAIT_MS,
+)
 
 
 class WebhookError(Exception):
@@ -15,71 +35,290 @@ class WebhookError(Exception):
     pass
 
 
-def _send_with_retries(url: str, payload: dict[str, Any]) -> None:
+# Если от бюджета сообщения осталось меньше (секунд), новую попытку не начинаем
+MIN_ATTEMPT_BUDGET = 1.0
+
+
+_MAKE_SECONDS = metrics.histogram(
+    "dispatcher_make_request_seconds", "Make webhook delivery latency including retries", ["endpoint", "outcome"]
+)
+_MAKE_ATTEMPTS = metrics.histogram(
+    "dispatcher_make_attempts", "HTTP attempts per Make webhook delivery", ["endpoint"],
+    buckets=range(1, MAKE_RETRIES + 2),
+)
+
+
+def _endpoint_label(url: str) -> str:
+    """Метка webhook для метрик (URL в метки не пишем — в нём секрет)."""
+    if url == MAKE_WEBHOOK_URL:
+        return "lead"
+    if url == MAKE_STATUS_WEBHOOK_URL:
+        return "status"
+    return "other"
+
+
+# Пулы соединений: "scheme://host:port" -> клиент
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _get_client(url: str) -> httpx.AsyncClient:
+    """Возвращает клиент с keep-alive пулом для хоста url."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=MAKE_TIMEOUT,  # 25 секунд из config
+            limits=httpx.Limits(
+                max_connections=MAKE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=MAKE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=MAKE_POOL_KEEPALIVE_EXPIRY,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        _clients[key] = client
+    return client
+
+
+# Circuit breaker на каждый webhook: метка endpoint -> breaker
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def _get_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = CircuitBreaker(f"make_{endpoint}")
+        _breakers[endpoint] = breaker
+    return breaker
+
+
+async def close_clients() -> None:
+    """Закрывает все пулы соединений (при остановке бота)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def _send_with_retries(url: str, payload: Any, deadline: Deadline | None = None) -> httpx.Response:
     """
     Отправляет JSON payload в webhook с ретраями.
+    Паузы между попытками не блокируют event loop.
 
     Args:
         url: URL webhook
         payload: Данные для отправки
+        deadline: Бюджет сообщения: таймаут попытки — не больше остатка,
+            попытка или пауза, на которую бюджета не хватает, не начинается
+
+    Returns:
+        Успешный (2xx) ответ webhook
 
     Raises:
-        WebhookError: При ошибке после всех попыток
+        WebhookError: При ошибке после всех попыток или по исчерпании бюджета
+        CircuitOpenError: Breaker webhook открыт, запрос не сделан
     """
     delays = [1, 2]  # Паузы между ретраями в секундах
     last_error = None
+    client = _get_client(url)
+    endpoint = _endpoint_label(url)
+    breaker = _get_breaker(endpoint)
+    started = time.perf_counter()
+    attempts = 0
+    outcome = "error"
 
-    for attempt in range(MAKE_RETRIES + 1):
-        try:
-            response = requests.post(
-                url,
-                json=payload,
-                timeout=MAKE_TIMEOUT,  # 25 секунд из config
-                headers={"Content-Type": "application/json"}
-            )
+    try:
+        for attempt in range(MAKE_RETRIES + 1):
+            timeout = deadline.timeout(MAKE_TIMEOUT) if deadline else MAKE_TIMEOUT
+            if timeout < MIN_ATTEMPT_BUDGET:
+                deadline.degrade("make")
+                raise WebhookError(f"Webhook deadline exceeded after {attempts} attempts: {last_error}")
+
+            try:
+                ticket = breaker.allow()
+            except CircuitOpenError:
+                outcome = "rejected"
+                raise
+            attempts += 1
+            budget_cut = False
+            try:
+                response = await client.post(url, json=payload, timeout=timeout)
+
+            except httpx.TimeoutException:
+                last_error = "timeout"
+                # Таймаут, урезанный бюджетом сообщения, — не признак недоступности Make
+                budget_cut = timeout < MAKE_TIMEOUT
+
+            except httpx.TransportError as e:
+                last_error = f"connection error: {str(e)[:100]}"
+
+            except httpx.HTTPError as e:
+                last_error = f"request error: {str(e)[:100]}"
 
-            # Успешный ответ
-            if 200 <= response.status_code < 300:
-                return
+            except BaseException:
+                breaker.cancel(ticket)
+                raise
 
-            # 4xx — ошибка в данных, не ретраим
-            if 400 <= response.status_code < 500:
-                raise WebhookError(f"HTTP {response.status_code}: {response.text[:200]}")
+            else:
+                # Успешный ответ
+                if 200 <= response.status_code < 300:
+                    breaker.success(ticket)
+                    outcome = "ok"
+                    return response
 
-            # 5xx — серверная ошибка, ретраим
-            last_error = f"HTTP {response.status_code}"
+                # 4xx — ошибка в данных, не ретраим (Make при этом доступен)
+                if 400 <= response.status_code < 500:
+                    breaker.success(ticket)
+                    raise WebhookError(f"HTTP {response.status_code}: {response.text[:200]}")
 
-        except requests.exceptions.Timeout:
-            last_error = "timeout"
+                # 5xx — серверная ошибка, ретраим
+                last_error = f"HTTP {response.status_code}"
 
-        except requests.exceptions.ConnectionError as e:
-            last_error = f"connection error: {str(e)[:100]}"
+            if budget_cut:
+                breaker.cancel(ticket)
+            else:
+                breaker.failure(ticket)
 
-        except requests.exceptions.RequestException as e:
-            last_error = f"request error: {str(e)[:100]}"
+            # Пауза перед следующей попыткой (если есть и breaker не открылся)
+            if attempt < MAKE_RETRIES and breaker.state != STATE_OPEN:
+                if deadline and deadline.remaining() < delays[attempt] + MIN_ATTEMPT_BUDGET:
+                    deadline.degrade("make")
+                    raise WebhookError(f"Webhook deadline exceeded after {attempts} attempts: {last_error}")
+                await asyncio.sleep(delays[attempt])
 
-        # Пауза перед следующей попыткой (если есть)
-        if attempt < MAKE_RETRIES:
-            time.sleep(delays[attempt])
+        # Все попытки исчерпаны
+        raise WebhookError(f"Webhook failed after {MAKE_RETRIES + 1} attempts: {last_error}")
+    finally:
+        _MAKE_SECONDS.labels(endpoint=endpoint, outcome=outcome).observe(time.perf_counter() - started)
+        _MAKE_ATTEMPTS.labels(endpoint=endpoint).observe(attempts)
 
-    # Все попытки исчерпаны
-    raise WebhookError(f"Webhook failed after {MAKE_RETRIES + 1} attempts: {last_error}")
 
+def _parse_batch_results(response: httpx.Response, size: int) -> list[str | None]:
+    """
+    Результат по каждому элементу пачки: None — принят, строка — ошибка.
+
+    Make может вернуть (модуль Webhook response) JSON-массив той же длины:
+    [{"ok": true}, {"ok": false, "error": "..."}]. Любой другой 2xx ответ
+    означает, что принята вся пачка.
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        return [None] * size
+
+    if not isinstance(data, list) or len(data) != size:
+        return [None] * size
+
+    results = []
+    for item in data:
+        if isinstance(item, dict) and item.get("ok") is False:
+            results.append(str(item.get("error") or "rejected by Make")[:200])
+        else:
+            results.append(None)
+    return results
+
+
+class _Batcher:
+    """Собирает payload в пачки до size штук или wait секунд и отправляет JSON-массивом."""
+
+    def __init__(self, url: str, size: int, wait: float):
+        self.url = url
+        self.size = size
+        self.wait = wait
+        self._pending: list[tuple[dict[str, Any], asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, payload: dict[str, Any]) -> None:
+        """
+        Добавляет payload в текущую пачку и ждёт результата по нему.
+
+        Raises:
+            WebhookError: Если пачка не отправлена или Make отклонил этот элемент
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+
+        if len(self._pending) >= self.size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.wait, self._flush)
+
+        await future
 
-def send_to_make(payload: dict[str, Any]) -> None:
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            response = await _send_with_retries(self.url, [payload for payload, _ in batch])
+            errors = _parse_batch_results(response, len(batch))
+        except CircuitOpenError as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            errors = [str(e)] * len(batch)
+
+        for (_, future), error in zip(batch, errors):
+            if future.done():  # Вызывающий отменил ожидание
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(WebhookError(error))
+
+
+# Батчеры: URL webhook -> _Batcher
+_batchers: dict[str, _Batcher] = {}
+
+
+async def _deliver(url: str, payload: dict[str, Any], deadline: Deadline | None = None) -> None:
+    """Отправляет payload сразу или через батчер (если включён MAKE_BATCH_SIZE > 1)."""
+    if MAKE_BATCH_SIZE <= 1:
+        await _send_with_retries(url, payload, deadline)
+        return
+
+    batcher = _batchers.get(url)
+    if batcher is None:
+        batcher = _Batcher(url, MAKE_BATCH_SIZE, MAKE_BATCH_WAIT_MS / 1000)
+        _batchers[url] = batcher
+    try:
+        # Пачка общая: по бюджету перестаём ждать только мы, отправка продолжается
+        async with asyncio.timeout(deadline.remaining() if deadline else None):
+            await batcher.submit(payload)
+    except TimeoutError:
+        deadline.degrade("make")
+        raise WebhookError("Webhook deadline exceeded while waiting for batch") from None
+
+
+async def send_to_make(payload: dict[str, Any], deadline: Deadline | None = None) -> None:
     """
     Отправляет JSON payload в основной Make webhook.
 
     Args:
         payload: Данные для отправки
+        deadline: Бюджет сообщения (None — только таймауты из config)
 
     Raises:
-        WebhookError: При ошибке после всех попыток
+        WebhookError: При ошибке после всех попыток или по исчерпании бюджета
+        CircuitOpenError: Make недоступен (breaker открыт), запрос не сделан
     """
-    _send_with_retries(MAKE_WEBHOOK_URL, payload)
+    await _deliver(MAKE_WEBHOOK_URL, payload, deadline)
 
 
-def send_status_update_to_make(payload: dict[str, Any]) -> None:
+async def send_status_update_to_make(payload: dict[str, Any]) -> None:
     """
     Отправляет обновление статуса в Make webhook.
 
@@ -88,9 +327,10 @@ def send_status_update_to_make(payload: dict[str, Any]) -> None:
 
     Raises:
         WebhookError: При ошибке после всех попыток
+        CircuitOpenError: Make недоступен (breaker открыт), запрос не сделан
         ValueError: Если MAKE_STATUS_WEBHOOK_URL не настроен
     """
     if not MAKE_STATUS_WEBHOOK_URL:
         raise ValueError("MAKE_STATUS_WEBHOOK_URL не настроен")
 
-    _send_with_retries(MAKE_STATUS_WEBHOOK_URL, payload)
+    await _deliver(MAKE_STATUS_WEBHOOK_URL, payload)